@@ -1,12 +1,16 @@
 """Multi-agent system: Story Expert, Planner, Coding Agent with Skills + TPA + Feedback."""
+import asyncio
 import json
 import re
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 import config
-from skills_loader import get_full_docs, get_skill_for_step
+from llm_cache import asset_fingerprint, get_cache, make_key
+from prompt_budget import PromptBudget
+from doc_index import retrieve_docs
+from skills_loader import get_skill_for_step
 from prompts.story_expert import (
     STORY_BASE_RULES,
     STORY_CONTINUE_SYSTEM,
@@ -18,27 +22,144 @@ from prompts.planner import PLANNER_SYSTEM, PLANNER_USER, PLANNING_SKILL
 from prompts.coding_agent import CODING_BASE, CODING_FIX, CODING_USER
 
 
+# Planner 检索规则 / API 文档时附加的步骤描述（拆解 Encounter 步骤所需的规则小节）
+PLANNER_DOC_QUERY = "AI Planner 自动生成 Encounter 步骤输出 Encounter 的硬性规则 设计参数 World.SpawnEncounter"
+
+# Codex (Responses API) 推理强度，同时计入缓存键
+CODEX_REASONING = {"effort": "high"}
+
+
+def _cache_lookup(model: str, payload, reasoning: dict | None, fingerprint: str, use_cache: bool):
+    """返回 (key, cached_text)。缓存关闭时 key 为 None；use_cache=False 时跳过读取但仍写回新结果。"""
+    if not config.LLM_CACHE_ENABLED:
+        return None, None
+    key = make_key(model, payload, reasoning, fingerprint)
+    if not use_cache:
+        get_cache().record_bypass()
+        return key, None
+    return key, get_cache().get(key)
+
+
+def _cache_store(key: str | None, text: str) -> None:
+    if key and text:
+        get_cache().put(key, text)
+
+
+async def _cache_lookup_async(model: str, payload, reasoning: dict | None, fingerprint: str, use_cache: bool):
+    """_cache_lookup 的异步版：SQLite 读写放到线程中，不阻塞事件循环上的其它请求。"""
+    return await asyncio.to_thread(_cache_lookup, model, payload, reasoning, fingerprint, use_cache)
+
+
+async def _cache_store_async(key: str | None, text: str) -> None:
+    if key and text:
+        await asyncio.to_thread(_cache_store, key, text)
+
+
 def _call_chat(
     client: OpenAI,
     model: str,
     messages: list,
+    fingerprint: str = "",
+    use_cache: bool = True,
 ) -> str:
     """Call Chat Completions API (for GPT 4.1, 5.1)."""
+    key, cached = _cache_lookup(model, messages, None, fingerprint, use_cache)
+    if cached is not None:
+        return cached
     response = client.chat.completions.create(model=model, messages=messages)
-    return response.choices[0].message.content or ""
+    text = response.choices[0].message.content or ""
+    _cache_store(key, text)
+    return text
 
 
 def _call_responses(
     client: OpenAI,
     model: str,
     input_text: str,
+    fingerprint: str = "",
+    use_cache: bool = True,
 ) -> str:
     """Call Responses API (for Codex). client.responses.create()"""
+    key, cached = _cache_lookup(model, input_text, CODEX_REASONING, fingerprint, use_cache)
+    if cached is not None:
+        return cached
     result = client.responses.create(
         model=model,
         input=input_text,
-        reasoning={"effort": "high"},
+        reasoning=CODEX_REASONING,
+    )
+    text = _responses_text(result)
+    _cache_store(key, text)
+    return text
+
+
+async def _call_chat_async(
+    client: AsyncOpenAI,
+    model: str,
+    messages: list,
+    fingerprint: str = "",
+    use_cache: bool = True,
+) -> str:
+    """Async Chat Completions call (AsyncOpenAI)，不占用工作线程。"""
+    key, cached = await _cache_lookup_async(model, messages, None, fingerprint, use_cache)
+    if cached is not None:
+        return cached
+    response = await client.chat.completions.create(model=model, messages=messages)
+    text = response.choices[0].message.content or ""
+    await _cache_store_async(key, text)
+    return text
+
+
+async def _call_chat_stream_async(
+    client: AsyncOpenAI,
+    model: str,
+    messages: list,
+    on_delta: Callable[[str], Awaitable[None]],
+    fingerprint: str = "",
+    use_cache: bool = True,
+) -> str:
+    """Streaming Chat Completions：每收到一段 token 即回调 on_delta，返回完整文本。缓存命中时一次性回调全文。"""
+    key, cached = await _cache_lookup_async(model, messages, None, fingerprint, use_cache)
+    if cached is not None:
+        await on_delta(cached)
+        return cached
+    stream = await client.chat.completions.create(model=model, messages=messages, stream=True)
+    parts = []
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            await on_delta(delta)
+    text = "".join(parts)
+    await _cache_store_async(key, text)
+    return text
+
+
+async def _call_responses_async(
+    client: AsyncOpenAI,
+    model: str,
+    input_text: str,
+    fingerprint: str = "",
+    use_cache: bool = True,
+) -> str:
+    """Async Responses API call (for Codex)."""
+    key, cached = await _cache_lookup_async(model, input_text, CODEX_REASONING, fingerprint, use_cache)
+    if cached is not None:
+        return cached
+    result = await client.responses.create(
+        model=model,
+        input=input_text,
+        reasoning=CODEX_REASONING,
     )
+    text = _responses_text(result)
+    await _cache_store_async(key, text)
+    return text
+
+
+def _responses_text(result) -> str:
+    """Extract output text from a Responses API result."""
     if hasattr(result, "output_text") and result.output_text:
         return result.output_text
     if hasattr(result, "output") and result.output:
@@ -59,10 +180,38 @@ def run_story_expert(
     model: str,
     story_mode: str = "expand",
     previous_npc_info: list[dict] | None = None,
+    use_cache: bool = True,
 ) -> str:
     """Agent 1: Story Expert - expand or continue story into full 奇遇剧本.
     story_mode: 'expand'=扩写（自然语言梗概→完整剧本）, 'continue'=续写（前一章→下一章）
+    use_cache=False 时跳过 LLM 响应缓存读取（见 llm_cache.py）。
     """
+    messages = _build_story_messages(story_input, story_mode, previous_npc_info)
+    return _call_chat(client, model, messages, use_cache=use_cache)
+
+
+async def run_story_expert_async(
+    client: AsyncOpenAI,
+    story_input: str,
+    model: str,
+    story_mode: str = "expand",
+    previous_npc_info: list[dict] | None = None,
+    on_delta: Callable[[str], Awaitable[None]] | None = None,
+    use_cache: bool = True,
+) -> str:
+    """Async 版 run_story_expert。传入 on_delta 时以流式输出扩写剧本。"""
+    messages = _build_story_messages(story_input, story_mode, previous_npc_info)
+    if on_delta:
+        return await _call_chat_stream_async(client, model, messages, on_delta, use_cache=use_cache)
+    return await _call_chat_async(client, model, messages, use_cache=use_cache)
+
+
+def _build_story_messages(
+    story_input: str,
+    story_mode: str = "expand",
+    previous_npc_info: list[dict] | None = None,
+) -> list:
+    """Build Story Expert messages (shared by sync/async)."""
     base_rules = STORY_BASE_RULES
     if story_mode == "continue":
         npc_block = ""
@@ -86,7 +235,7 @@ def run_story_expert(
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_content},
     ]
-    return _call_chat(client, model, messages)
+    return messages
 
 
 def run_planner(
@@ -94,22 +243,49 @@ def run_planner(
     expanded_story: str,
     model: str,
     assets: dict | None = None,
+    use_cache: bool = True,
 ) -> str:
     """Agent 2: Planner - 仅规划 Encounter 步骤（Setup 固定不生成）"""
+    messages = _build_planner_messages(expanded_story, assets, model)
+    return _call_chat(client, model, messages, fingerprint=asset_fingerprint(assets), use_cache=use_cache)
+
+
+async def run_planner_async(
+    client: AsyncOpenAI,
+    expanded_story: str,
+    model: str,
+    assets: dict | None = None,
+    use_cache: bool = True,
+) -> str:
+    """Async 版 run_planner。"""
+    messages = _build_planner_messages(expanded_story, assets, model)
+    return await _call_chat_async(client, model, messages, fingerprint=asset_fingerprint(assets),
+                                  use_cache=use_cache)
+
+
+def _build_planner_messages(expanded_story: str, assets: dict | None = None, model: str = "") -> list:
+    """Build Planner messages (shared by sync/async)."""
     asset_note = ""
     if assets:
         npcs = ", ".join(assets.get("npcs", [])) or "无"
         enemies = ", ".join(assets.get("enemies", [])) or "无"
         items = ", ".join(assets.get("items", [])) or "无"
         asset_note = f"\n素材库限制：NPC 仅可用 [{npcs}]，Enemy 仅可用 [{enemies}]，奖励道具（GiveItem/GiveWeapon/GiveEquip）仅可用 [{items}]。"
-    full_docs = get_full_docs()
     system_prompt = PLANNER_SYSTEM.format(asset_note=asset_note, planning_skill=PLANNING_SKILL)
-    user_msg = PLANNER_USER.format(full_docs=full_docs[:12000], expanded_story=expanded_story)
+    budget = PromptBudget("planner", model)
+    budget.fixed("system", system_prompt)
+    budget.fixed("template", PLANNER_USER.format(full_docs="", expanded_story=""))
+    budget.add("expanded_story", expanded_story, priority=0, min_tokens=config.PROMPT_SECTION_TOKENS["expanded_story"])
+    # 只带与故事相关的规则 / API 小节（BM25 检索），预算为故事之后剩余的部分
+    query = f"{expanded_story}\n{PLANNER_DOC_QUERY}"
+    budget.add("docs", lambda n: retrieve_docs(query, n), priority=1, max_tokens=config.DOC_RETRIEVAL_TOKENS, mode="head")
+    parts = budget.build()
+    user_msg = PLANNER_USER.format(full_docs=parts["docs"], expanded_story=parts["expanded_story"])
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_msg},
     ]
-    return _call_chat(client, model, messages)
+    return messages
 
 
 def run_coding_agent(
@@ -125,10 +301,75 @@ def run_coding_agent(
     npc_located_context: str = "",
     encounter_locations: Optional[list[dict]] = None,
     previous_npc_info: Optional[list[dict]] = None,
+    use_cache: bool = True,
+    variant: int = 0,
 ) -> str:
     """
     Agent 3: Coding Agent - generate LUA using Skills.
     仅使用素材库内的 NPC/Enemy/Prop，禁止库外 ID。
+    variant: 推测式并发时的候选序号，计入缓存键，使同一 prompt 的多个候选互不命中。
+    """
+    base_prompt, user_msg = _build_coding_prompt(
+        step, expanded_story, previous_code, validation_errors, assets, all_steps,
+        step_index, npc_located_context, encounter_locations, previous_npc_info, model,
+    )
+    fingerprint = asset_fingerprint(assets) + (f"#{variant}" if variant else "")
+    if "codex" in model.lower():
+        return _call_responses(client, model, f"{base_prompt}\n\n{user_msg}", fingerprint, use_cache)
+    messages = [
+        {"role": "system", "content": base_prompt},
+        {"role": "user", "content": user_msg},
+    ]
+    return _call_chat(client, model, messages, fingerprint, use_cache)
+
+
+async def run_coding_agent_async(
+    client: AsyncOpenAI,
+    step: dict,
+    expanded_story: str,
+    previous_code: str,
+    model: str,
+    validation_errors: Optional[list] = None,
+    assets: dict | None = None,
+    all_steps: Optional[list] = None,
+    step_index: int = 0,
+    npc_located_context: str = "",
+    encounter_locations: Optional[list[dict]] = None,
+    previous_npc_info: Optional[list[dict]] = None,
+    use_cache: bool = True,
+    variant: int = 0,
+) -> str:
+    """Async 版 run_coding_agent。"""
+    base_prompt, user_msg = _build_coding_prompt(
+        step, expanded_story, previous_code, validation_errors, assets, all_steps,
+        step_index, npc_located_context, encounter_locations, previous_npc_info, model,
+    )
+    fingerprint = asset_fingerprint(assets) + (f"#{variant}" if variant else "")
+    if "codex" in model.lower():
+        return await _call_responses_async(client, model, f"{base_prompt}\n\n{user_msg}", fingerprint, use_cache)
+    messages = [
+        {"role": "system", "content": base_prompt},
+        {"role": "user", "content": user_msg},
+    ]
+    return await _call_chat_async(client, model, messages, fingerprint, use_cache)
+
+
+def _build_coding_prompt(
+    step: dict,
+    expanded_story: str,
+    previous_code: str,
+    validation_errors: Optional[list] = None,
+    assets: dict | None = None,
+    all_steps: Optional[list] = None,
+    step_index: int = 0,
+    npc_located_context: str = "",
+    encounter_locations: Optional[list[dict]] = None,
+    previous_npc_info: Optional[list[dict]] = None,
+    model: str = "",
+) -> tuple[str, str]:
+    """
+    Build (system/base prompt, user message) for Coding Agent (shared by sync/async).
+    扩写故事 / 前序代码 / NPC 布置按 model 的 token 预算裁剪（prompt_budget）。
     """
     step_name = step.get("name", "unknown")
     step_desc = step.get("description", "")
@@ -153,7 +394,6 @@ def run_coding_agent(
 - 不得使用以上列表之外的任何 ID。
 """
 
-    use_codex = "codex" in model.lower()
     base_prompt = CODING_BASE.format(asset_constraint=asset_constraint, skill_content=skill_content)
 
     # 连续奇遇上下文
@@ -201,15 +441,6 @@ def run_coding_agent(
     else:
         fix_prompt = ""
 
-    npc_ref = ""
-    if npc_located_context and npc_located_context.strip():
-        npc_ref = f"""
-=== 【前置 NPC 布置参考】(step3_npc_located.lua，地图已放置的 NPC 类型与坐标) ===
-{npc_located_context[:3000]}
-
-奇遇可复用这些 NPC 类型（Merchant_Male, Hunter_Male 等），或使用 npcData 生成新的 encounter NPC。
-"""
-
     previous_npc_ref = ""
     if previous_npc_info:
         lines = ["=== 【前一幕 NPC 信息】（续写时复用，保持 resource 与身份一致）==="]
@@ -220,28 +451,42 @@ def run_coding_agent(
             lines.append(f"- {rid} → resource={res}，身份/称呼：{disp}")
         previous_npc_ref = "\n".join(lines) + "\n\n"
 
-    user_msg = CODING_USER.format(
+    fields = dict(
         step_name=step_name,
         step_desc=step_desc,
         step_type=step_type,
         chain_context=chain_context,
         loc_hint=loc_hint,
-        npc_ref=npc_ref,
         previous_npc_ref=previous_npc_ref,
         fix_prompt=fix_prompt,
-        expanded_story=expanded_story[:2500],
-        previous_code=previous_code[:2000] if previous_code else "（无）",
     )
+    budget = PromptBudget(f"coding:{step_name}", model)
+    budget.fixed("system", base_prompt)
+    budget.fixed("step", CODING_USER.format(**fields, npc_ref="", expanded_story="", previous_code=""))
+    # 故事保留开头与本步骤描述最相关的段落；前序代码保留首尾（最近一步在末尾）；NPC 布置按行保留开头
+    budget.add("expanded_story", expanded_story, priority=0, max_tokens=config.PROMPT_SECTION_TOKENS["expanded_story"],
+               mode="relevant", query=f"{step_name} {step_desc}", min_tokens=400)
+    budget.add("previous_code", previous_code or "", priority=1, max_tokens=config.PROMPT_SECTION_TOKENS["previous_code"])
+    budget.add("npc_located", (npc_located_context or "").strip(), priority=2,
+               max_tokens=config.PROMPT_SECTION_TOKENS["npc_located"], mode="head", unit="line")
+    parts = budget.build()
 
-    full_input = f"{base_prompt}\n\n{user_msg}"
+    npc_ref = ""
+    if parts["npc_located"]:
+        npc_ref = f"""
+=== 【前置 NPC 布置参考】(step3_npc_located.lua，地图已放置的 NPC 类型与坐标) ===
+{parts["npc_located"]}
 
-    if use_codex:
-        return _call_responses(client, model, full_input)
-    messages = [
-        {"role": "system", "content": base_prompt},
-        {"role": "user", "content": user_msg},
-    ]
-    return _call_chat(client, model, messages)
+奇遇可复用这些 NPC 类型（Merchant_Male, Hunter_Male 等），或使用 npcData 生成新的 encounter NPC。
+"""
+
+    user_msg = CODING_USER.format(
+        **fields,
+        npc_ref=npc_ref,
+        expanded_story=parts["expanded_story"],
+        previous_code=parts["previous_code"] or "（无）",
+    )
+    return base_prompt, user_msg
 
 
 def extract_steps_from_planner_output(plan_output: str) -> list:
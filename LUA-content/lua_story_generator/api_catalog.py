@@ -0,0 +1,241 @@
+"""
+API 签名表：从 lua_atomic_modules_call_guide.md 编译出 模块 / 函数 / 参数 / 参数类型 / 返回类型 的索引，
+供 validate_lua 的调用检查（未知函数、参数个数）与 dry_run 的记录桩共用。
+
+进程内只加载一次；文档 mtime/size 变化时重新计算内容哈希，哈希不同才重新编译。
+参数类型优先取文档示例中的字面量（示例用 lua_parser 解析），否则按参数名推断，推断不了为 any。
+
+用法：python api_catalog.py [--json]  打印签名表
+"""
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+import config
+from lua_parser import LuaSyntaxError, dotted, parse, walk
+
+MODULES = ("World", "UI", "Time", "Env", "Math", "System", "Event")
+# 方法小节标题 → 接口名（### 3.5 `Entity` 接口 / ### 3.6 `Performer` 接口）
+_METHOD_OWNERS = ("Entity", "Performer")
+
+# - `World.SpawnNPC(type, name, loc)` -> `Actor` / - `Math.RandInt(min,max) -> int`；/ - `npc:MoveTo(loc)` -> `string`（异步）
+_API_LINE = re.compile(r"^- `(\w+)([.:])(\w+)\(([^)]*)\)`?\s*->\s*`?([^`；（\s]+)(.*)$")
+_HEADING = re.compile(r"^#{2,4}\s")
+_EXAMPLE = re.compile(r"示例：`([^`]+)`")
+
+# 示例中的字面量 → 参数类型
+_LITERAL_KINDS = {
+    "String": "string",
+    "Number": "number",
+    "True": "bool",
+    "False": "bool",
+    "Table": "table",
+    "FunctionExpr": "function",
+}
+
+# 没有示例（或示例中是变量）时按参数名推断
+_PARAM_KINDS = {
+    "string": (
+        "type", "name", "id", "uid", "text", "msg", "title", "code", "script", "tag", "socket", "animName",
+        "eventName", "gameType", "btnA", "btnB", "luaType", "theme", "mat", "style", "roadType", "slot",
+        "template", "key", "val",
+    ),
+    "number": (
+        "count", "range", "radius", "seconds", "duration", "hour", "day", "lv", "dist", "time", "scale",
+        "eventId", "min", "max", "p", "w", "h", "x", "y", "z", "cellSize", "seed", "width", "height",
+        "yawDeg", "deg", "rad", "mode", "iter", "inner", "outer", "mean", "stddev", "grid", "angle", "t", "exp",
+    ),
+    "bool": ("show", "enable", "once", "bOnlyCol"),
+    "table": ("loc", "pos", "center", "rot", "options", "npcData", "size", "size2D", "newSize", "newPos", "localPos", "extent", "points"),
+    "function": ("callback",),
+}
+_KIND_BY_PARAM = {p: kind for kind, params in _PARAM_KINDS.items() for p in params}
+
+# 文档尚未收录、但运行时提供且固定模板（setup_template.lua）在用的函数；文档中已有同名函数时以文档为准，补齐后删除
+_SUPPLEMENT = {
+    "Env.BlockGridToBlockLocalPos": {"params": ["block", "grid"], "kinds": ["any", "table"], "returns": "FVector"},
+}
+# 文档签名之外运行时接受的可选尾参数（不计入最少实参个数）：(参数名, 类型)
+_OPTIONAL_PARAMS = {
+    "Env.SetBlockRotation": [("flag", "bool")],
+}
+
+
+def _example_kinds(example: str, qualified: str, method: str | None) -> list[str] | None:
+    """解析示例代码，取目标调用各实参的字面量类型（非字面量为 None）；示例无法解析时返回 None。"""
+    try:
+        chunk = parse(example)
+    except LuaSyntaxError:
+        return None
+    for node in walk(chunk):
+        if method is not None and node.kind == "MethodCall" and node.method == method:
+            return [_LITERAL_KINDS.get(a.kind) for a in node.args]
+        if method is None and node.kind == "Call" and dotted(node.func) == qualified:
+            return [_LITERAL_KINDS.get(a.kind) for a in node.args]
+    return None
+
+
+def build_catalog(text: str) -> dict:
+    """
+    编译签名表：
+    {"hash", "modules": {模块: {函数: sig}}, "methods": {方法: sig}}，
+    sig = {"owner", "name", "params", "kinds", "returns", "async", "line", "min_args"}；
+    params 含 _OPTIONAL_PARAMS 中的可选尾参数（min_args 之后），_SUPPLEMENT 中的函数 line 为 None。
+    """
+    modules: dict[str, dict[str, dict]] = {}
+    methods: dict[str, dict] = {}
+    lines = text.splitlines()
+    section = ""
+    pending: list[tuple[dict, str | None]] = []  # 等待下一行示例的签名（示例写在下一行时）
+    for lineno, raw in enumerate(lines, 1):
+        if _HEADING.match(raw):
+            section = raw
+            continue
+        example = _EXAMPLE.search(raw)
+        if pending and example and not raw.startswith("- `"):
+            for sig, method in pending:
+                _apply_example(sig, example.group(1), method)
+            pending = []
+            continue
+        m = _API_LINE.match(raw)
+        if not m:
+            continue
+        owner, sep, name, params, returns, rest = m.groups()
+        params = [p.strip() for p in params.split(",") if p.strip()]
+        if sep == ":":
+            owner = next((o for o in _METHOD_OWNERS if f"`{o}`" in section), "Entity")
+        elif owner not in MODULES:
+            continue
+        sig = {
+            "owner": owner,
+            "name": name,
+            "params": params,
+            "kinds": [_KIND_BY_PARAM.get(p, "any") for p in params],
+            "returns": returns.split("(")[0],
+            "async": "异步" in rest,
+            "line": lineno,
+            "min_args": len(params),
+        }
+        method = name if sep == ":" else None
+        if sep == ":":
+            methods[name] = sig
+        else:
+            modules.setdefault(owner, {})[name] = sig
+        if example:
+            _apply_example(sig, example.group(1), method)
+            pending = []
+        else:
+            pending = [(sig, method)]
+    _supplement(modules)
+    return {
+        "hash": hashlib.sha256(text.encode("utf-8")).hexdigest()[:16],
+        "modules": modules,
+        "methods": methods,
+    }
+
+
+def _supplement(modules: dict[str, dict[str, dict]]) -> None:
+    """补上文档缺失的函数与可选参数（只对文档中已有的模块）。"""
+    for qualified, extra in _SUPPLEMENT.items():
+        owner, name = qualified.split(".")
+        if owner in modules and name not in modules[owner]:
+            modules[owner][name] = {"owner": owner, "name": name, "params": list(extra["params"]),
+                                    "kinds": list(extra["kinds"]), "returns": extra["returns"], "async": False,
+                                    "line": None, "min_args": len(extra["params"])}
+    for qualified, optional in _OPTIONAL_PARAMS.items():
+        owner, name = qualified.split(".")
+        sig = modules.get(owner, {}).get(name)
+        if sig is not None and len(sig["params"]) == sig["min_args"]:
+            sig["params"] += [p for p, _ in optional]
+            sig["kinds"] += [k for _, k in optional]
+
+
+def _apply_example(sig: dict, example: str, method: str | None) -> None:
+    kinds = _example_kinds(example, f"{sig['owner']}.{sig['name']}", method)
+    if kinds is None:
+        return
+    for i, kind in enumerate(kinds[:len(sig["params"])]):
+        if kind is not None:
+            sig["kinds"][i] = kind
+
+
+# --- 进程内共享的签名表 ---
+
+_catalog: dict | None = None
+_signature: tuple | None = None
+_lock = threading.Lock()
+_stats = {"builds": 0, "hash_checks": 0, "last_build_ms": 0.0}
+
+
+def doc_path() -> Path:
+    return Path(config.PROJECT_ROOT) / config.LUA_API_DOC
+
+
+def get_catalog() -> dict:
+    """共享签名表：文档 (mtime, size) 未变直接返回；变化时比较内容哈希，不同才重新编译。文档缺失时为空表。"""
+    global _catalog, _signature
+    path = doc_path()
+    try:
+        st = path.stat()
+        signature = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        signature = None
+    catalog = _catalog
+    if catalog is not None and signature == _signature:
+        return catalog
+    with _lock:
+        if _catalog is not None and signature == _signature:
+            return _catalog
+        try:
+            text = path.read_text(encoding="utf-8") if signature else ""
+        except OSError as e:
+            print(f"[APICatalog] Failed to read {path}: {e}", file=sys.stderr)
+            text = ""
+        _stats["hash_checks"] += 1
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        if _catalog is None or _catalog["hash"] != digest:
+            t0 = time.perf_counter()
+            _catalog = build_catalog(text)
+            _stats["builds"] += 1
+            _stats["last_build_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        _signature = signature
+        return _catalog
+
+
+def get_catalog_stats() -> dict:
+    catalog = get_catalog()
+    with _lock:
+        stats = dict(_stats)
+    stats["hash"] = catalog["hash"]
+    stats["functions"] = {m: len(fns) for m, fns in catalog["modules"].items()}
+    stats["methods"] = len(catalog["methods"])
+    return stats
+
+
+def format_signature(sig: dict) -> str:
+    sep = ":" if sig["owner"] in _METHOD_OWNERS else "."
+    args = [f"{p}: {k}" if k != "any" else p for p, k in zip(sig["params"], sig["kinds"])]
+    args = ", ".join(a if i < sig["min_args"] else f"[{a}]" for i, a in enumerate(args))
+    return f"{sig['owner']}{sep}{sig['name']}({args}) -> {sig['returns']}" + ("（异步）" if sig["async"] else "")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile the API signature catalog from the call guide")
+    parser.add_argument("--json", action="store_true", help="print the catalog as JSON")
+    args = parser.parse_args()
+    catalog = get_catalog()
+    if args.json:
+        print(json.dumps(catalog, ensure_ascii=False, indent=2))
+    else:
+        for fns in catalog["modules"].values():
+            for sig in fns.values():
+                print(format_signature(sig))
+        for sig in catalog["methods"].values():
+            print(format_signature(sig))
+        print(json.dumps(get_catalog_stats(), ensure_ascii=False), file=sys.stderr)
@@ -0,0 +1,66 @@
+"""
+Asset catalog versions: 素材库响应（/api/assets、/api/resources、TCP get_assets）的内容指纹。
+指纹在素材库索引或 assets.json 变化时才重新计算，其余请求直接复用；
+HTTP 作为 ETag，TCP 作为 version 字段，客户端带回 If-None-Match / if_version 即可得到 "not modified"。
+下游缓存也可直接以该指纹作为缓存键。
+"""
+import threading
+from pathlib import Path
+from typing import Any, Callable
+
+from datatable_loader import get_resource_index
+from llm_cache import asset_fingerprint
+
+_lock = threading.Lock()
+_memo: dict[str, tuple[tuple, dict, str]] = {}
+
+
+def file_signature(path: Path) -> tuple | None:
+    """(mtime_ns, size)；文件不存在返回 None。"""
+    try:
+        st = Path(path).stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def catalog_key(*overlays: Path) -> tuple:
+    """当前素材库索引指纹 + 各覆盖文件（assets.json 等）的签名。"""
+    return (get_resource_index().fingerprint, *(file_signature(p) for p in overlays))
+
+
+def get_versioned(name: str, key: tuple, build: Callable[[], dict[str, Any]]) -> tuple[dict[str, Any], str]:
+    """
+    返回 (payload, version)。key 不变时复用上次构建的 payload 与指纹；
+    key 应包含所有输入的标识（如素材库索引指纹、assets.json 的 file_signature）。
+    """
+    with _lock:
+        entry = _memo.get(name)
+        if entry is not None and entry[0] == key:
+            return entry[1], entry[2]
+    payload = build()
+    version = asset_fingerprint(payload)
+    with _lock:
+        _memo[name] = (key, payload, version)
+    return payload, version
+
+
+def etag(version: str) -> str:
+    return f'"{version}"'
+
+
+def not_modified(version: str, if_none_match: str | None = None, if_version: str | None = None) -> bool:
+    """客户端持有的版本与当前一致（If-None-Match 支持多个值、W/ 前缀与 *）。"""
+    if if_version and if_version.strip('"') == version:
+        return True
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"') == version:
+            return True
+    return False
@@ -0,0 +1,195 @@
+"""
+Encounter 代码的确定性修复：对 validate_lua 中机械性的违规做本地改写，省去一次 Coding Agent 修正调用。
+
+- 缺少 _G.encXX_done 防重复：在嵌入代码开头（或已有的一半旁边）补齐 guard / 标记；
+- World.GetByID 取得的对象缺少 IsValid 检查：在取值语句之后插入 if not obj or not obj:IsValid() then return end；
+- UI.Ask / AskMany 返回值与 "A"~"D" / true / false 比较：替换为对应选项文案；
+- Give* 道具 ID / PlayMiniGame gameType 不在素材库：替换为素材库中最接近的 ID（difflib）。
+只改写位于 [[ ]] 长字符串（或外层代码）中、原文可精确核对的位置；其余错误仍交给 LLM 修正。
+"""
+import difflib
+import re
+from typing import List
+
+import config
+from lua_parser import LuaSyntaxError, Node, dotted, walk
+from validate_lua import (
+    AskCompareRule,
+    AssetWhitelistRule,
+    DoneGuardRule,
+    ValidityRule,
+    _Context,
+    _parse_cached,
+    default_rules,
+    run_rules,
+)
+
+_LETTER_INDEX = {"A": 0, "B": 1, "C": 2, "D": 3}
+_ENC_PREFIX = re.compile(r"""["'](enc\w*?)_[A-Za-z0-9]""")
+
+
+def _blocks(node: Node):
+    """语句块（语句列表）：Chunk / Do / While / Repeat / For / FunctionExpr 的 body，If 的各分支。"""
+    for n in walk(node):
+        if n.kind == "If":
+            yield from n.blocks
+            if n.orelse:
+                yield n.orelse
+        elif isinstance(getattr(n, "body", None), list):
+            yield n.body
+
+
+def _lua_string(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+class _Editor:
+    """按 (行, 列) 定位的文本改写；insert / replace 收集后一次性从后往前应用。"""
+
+    def __init__(self, source: str, chunks: list[Node]):
+        self.source = source
+        self.line_starts = [0] + [m.end() for m in re.finditer("\n", source)]
+        self.edits: list[tuple[int, int, int, str]] = []  # (start, order, end, text)
+        self.next_stat: dict[int, Node] = {}
+        for chunk in chunks:
+            for block in _blocks(chunk):
+                for a, b in zip(block, block[1:]):
+                    self.next_stat[id(a)] = b
+
+    def offset(self, node: Node) -> int:
+        return self.line_starts[node.line - 1] + node.col - 1
+
+    def replace(self, node: Node, expected: str, text: str) -> bool:
+        start = self.offset(node)
+        if self.source[start:start + len(expected)] != expected:
+            return False
+        self.edits.append((start, 0, start + len(expected), text))
+        return True
+
+    def insert_before(self, stat: Node, text: str, order: int = 0) -> bool:
+        """在语句前插入一行（与该语句同缩进）；语句不在行首时插在同一行。"""
+        if stat is None:
+            return False
+        start = self.offset(stat)
+        line_start = self.line_starts[stat.line - 1]
+        indent = self.source[line_start:start]
+        if indent.strip():
+            self.edits.append((start, order, start, text + " "))
+        else:
+            self.edits.append((line_start, order, line_start, indent + text + "\n"))
+        return True
+
+    def insert_after(self, stat: Node, text: str, order: int = 0) -> bool:
+        return self.insert_before(self.next_stat.get(id(stat)), text, order)
+
+    def apply(self) -> str:
+        out = self.source
+        for start, _, end, text in sorted(self.edits, reverse=True):
+            out = out[:start] + text + out[end:]
+        return out
+
+
+def _embedded_long_strings(chunk: Node, ctx: _Context, source: str, editor: _Editor) -> bool:
+    """嵌入代码都写在 [[ ]] 长字符串中时才能插入换行（引号字符串中的行列与原文不一一对应）；code 为局部变量时看其字符串常量。"""
+    for n in walk(chunk):
+        if n.kind == "Call" and dotted(n.func) == "World.SpawnEncounter" and len(n.args) >= 5:
+            code = n.args[4]
+            if code.kind == "Name":
+                code = ctx.strings.get(code.name, code)
+            if code.kind == "String" and source[editor.offset(code)] != "[":
+                return False
+    return True
+
+
+def _fix_done_guard(rule: DoneGuardRule, ctx: _Context, source: str, editor: _Editor, done_key: str | None) -> bool:
+    if rule.guard is not None and rule.mark is not None:
+        return False
+    if not ctx.embedded or not ctx.embedded[0].body:
+        return False
+    key = rule.key
+    if key is None:
+        m = _ENC_PREFIX.search(source)
+        key = f"{m.group(1)}_done" if m else done_key
+    if not key:
+        return False
+    guard = f"if _G.{key} then return end"
+    mark = f"_G.{key} = true"
+    if rule.guard is not None:
+        return editor.insert_after(rule.guard, mark)
+    if rule.mark is not None:
+        return editor.insert_before(rule.mark, guard)
+    first = ctx.embedded[0].body[0]
+    return editor.insert_before(first, guard, order=0) and editor.insert_before(first, mark, order=1)
+
+
+def _fix_validity(rule: ValidityRule, editor: _Editor) -> bool:
+    fixed = False
+    for name, stat in rule.stmts.items():
+        if name not in rule.checked:
+            fixed |= editor.insert_after(stat, f"if not {name} or not {name}:IsValid() then return end", order=2)
+    return fixed
+
+
+def _fix_ask_compare(rule: AskCompareRule, editor: _Editor) -> bool:
+    fixed = False
+    for node, options in rule.compares:
+        if node.kind == "String":
+            index, expected = _LETTER_INDEX[node.value], None
+            for quote in ('"', "'"):
+                if editor.source.startswith(quote + node.value + quote, editor.offset(node)):
+                    expected = quote + node.value + quote
+        else:
+            # true 视为第一个选项（确认），false 视为第二个
+            index, expected = (0, "true") if node.kind == "True" else (1, "false")
+        if expected and index < len(options):
+            fixed |= editor.replace(node, expected, _lua_string(options[index]))
+    return fixed
+
+
+def _fix_asset_ids(rule: AssetWhitelistRule, editor: _Editor) -> bool:
+    fixed = False
+    for node, allowed in rule.unknown:
+        used = node.value
+        lowered = {a.lower(): a for a in allowed}
+        match = lowered.get(used.lower())
+        if match is None:
+            close = difflib.get_close_matches(used, allowed, n=1, cutoff=config.AUTOFIX_ID_CUTOFF)
+            match = close[0] if close else None
+        if match is None:
+            continue
+        for quote in ('"', "'"):
+            if editor.source.startswith(quote + used + quote, editor.offset(node)):
+                fixed |= editor.replace(node, quote + used + quote, quote + match + quote)
+                break
+    return fixed
+
+
+def autofix_encounter(code: str, assets: dict | None = None, done_key: str | None = None) -> tuple[str, List[str]]:
+    """
+    返回 (修复后的代码, 已应用的修复类别)。无可修复项或代码无法解析时原样返回 (code, [])。
+    done_key：代码中找不到 encXX 前缀时使用的防重复键名（如 "enc01_done"）。
+    """
+    source = code.strip()
+    try:
+        chunk = _parse_cached(source)
+        rules = default_rules(assets)
+        ctx = _Context()
+        if not run_rules(chunk, rules, ctx):
+            return code, []
+    except LuaSyntaxError:
+        return code, []
+    by_type = {type(r): r for r in rules}
+    editor = _Editor(source, [chunk, *ctx.embedded])
+    applied = []
+    if _embedded_long_strings(chunk, ctx, source, editor):
+        if _fix_done_guard(by_type[DoneGuardRule], ctx, source, editor, done_key):
+            applied.append("done_guard")
+        if _fix_validity(by_type[ValidityRule], editor):
+            applied.append("is_valid")
+    if _fix_ask_compare(by_type[AskCompareRule], editor):
+        applied.append("ask_compare")
+    if _fix_asset_ids(by_type[AssetWhitelistRule], editor):
+        applied.append("asset_id")
+    if not applied:
+        return code, []
+    return editor.apply(), applied
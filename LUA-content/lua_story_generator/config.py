@@ -26,3 +26,101 @@ GROUND_Z = 90
 # 奇遇基准坐标：靠近玩家落地位置，确保触发盒子在地面层级
 ENCOUNTER_BASE_X = 11600
 ENCOUNTER_BASE_Y = 12000
+
+# LLM 客户端连接池：按 (api_key, base_url) 复用客户端与 keep-alive 连接（见 llm_clients.py）
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+LLM_CLIENT_POOL_SIZE = int(os.environ.get("LLM_CLIENT_POOL_SIZE", "32"))  # 最多缓存的客户端数，超出按 LRU 淘汰
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "100"))  # 每个客户端的连接上限
+LLM_MAX_KEEPALIVE = int(os.environ.get("LLM_MAX_KEEPALIVE", "20"))  # 每个客户端保留的空闲 keep-alive 连接数
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", "60"))  # 空闲连接保留秒数
+
+# 运行时数据目录（LLM 缓存等持久化文件），可通过 LUA_GEN_DATA_DIR 覆盖
+DATA_DIR = Path(os.environ.get("LUA_GEN_DATA_DIR", str(Path(__file__).resolve().parent / ".data")))
+
+# LLM 响应缓存（见 llm_cache.py）：内存 LRU + SQLite，LLM_CACHE=0 关闭
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1").strip() != "0"
+LLM_CACHE_PATH = DATA_DIR / "llm_cache.sqlite3"
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_DISK_ENTRIES = int(os.environ.get("LLM_CACHE_DISK_ENTRIES", "5000"))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # 秒，0 表示不过期
+
+# Pipeline 阶段产物存储（见 pipeline_runs.py），供从指定阶段重跑
+PIPELINE_RUNS_PATH = DATA_DIR / "pipeline_runs.sqlite3"
+PIPELINE_RUNS_MAX = int(os.environ.get("PIPELINE_RUNS_MAX", "500"))  # 最多保留的 run 数，超出删除最旧
+
+# 推测式并发编码：同时发起 K 个 Coding Agent 候选，首个通过校验者胜出（0/1 = 关闭，逐个生成 + 修正）
+SPECULATIVE_CANDIDATES = int(os.environ.get("SPECULATIVE_CANDIDATES", "0"))
+# 每个步骤 Coding Agent 调用次数上限（候选 + 修正轮次），控制费用
+SPECULATIVE_MAX_CALLS = int(os.environ.get("SPECULATIVE_MAX_CALLS", "5"))
+
+# 批量生成（/generate/batch、TCP generate_batch）：默认并发数、并发上限、单条超时（秒）
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "32"))
+BATCH_ITEM_TIMEOUT = float(os.environ.get("BATCH_ITEM_TIMEOUT", "900"))
+
+# 任务队列（见 jobs.py）：长时间生成提交为任务，状态与结果持久化，重启后仍可获取
+JOBS_PATH = DATA_DIR / "jobs.sqlite3"
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))  # 同时执行的任务数
+JOBS_MAX = int(os.environ.get("JOBS_MAX", "1000"))  # 最多保留的任务记录数，超出删除最旧的已结束任务
+JOB_WAIT_MAX = float(os.environ.get("JOB_WAIT_MAX", "60"))  # 长轮询单次最长等待秒数
+
+# TCP 服务（asyncio，见 tcp_server.py）：listen backlog 与最大同时连接数（超出时回复错误并断开）
+TCP_BACKLOG = int(os.environ.get("TCP_BACKLOG", "512"))
+TCP_MAX_CONNECTIONS = int(os.environ.get("TCP_MAX_CONNECTIONS", "1000"))
+TCP_MAX_FRAME = int(os.environ.get("TCP_MAX_FRAME", str(16 * 1024 * 1024)))  # 单个请求帧上限（字节），超出回复错误并跳过该帧
+TCP_MAX_INFLIGHT = int(os.environ.get("TCP_MAX_INFLIGHT", "32"))  # 单个连接上带 req_id 并发执行的请求数上限
+# 每个 TCP 客户端的发送队列：容量（消息数）与队列满时的策略 drop_oldest（丢弃最旧推送）| disconnect（断开慢客户端）
+TCP_SEND_QUEUE = int(os.environ.get("TCP_SEND_QUEUE", "256"))
+TCP_SEND_POLICY = os.environ.get("TCP_SEND_POLICY", "drop_oldest").strip().lower()
+TCP_COMPRESS_THRESHOLD = int(os.environ.get("TCP_COMPRESS_THRESHOLD", "1024"))  # hello 协商启用 zlib 后，超过该字节数的消息才压缩
+
+# Stage 内容哈希（见 stage_hashes.py）：服务端保留最近发出的 stage 正文数，供客户端按哈希取回
+STAGE_STORE_MAX = int(os.environ.get("STAGE_STORE_MAX", "512"))
+# 每个 TCP 连接最多记录的 UE 已缓存哈希数
+TCP_KNOWN_HASHES_MAX = int(os.environ.get("TCP_KNOWN_HASHES_MAX", "1024"))
+
+# 素材库索引（见 datatable_loader.py）：检查 CSV mtime/size 的最小间隔（秒），变化时自动重新加载
+DATATABLE_CHECK_INTERVAL = float(os.environ.get("DATATABLE_CHECK_INTERVAL", "2"))
+# 素材库二进制快照：CSV 内容指纹一致时冷启动直接加载，DATATABLE_SNAPSHOT=0 关闭
+DATATABLE_SNAPSHOT_ENABLED = os.environ.get("DATATABLE_SNAPSHOT", "1").strip() != "0"
+DATATABLE_SNAPSHOT_PATH = Path(os.environ.get("DATATABLE_SNAPSHOT_PATH", str(DATA_DIR / "datatable_snapshot.pickle")))
+
+# 素材搜索：/api/resources/search 每页默认条数与上限
+RESOURCE_SEARCH_LIMIT = int(os.environ.get("RESOURCE_SEARCH_LIMIT", "50"))
+RESOURCE_SEARCH_LIMIT_MAX = int(os.environ.get("RESOURCE_SEARCH_LIMIT_MAX", "200"))
+
+# Encounter 本地自动修复（见 autofix_lua.py）：校验失败时先确定性修复，仍有错误才调用 LLM 修正；AUTOFIX=0 关闭
+AUTOFIX_ENABLED = os.environ.get("AUTOFIX", "1").strip() != "0"
+AUTOFIX_ID_CUTOFF = float(os.environ.get("AUTOFIX_ID_CUTOFF", "0.8"))  # 道具 / 小游戏 ID 模糊匹配的最低相似度
+
+# API 调用检查（api_catalog 签名表）：文档确认完整前结果只作为警告推送，不进入 CODING_FIX；API_LINT_STRICT=1 时作为错误
+API_LINT_STRICT = os.environ.get("API_LINT_STRICT", "0").strip() == "1"
+
+# Dry run（见 dry_run.py）：离线执行生成脚本时每段代码的指令预算、墙钟上限（秒）、最多保留的调用记录条数、调用深度上限
+DRY_RUN_BUDGET = int(os.environ.get("DRY_RUN_BUDGET", "200000"))
+DRY_RUN_TIMEOUT = float(os.environ.get("DRY_RUN_TIMEOUT", "5"))
+DRY_RUN_TRACE_MAX = int(os.environ.get("DRY_RUN_TRACE_MAX", "2000"))
+DRY_RUN_MAX_DEPTH = int(os.environ.get("DRY_RUN_MAX_DEPTH", "1000"))  # Lua 函数调用嵌套上限（递归遍历表 / 洪水填充等）
+
+# 规则 / API 文档检索（见 doc_index.py）：Planner 只带与扩写故事最相关的小节；DOC_RETRIEVAL=0 退回全文截断
+DOC_RETRIEVAL_ENABLED = os.environ.get("DOC_RETRIEVAL", "1").strip() != "0"
+DOC_RETRIEVAL_TOKENS = int(os.environ.get("DOC_RETRIEVAL_TOKENS", "5000"))  # 检索结果的近似 token 上限
+DOC_RETRIEVAL_TOP_K = int(os.environ.get("DOC_RETRIEVAL_TOP_K", "24"))
+DOC_CHUNK_TOKENS = int(os.environ.get("DOC_CHUNK_TOKENS", "600"))  # 单个小节超过该长度时按段落拆分
+
+# Prompt 预算（见 prompt_budget.py）：各模型的输入 token 上限（近似计数），PROMPT_BUDGET 覆盖全部模型
+PROMPT_BUDGETS = {
+    "gpt-4.1": 16000,
+    "gpt-5.1": 16000,
+    "gpt-5.1-codex-max": 20000,
+    "gpt-5.2-codex": 20000,
+}
+PROMPT_BUDGET_DEFAULT = 16000
+PROMPT_BUDGET_OVERRIDE = int(os.environ.get("PROMPT_BUDGET", "0"))
+# 各可裁剪段落的上限（tokens）；预算不足时按优先级 扩写故事 > 前序代码 > NPC 布置 > 文档 依次压缩
+PROMPT_SECTION_TOKENS = {
+    "expanded_story": int(os.environ.get("PROMPT_STORY_TOKENS", "2400")),
+    "previous_code": int(os.environ.get("PROMPT_PREVIOUS_CODE_TOKENS", "900")),
+    "npc_located": int(os.environ.get("PROMPT_NPC_LOCATED_TOKENS", "1000")),
+    "animations": int(os.environ.get("PROMPT_ANIMATIONS_TOKENS", "120")),
+}
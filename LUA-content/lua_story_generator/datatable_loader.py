@@ -1,9 +1,19 @@
 """
 Load NPC, Enemy, Prop, Item from DataTable CSV files.
-Read at startup; planner changes to CSV take effect on next server restart.
+解析结果保存在进程级 ResourceIndex 中：CSV 的修改时间 / 大小变化时自动重建并原子替换，
+策划修改表格后无需重启服务（也可调用 reload_resource_index() 立即重新加载）。
+
+冷启动：解析结果另存为带版本号与源文件指纹的二进制快照（pickle）。指纹（CSV 内容哈希）一致时直接加载快照，
+跳过 CSV 解析；不一致或快照损坏时回退到解析 CSV 并重写快照。构建步骤：python datatable_loader.py --build-snapshot
 """
 import csv
+import hashlib
+import os
+import pickle
 import re
+import sys
+import threading
+import time
 from pathlib import Path
 from typing import Any
 
@@ -20,6 +30,9 @@ FILENAMES = {
     "anim_montage": "DT_MontageTable.csv",
 }
 
+# 快照格式版本：解析逻辑或 resources 结构变化时递增，旧快照自动失效
+SNAPSHOT_VERSION = 1
+
 
 def _extract_nsloctext(text: str) -> str:
     """Extract readable display name from NSLOCTEXT(..., ..., \"Name\") format."""
@@ -143,9 +156,9 @@ def _load_items() -> list[dict[str, Any]]:
     return sorted(result, key=lambda x: x["id"])
 
 
-def load_resources() -> dict[str, Any]:
+def _parse_resources() -> dict[str, Any]:
     """
-    Load all resources from DataTable CSVs.
+    Parse all resources from DataTable CSVs.
     Returns: {
         npcs: [id, ...],
         enemies: [id, ...],
@@ -177,6 +190,159 @@ def load_resources() -> dict[str, Any]:
     }
 
 
+def _source_signature() -> tuple:
+    """各 CSV 的 (文件名, mtime_ns, size)；任一变化即视为素材库已修改。"""
+    sig = []
+    for name in FILENAMES.values():
+        try:
+            st = (DATATABLE_DIR / name).stat()
+            sig.append((name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((name, None, None))
+    return tuple(sig)
+
+
+def _source_fingerprint() -> str:
+    """快照指纹：快照版本 + 各 CSV 的文件名与内容哈希（不依赖 mtime，镜像构建 / 复制后仍一致）。"""
+    h = hashlib.sha256(f"datatable-snapshot-v{SNAPSHOT_VERSION}".encode())
+    for name in FILENAMES.values():
+        h.update(name.encode("utf-8"))
+        try:
+            h.update(hashlib.sha256((DATATABLE_DIR / name).read_bytes()).digest())
+        except OSError:
+            h.update(b"<missing>")
+    return h.hexdigest()[:16]
+
+
+def _load_snapshot(fingerprint: str) -> dict[str, Any] | None:
+    """指纹与版本一致时返回快照中的 resources，否则 None。"""
+    path = Path(config.DATATABLE_SNAPSHOT_PATH)
+    if not config.DATATABLE_SNAPSHOT_ENABLED or not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except Exception as e:
+        print(f"[DataTable] Ignoring unreadable snapshot {path}: {e}", file=sys.stderr)
+        return None
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION or data.get("fingerprint") != fingerprint:
+        return None
+    resources = data["resources"]
+    resources["datatable_dir"] = str(DATATABLE_DIR.resolve())
+    return resources
+
+
+def save_snapshot(resources: dict[str, Any], fingerprint: str) -> Path | None:
+    """写入快照（先写临时文件再替换，读者不会看到半个文件）。"""
+    if not config.DATATABLE_SNAPSHOT_ENABLED:
+        return None
+    path = Path(config.DATATABLE_SNAPSHOT_PATH)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {"version": SNAPSHOT_VERSION, "fingerprint": fingerprint, "created": time.time(), "resources": resources},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp, path)
+        return path
+    except OSError as e:
+        print(f"[DataTable] Failed to write snapshot {path}: {e}", file=sys.stderr)
+        return None
+
+
+class ResourceIndex:
+    """一次解析结果的只读快照：原始列表 + 集合（成员判断）+ 按 id 的字典。"""
+
+    def __init__(self, resources: dict[str, Any], signature: tuple, fingerprint: str = "", origin: str = "csv"):
+        self.resources = resources
+        self.signature = signature
+        self.fingerprint = fingerprint
+        self.origin = origin  # csv | snapshot
+        self.loaded_at = time.time()
+        self.npc_ids = frozenset(resources["npcs"])
+        self.enemy_ids = frozenset(resources["enemies"])
+        self.prop_ids = frozenset(resources["props"])
+        self.item_ids = frozenset(resources["items"])
+        self.animation_ids = frozenset(resources["animations"])
+        self.props_by_id = {p["id"]: p for p in resources["props_detail"]}
+        self.items_by_id = {i["id"]: i for i in resources["items_detail"]}
+
+    def counts(self) -> dict[str, int]:
+        return {
+            "npcs": len(self.npc_ids),
+            "enemies": len(self.enemy_ids),
+            "props": len(self.prop_ids),
+            "items": len(self.item_ids),
+            "animations": len(self.animation_ids),
+        }
+
+
+_index: ResourceIndex | None = None
+_index_checked = 0.0
+_build_lock = threading.Lock()
+
+
+def _rebuild(signature: tuple) -> ResourceIndex:
+    global _index
+    fingerprint = _source_fingerprint()
+    resources = _load_snapshot(fingerprint)
+    origin = "snapshot"
+    if resources is None:
+        resources = _parse_resources()
+        origin = "csv"
+        save_snapshot(resources, fingerprint)
+    index = ResourceIndex(resources, signature, fingerprint, origin)
+    _index = index  # 整体替换引用：读者要么看到旧快照，要么看到新快照
+    return index
+
+
+def get_resource_index() -> ResourceIndex:
+    """
+    返回当前素材库索引。每隔 DATATABLE_CHECK_INTERVAL 秒检查一次 CSV 的 mtime/size，
+    变化时重建；其余情况只是一次引用读取。
+    """
+    global _index_checked
+    index = _index
+    now = time.monotonic()
+    if index is not None and now - _index_checked < config.DATATABLE_CHECK_INTERVAL:
+        return index
+    with _build_lock:
+        index = _index
+        if index is not None and now - _index_checked < config.DATATABLE_CHECK_INTERVAL:
+            return index
+        signature = _source_signature()
+        if index is None or signature != index.signature:
+            if index is not None:
+                print("[DataTable] CSV changed, reloading resource index", file=sys.stderr)
+            index = _rebuild(signature)
+        _index_checked = time.monotonic()
+        return index
+
+
+def reload_resource_index() -> ResourceIndex:
+    """强制重新解析 CSV 并替换索引（同时重写快照）。"""
+    global _index, _index_checked
+    with _build_lock:
+        signature = _source_signature()
+        fingerprint = _source_fingerprint()
+        resources = _parse_resources()
+        save_snapshot(resources, fingerprint)
+        index = _index = ResourceIndex(resources, signature, fingerprint, "csv")
+        _index_checked = time.monotonic()
+        return index
+
+
+def load_resources() -> dict[str, Any]:
+    """
+    All resources (same shape as _parse_resources), served from the in-memory index.
+    返回浅拷贝；其中的列表为共享数据，调用方不要修改。
+    """
+    return dict(get_resource_index().resources)
+
+
 def get_assets_for_agents() -> dict[str, list]:
     """Return assets dict suitable for agents/orchestrator: {npcs, enemies, props, items, minigames}."""
     res = load_resources()
@@ -187,3 +353,20 @@ def get_assets_for_agents() -> dict[str, list]:
         "items": res["items"],
         "minigames": res["minigames"],
     }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="DataTable snapshot tool")
+    parser.add_argument("--build-snapshot", action="store_true", help="解析 CSV 并写入二进制快照")
+    args = parser.parse_args()
+    if args.build_snapshot:
+        started = time.perf_counter()
+        fingerprint = _source_fingerprint()
+        resources = _parse_resources()
+        path = save_snapshot(resources, fingerprint)
+        counts = {k: len(resources[k]) for k in ("npcs", "enemies", "props", "items", "animations")}
+        print(f"[DataTable] snapshot {path} fingerprint={fingerprint} {counts} "
+              f"({(time.perf_counter() - started) * 1000:.0f} ms)")
+    else:
+        parser.print_help()
@@ -0,0 +1,256 @@
+"""
+规则 / API 文档检索：把 rule.md 与 lua_atomic_modules_call_guide.md 按小节切块，建立 BM25 索引，
+按扩写故事（及步骤描述）取最相关的小节，在 token 预算内按文档顺序拼接，代替 get_full_docs()[:12000] 的截断。
+
+- 小节：Markdown 标题（#…）或 rule.md 的编号标题（"6. …" / "6.2 …"）；过长的小节按空行拆成多块；
+- 词项：英文 / 标识符按小写整词 + 驼峰拆分（SpawnEncounter → spawnencounter, spawn, encounter），中文按字二元组；
+- 查询点名某个 API（SpawnEncounter / World.SpawnEncounter）时，API 文档中定义它的小节（签名列表项）额外加分，
+  排在只是提到它的小节之前；
+- 索引在启动时构建并缓存，文档 (mtime, size) 变化时重建。
+
+用法：python doc_index.py "查询文本" [--budget N]
+"""
+import math
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import config
+from prompt_budget import count_tokens, trim
+
+_MD_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*$")
+_NUM_HEADING = re.compile(r"^(\d+)\.(\d+)?\s+(\S.{0,60})$")
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)?")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_API_DEF = re.compile(r"^\s*-\s*`(?:\w+[.:])?(\w+)\(", re.M)  # 签名列表项：- `World.SpawnNPC(...)` / - `npc:GiveItem(...)`
+_CJK = re.compile(r"[㐀-鿿豈-﫿]+")
+
+# BM25 参数
+_K1 = 1.5
+_B = 0.75
+
+
+def terms(text: str) -> list[str]:
+    """检索词项：标识符小写 + 驼峰 / 下划线拆分，中文字二元组（单字串保留单字）。"""
+    out = []
+    for word in _WORD.findall(text):
+        lower = word.lower()
+        out.append(lower)
+        parts = [p.lower() for p in _CAMEL.findall(word.replace("_", " "))]
+        if len(parts) > 1:
+            out.extend(p for p in parts if len(p) > 1)
+    for run in _CJK.findall(text):
+        if len(run) == 1:
+            out.append(run)
+        else:
+            out.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return out
+
+
+def _split_sections(text: str, source: str) -> list[tuple[str, str]]:
+    """(标题路径, 正文) 列表；正文含标题行，只有标题的小节不保留。rule.md 没有 # 标题，用编号标题（"6." / "6.2"）。"""
+    numbered = not any(_MD_HEADING.match(line) for line in text.splitlines())
+    sections: list[tuple[str, list[str]]] = []
+    path: list[tuple[int, str]] = []  # (层级, 标题)
+    in_code = False
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        heading = None
+        if not in_code:
+            m = _MD_HEADING.match(line)
+            if m:
+                heading = (len(m.group(1)), m.group(2).strip("# "))
+            elif numbered:
+                m = _NUM_HEADING.match(line.strip())
+                if m:
+                    heading = (1 if m.group(2) is None else 2, line.strip())
+        if heading is None:
+            if not sections:
+                sections.append((source, []))
+            sections[-1][1].append(line)
+            continue
+        level, title = heading
+        path = [p for p in path if p[0] < level] + [heading]
+        sections.append((" > ".join(t for _, t in path), [line]))
+    return [(title, "\n".join(lines).strip()) for title, lines in sections if "\n".join(lines[1:]).strip()]
+
+
+def _split_long(body: str, max_tokens: int) -> list[str]:
+    """超过 max_tokens 的小节按空行拆分（尽量保持段落完整；代码块内不拆）。"""
+    if count_tokens(body) <= max_tokens:
+        return [body]
+    parts: list[str] = []
+    current: list[str] = []
+    size = 0
+    in_code = False
+    for para in re.split(r"(\n\s*\n)", body):
+        if para.strip() == "":
+            if current:
+                current.append(para)
+            continue
+        in_code ^= para.count("```") % 2 == 1
+        n = count_tokens(para)
+        if current and size + n > max_tokens and not in_code:
+            parts.append("".join(current).strip())
+            current, size = [], 0
+        current.append(para)
+        size += n
+    if current:
+        parts.append("".join(current).strip())
+    return [p for p in parts if p]
+
+
+class DocIndex:
+    """文档小节的 BM25 索引（只读快照）。chunks：{"id", "source", "title", "text", "tokens"}。"""
+
+    def __init__(self, docs: dict[str, str], signature: tuple, max_chunk_tokens: int):
+        self.signature = signature
+        self.chunks: list[dict] = []
+        for source, text in docs.items():
+            for title, body in _split_sections(text, source):
+                pieces = _split_long(body, max_chunk_tokens)
+                for i, piece in enumerate(pieces):
+                    self.chunks.append({
+                        "id": len(self.chunks),
+                        "source": source,
+                        "title": title if i == 0 else f"{title}（续 {i}）",
+                        "text": piece,
+                        "tokens": count_tokens(piece),
+                    })
+        # 标题词项计两次（标题命中比正文更说明相关）
+        self.tfs = [Counter(terms(c["title"]) * 2 + terms(c["text"])) for c in self.chunks]
+        self.lengths = [sum(tf.values()) for tf in self.tfs]
+        self.avg_len = (sum(self.lengths) / len(self.lengths)) if self.lengths else 1.0
+        df: Counter = Counter()
+        for tf in self.tfs:
+            df.update(tf.keys())
+        n = len(self.chunks)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+        self.postings: dict[str, list[int]] = {}
+        for i, tf in enumerate(self.tfs):
+            for t in tf:
+                self.postings.setdefault(t, []).append(i)
+        # API 名（小写）-> {"chunks": 定义它的小节, "bonus": 名字各词项的饱和得分之和}
+        self.defines: dict[str, dict] = {}
+        for c in self.chunks:
+            for name in dict.fromkeys(_API_DEF.findall(c["text"])):
+                entry = self.defines.setdefault(name.lower(), {
+                    "chunks": [], "bonus": sum(self.idf.get(t, 0.0) for t in set(terms(name))) * (_K1 + 1)})
+                entry["chunks"].append(c["id"])
+
+    def scores(self, query: str) -> dict[int, float]:
+        q = Counter(terms(query))
+        out: dict[int, float] = {}
+        for t, qf in q.items():
+            idf = self.idf.get(t)
+            if idf is None:
+                continue
+            # 查询中重复出现的词项按 1 + log 计权，避免长故事中的高频字二元组主导排序
+            weight = idf * (1 + math.log(qf))
+            for i in self.postings[t]:
+                f = self.tfs[i][t]
+                norm = f * (_K1 + 1) / (f + _K1 * (1 - _B + _B * self.lengths[i] / self.avg_len))
+                out[i] = out.get(i, 0.0) + weight * norm
+            # 定义该 API 的小节按名字各词项（spawnencounter / spawn / encounter）的饱和得分再加一份，
+            # 长小节的长度归一化不会让它输给只是多次提到 API 名的短小节
+            entry = self.defines.get(t)
+            if entry:
+                for i in entry["chunks"]:
+                    out[i] = out.get(i, 0.0) + (1 + math.log(qf)) * entry["bonus"]
+        return out
+
+    def search(self, query: str, top_k: int) -> list[tuple[dict, float]]:
+        ranked = sorted(self.scores(query).items(), key=lambda kv: -kv[1])[:top_k]
+        return [(self.chunks[i], s) for i, s in ranked]
+
+    def retrieve(self, query: str, max_tokens: int, top_k: int) -> list[dict]:
+        """按得分取前 top_k 个小节中能放进 max_tokens 的部分，按文档顺序返回。"""
+        picked, used = [], 0
+        for chunk, _ in self.search(query, top_k):
+            if used + chunk["tokens"] > max_tokens:
+                continue
+            picked.append(chunk)
+            used += chunk["tokens"]
+        return sorted(picked, key=lambda c: c["id"])
+
+
+_index: DocIndex | None = None
+_lock = threading.Lock()
+
+
+def _doc_paths() -> dict[str, Path]:
+    root = Path(config.PROJECT_ROOT)
+    return {config.RULE_DOC: root / config.RULE_DOC, config.LUA_API_DOC: root / config.LUA_API_DOC}
+
+
+def _signature(paths: dict[str, Path]) -> tuple:
+    sig = []
+    for name, path in paths.items():
+        try:
+            st = path.stat()
+            sig.append((name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((name, None, None))
+    return tuple(sig)
+
+
+def get_doc_index() -> DocIndex:
+    """共享索引：文档未变化时直接返回；启动时由 main 预先构建。"""
+    global _index
+    paths = _doc_paths()
+    signature = _signature(paths)
+    index = _index
+    if index is not None and index.signature == signature:
+        return index
+    with _lock:
+        if _index is not None and _index.signature == signature:
+            return _index
+        t0 = time.perf_counter()
+        docs = {name: path.read_text(encoding="utf-8") for name, path in paths.items() if path.exists()}
+        _index = DocIndex(docs, signature, config.DOC_CHUNK_TOKENS)
+        print(f"[DocIndex] Indexed {len(_index.chunks)} sections from {len(docs)} docs in "
+              f"{(time.perf_counter() - t0) * 1000:.1f} ms", file=sys.stderr)
+        return _index
+
+
+def retrieve_docs(query: str, max_tokens: int | None = None, top_k: int | None = None) -> str:
+    """
+    与 query（扩写故事 + 步骤描述）最相关的文档小节，按来源分组拼接。
+    DOC_RETRIEVAL=0 时退回全文，按 token 预算保留开头。
+    """
+    max_tokens = max_tokens or config.DOC_RETRIEVAL_TOKENS
+    top_k = top_k or config.DOC_RETRIEVAL_TOP_K
+    if not config.DOC_RETRIEVAL_ENABLED:
+        from skills_loader import get_full_docs
+        return trim(get_full_docs(), max_tokens, "head")
+    index = get_doc_index()
+    t0 = time.perf_counter()
+    chunks = index.retrieve(query, max_tokens, top_k)
+    parts, source = [], None
+    for c in chunks:
+        if c["source"] != source:
+            source = c["source"]
+            parts.append(f"# {source}")
+        parts.append(c["text"])
+    print(f"[DocIndex] Retrieved {len(chunks)} sections (~{sum(c['tokens'] for c in chunks)} tokens) "
+          f"in {(time.perf_counter() - t0) * 1000:.1f} ms", file=sys.stderr)
+    return "\n\n".join(parts)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the rule / API doc index")
+    parser.add_argument("query")
+    parser.add_argument("--budget", type=int, default=None, help="token budget")
+    parser.add_argument("--top-k", type=int, default=None)
+    args = parser.parse_args()
+    index = get_doc_index()
+    for chunk, score in index.search(args.query, args.top_k or config.DOC_RETRIEVAL_TOP_K):
+        print(f"{score:7.2f}  {chunk['tokens']:5d}  [{chunk['source']}] {chunk['title']}")
+    print()
+    print(retrieve_docs(args.query, args.budget, args.top_k))
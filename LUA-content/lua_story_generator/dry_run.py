@@ -0,0 +1,417 @@
+"""
+Dry run: 用 lua_runtime 离线执行 InitMap / InitEvent / StartGame，在 UE 之前发现运行期错误
+（nil 索引、拼错的 World.* 函数、死循环等）。
+
+World / UI / Time / Env / Math / System / Event 与 Entity / Performer 方法按 lua_atomic_modules_call_guide.md 生成记录调用的桩：
+文档中不存在的函数为 nil（调用即报 "attempt to call a nil value (field 'Xxx')"），返回值按文档返回类型构造。
+World.SpawnEncounter 的 code 在三段脚本执行完后依次触发（模拟玩家进入触发盒），再触发一次检查防重复逻辑。
+异步 API（Wait / Ask / MoveTo 等）立即返回，World.Wait 推进虚拟时钟。
+
+用法：python dry_run.py InitEvent.lua [--init-map file] [--start-game file] [--budget N]
+"""
+import functools
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import api_catalog
+import config
+from api_catalog import MODULES
+from lua_parser import LuaSyntaxError
+from lua_runtime import Interpreter, LuaBudgetExceeded, LuaError, LuaTable, from_lua, to_lua, tostring
+
+PLAYER_ID = "Player"
+PLAYER_POS = {"X": 11536, "Y": 11963, "Z": 90}
+
+
+@functools.lru_cache(maxsize=4)
+def _api_returns(catalog_hash: str) -> tuple[dict[str, dict[str, str]], dict[str, str]]:
+    catalog = api_catalog.get_catalog()
+    modules = {m: {fn: sig["returns"] for fn, sig in fns.items()} for m, fns in catalog["modules"].items()}
+    methods = {name: sig["returns"] for name, sig in catalog["methods"].items()}
+    return modules, methods
+
+
+def guide_api() -> tuple[dict[str, dict[str, str]], dict[str, str]]:
+    """文档中的 (模块函数 {模块: {函数: 返回类型}}, 对象方法 {方法: 返回类型})，取自 api_catalog 签名表。"""
+    return _api_returns(api_catalog.get_catalog()["hash"])
+
+
+def _brief(v, limit: int = 80):
+    """调用记录中的参数：表转为 dict / list，长字符串截断。"""
+    if isinstance(v, str):
+        return v if len(v) <= limit else v[:limit] + "…"
+    if isinstance(v, LuaTable):
+        return from_lua(v)
+    if isinstance(v, (Entity, Handle)):
+        return repr(v)
+    if v is None or isinstance(v, (bool, int, float)):
+        return v
+    return tostring(v)
+
+
+class Handle:
+    """Env 返回的不透明句柄（MapHandle / BlockHandle ...）。"""
+
+    def __init__(self, kind: str, n: int):
+        self.kind, self.n = kind, n
+
+    def lua_index(self, key):
+        return None
+
+    def __repr__(self):
+        return f"{self.kind}#{self.n}"
+
+
+class Entity:
+    """Actor：方法来自文档 Entity / Performer 接口，调用记录为 uid:Method。"""
+
+    def __init__(self, sandbox: "Sandbox", uid: str, kind: str = "Actor", pos: dict | None = None):
+        self.sandbox, self.uid, self.kind = sandbox, uid, kind
+        self.pos = dict(pos or {"X": 0, "Y": 0, "Z": 0})
+        self.destroyed = False
+        self.tags: set[str] = set()
+
+    def lua_index(self, key):
+        return self.sandbox.method(self, key)
+
+    def __repr__(self):
+        return f"{self.kind}({self.uid})"
+
+
+class Sandbox:
+    """一次 dry-run 的全部状态：解释器、桩、调用记录、场景中的 Actor 与待触发的 encounter。"""
+
+    def __init__(self, budget: int, timeout: float, choice: int = 1, trace_max: int = 2000):
+        self.interp = Interpreter(budget=budget, timeout=timeout, max_depth=config.DRY_RUN_MAX_DEPTH)
+        self.budget = budget
+        self.timeout = timeout
+        self.choice = choice
+        self.trace: list[dict] = []
+        self.trace_max = trace_max
+        self.trace_dropped = 0
+        self.counts: Counter = Counter()
+        self.warnings: list[str] = []
+        self.clock = 0.0
+        self.actors: dict[str, Entity] = {PLAYER_ID: Entity(self, PLAYER_ID, "Player", PLAYER_POS)}
+        self.encounters: list[dict] = []
+        self.triggers: list[dict] = []
+        self.stage = ""
+        self._handles = 0
+        self._schedules = 0
+        self._modules, self._methods = guide_api()
+        self._bound: dict[tuple[int, str], object] = {}
+        self._install()
+
+    # --- 记录 ---
+
+    def record(self, name: str, args) -> None:
+        self.counts[name] += 1
+        if len(self.trace) >= self.trace_max:
+            self.trace_dropped += 1
+            return
+        self.trace.append({
+            "stage": self.stage, "line": self.interp.line, "t": round(self.clock, 3),
+            "call": name, "args": [_brief(a) for a in args],
+        })
+
+    def warn(self, msg: str) -> None:
+        msg = f"[{self.stage}] line {self.interp.line}: {msg}"
+        if msg not in self.warnings:
+            self.warnings.append(msg)
+
+    # --- 返回值 ---
+
+    def default(self, ret: str, args=()):
+        """按文档返回类型构造桩返回值。"""
+        ret = ret.split("|")[0]
+        if ret in ("nil", "any"):
+            return None
+        if ret == "bool":
+            return True
+        if ret in ("int", "number"):
+            return 0
+        if ret == "string":
+            return "Success"
+        if ret.endswith("[]"):
+            return LuaTable()
+        if ret in ("FVector",):
+            return to_lua({"X": 0, "Y": 0, "Z": 0})
+        if ret == "FRotator":
+            return to_lua({"Pitch": 0, "Yaw": 0, "Roll": 0})
+        if ret == "FIntPoint":
+            return to_lua({"X": 0, "Y": 0})
+        if ret.startswith("FIntRect") or ret == "FBox" or ret == "table":
+            return LuaTable()
+        if ret.startswith("Actor"):
+            return self.spawn(f"actor_{len(self.actors)}", "Actor")
+        if ret.endswith("Handle") or ret.endswith("Object"):
+            self._handles += 1
+            return Handle(ret, self._handles)
+        return None
+
+    def spawn(self, uid: str, kind: str, loc=None) -> Entity:
+        pos = from_lua(loc) if isinstance(loc, LuaTable) else None
+        actor = Entity(self, uid, kind, pos if isinstance(pos, dict) else None)
+        self.actors[uid] = actor
+        return actor
+
+    # --- 桩 ---
+
+    def _stub(self, module: str, name: str, ret: str, impl=None):
+        full = f"{module}.{name}"
+
+        def stub(*args):
+            self.record(full, args)
+            if impl is not None:
+                return impl(*args)
+            return self.default(ret, args)
+        stub.__name__ = full
+        return stub
+
+    def method(self, entity: Entity, key):
+        """obj.key：文档中的 Entity / Performer 方法返回记录桩，其余为 nil。"""
+        if not isinstance(key, str) or key not in self._methods:
+            return None
+        bound = self._bound.get((id(entity), key))
+        if bound is None:
+            ret = self._methods[key]
+            impl = self._method_impls.get(key)
+
+            def bound(*args):
+                if not args or args[0] is not entity:
+                    raise LuaError(f"line {self.interp.line}:{self.interp.col}: "
+                                   f"{entity.uid}.{key} 应以 {entity.uid}:{key}(...) 方式调用")
+                self.record(f"{entity.uid}:{key}", args[1:])
+                if entity.destroyed and key != "IsValid":
+                    self.warn(f"{entity.uid}:{key} 调用时对象已销毁")
+                return impl(entity, *args[1:]) if impl is not None else self.default(ret)
+            bound.__name__ = key
+            self._bound[(id(entity), key)] = bound
+        return bound
+
+    def _install(self) -> None:
+        g = self.interp.globals
+        impls = self._module_impls()
+        for module in MODULES:
+            table = LuaTable()
+            for name, ret in self._modules.get(module, {}).items():
+                table.set(name, self._stub(module, name, ret, impls.get(f"{module}.{name}")))
+            g.set(module, table)
+
+        def log(*args):
+            self.record("Log", args)
+            self.interp.output.append("\t".join(self.interp.tostring(a) for a in args))
+        g.set("Log", log)
+        self._method_impls = {
+            "IsValid": lambda e: not e.destroyed,
+            "Destroy": self._destroy,
+            "GetPos": lambda e: to_lua(e.pos),
+            "Teleport": lambda e, loc=None, rot=None: e.pos.update(from_lua(loc) or {}) if isinstance(loc, LuaTable) else None,
+            "AddTag": lambda e, tag=None: e.tags.add(tag),
+            "RemoveTag": lambda e, tag=None: e.tags.discard(tag),
+            "HasTag": lambda e, tag=None: tag in e.tags,
+            "MoveTo": lambda e, loc=None: "Success",
+            "MoveToActor": lambda e, target=None: "Success",
+            "SetAsHostile": lambda e: "Victory",
+            "AddTrigger": lambda e, kind=None, rng=None, code=None, once=None: self._queue_trigger(code, f"{e.uid}:AddTrigger"),
+        }
+
+    def _destroy(self, entity: Entity, *_):
+        entity.destroyed = True
+
+    def _queue_trigger(self, code, source: str):
+        if isinstance(code, str) and code.strip():
+            self.triggers.append({"source": source, "code": code})
+
+    def _module_impls(self) -> dict:
+        rnd = self.interp.random
+
+        def get_by_id(uid=None, *_):
+            actor = self.actors.get(uid)
+            if actor is None:
+                self.warn(f'World.GetByID("{uid}") 返回 nil（场景中没有该 ID）')
+            return actor
+
+        def spawn_npc(kind=None, name=None, loc=None, *_):
+            return self.spawn(str(name), "NPC", loc)
+
+        def spawn_enemy(eid=None, loc=None, count=1, *_):
+            n = int(count) if isinstance(count, (int, float)) else 1
+            return LuaTable([self.spawn(f"{eid}_{len(self.actors)}", "Enemy", loc) for _ in range(max(0, n))])
+
+        def spawn_enemy_at_player(eid=None, count=1, *_):
+            return spawn_enemy(eid, to_lua(self.actors[PLAYER_ID].pos), count)
+
+        def spawn_encounter(loc=None, rng=None, npc_data=None, lua_type=None, code=None, *_):
+            npcs = [k for k, _ in npc_data.items()] if isinstance(npc_data, LuaTable) else []
+            if not isinstance(code, str):
+                self.warn("World.SpawnEncounter 的 code 不是字符串")
+                code = ""
+            self.encounters.append({"loc": _brief(loc), "range": rng, "npcs": npcs, "trigger": lua_type, "code": code})
+            for uid in npcs:
+                self.spawn(str(uid), "NPC", loc)
+            return None
+
+        def spawn_trigger(loc=None, kind=None, rng=None, code=None, *_):
+            self._queue_trigger(code, "World.SpawnTrigger")
+            return self.spawn(f"trigger_{len(self.triggers)}", "Trigger", loc)
+
+        def destroy_by_id(uid=None, *_):
+            actor = self.actors.get(uid)
+            if actor is None:
+                self.warn(f'World.DestroyByID("{uid}") 找不到对象')
+            else:
+                actor.destroyed = True
+
+        def destroy(obj=None, *_):
+            if isinstance(obj, Entity):
+                obj.destroyed = True
+
+        def wait(seconds=0, *_):
+            if isinstance(seconds, (int, float)) and not isinstance(seconds, bool):
+                self.clock += max(0.0, float(seconds))
+
+        def ask(msg=None, a=None, b=None, *_):
+            return a if self.choice == 1 or b is None else b
+
+        def ask_many(title=None, options=None, *_):
+            if not isinstance(options, LuaTable) or options.length() == 0:
+                self.warn("UI.AskMany 的 options 为空")
+                return None
+            return options.get(min(self.choice, options.length()))
+
+        def hour():
+            return int(8 + self.clock / 3600) % 24
+
+        def clamp(v, lo, hi):
+            return max(lo, min(hi, v))
+
+        def dist(a, b, dims=("X", "Y", "Z")):
+            return sum((float(a.get(k) or 0) - float(b.get(k) or 0)) ** 2 for k in dims) ** 0.5
+
+        return {
+            "World.GetByID": get_by_id, "World.SpawnNPC": spawn_npc, "World.SpawnEnemy": spawn_enemy,
+            "World.SpawnEnemyAtPlayer": spawn_enemy_at_player, "World.SpawnEncounter": spawn_encounter,
+            "World.SpawnTrigger": spawn_trigger, "World.DestroyByID": destroy_by_id, "World.Destroy": destroy,
+            "World.Wait": wait, "World.FindNearest": lambda *a: None,
+            "UI.Ask": ask, "UI.AskMany": ask_many, "UI.PlayMiniGame": lambda *a: "Success",
+            "UI.ShowDialogue": lambda *a: None,
+            "Time.GetDay": lambda: 1 + int(self.clock // 86400), "Time.GetHour": hour,
+            "Time.GetMinute": lambda: int(self.clock // 60) % 60, "Time.IsNight": lambda: not 6 <= hour() < 18,
+            "Time.GetTimeString": lambda: f"Day {1 + int(self.clock // 86400)} {hour():02d}:{int(self.clock // 60) % 60:02d}",
+            "Time.GetScale": lambda: 1.0,
+            "Time.GetInfo": lambda: to_lua({"Day": 1 + int(self.clock // 86400), "Hour": hour(), "Minute": int(self.clock // 60) % 60}),
+            "Time.AddOnceSchedule": self._schedule, "Time.AddDailySchedule": self._schedule,
+            "System.IsRunning": lambda: True,
+            "Math.RandInt": lambda lo, hi: rnd.randint(int(lo), int(hi)),
+            "Math.RandFloat": lambda lo, hi: rnd.uniform(lo, hi), "Math.Chance": lambda p: rnd.random() < p,
+            "Math.GaussianRand": lambda mean, sd: rnd.gauss(mean, sd),
+            "Math.Clamp": clamp, "Math.Min": min, "Math.Max": max, "Math.MinInt": min, "Math.MaxInt": max,
+            "Math.Abs": abs, "Math.Floor": lambda v: int(v // 1), "Math.Ceil": lambda v: -int(-v // 1),
+            "Math.Round": lambda v: int(v + 0.5) if v >= 0 else -int(-v + 0.5),
+            "Math.Sign": lambda v: (v > 0) - (v < 0), "Math.Lerp": lambda a, b, t: a + (b - a) * t,
+            "Math.Dist": lambda a, b: dist(a, b), "Math.Dist2D": lambda a, b: dist(a, b, ("X", "Y")),
+        }
+
+    def _schedule(self, *args):
+        self._schedules += 1
+        return self._schedules
+
+    # --- 执行 ---
+
+    def run(self, stage: str, code: str, line: int = 1, col: int = 1) -> dict:
+        """执行一段代码；返回 {stage, ok, error, steps, calls, wall_ms}。每段单独计预算。"""
+        self.stage = stage
+        interp = self.interp
+        interp.steps = 0
+        interp.deadline = time.perf_counter() + self.timeout
+        calls_before = sum(self.counts.values())
+        result = {"stage": stage, "ok": True, "error": None}
+        started = time.perf_counter()
+        try:
+            interp.run(code, stage, line, col)
+        except LuaSyntaxError as e:
+            result.update(ok=False, error=f"Lua 语法错误: {e}")
+        except LuaBudgetExceeded as e:
+            result.update(ok=False, error=f"line {e.line}: {e}（疑似死循环）")
+        except LuaError as e:
+            result.update(ok=False, error=str(e))
+        result["steps"] = interp.steps
+        result["calls"] = sum(self.counts.values()) - calls_before
+        result["wall_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+
+def dry_run(init_event: str, init_map: str | None = None, start_game: str | None = None,
+            budget: int | None = None, timeout: float | None = None, choice: int = 1,
+            fire_encounters: bool = True) -> dict:
+    """
+    依次执行 InitMap / InitEvent / StartGame（init_map / start_game 为 None 时使用固定阶段代码），
+    再触发每个 encounter（及 SpawnTrigger）的代码。返回调用记录、各段步数与耗时、错误与警告。
+    choice：UI.Ask / AskMany 选择第几个选项（从 1 开始）。
+    """
+    from stage_loader import get_init_map_code, get_start_game_code
+    budget = budget or config.DRY_RUN_BUDGET
+    started = time.perf_counter()
+    box = Sandbox(budget, timeout or config.DRY_RUN_TIMEOUT, choice, config.DRY_RUN_TRACE_MAX)
+    stages = []
+    for stage, code in (
+        ("InitMap", get_init_map_code() if init_map is None else init_map),
+        ("InitEvent", init_event),
+        ("StartGame", get_start_game_code() if start_game is None else start_game),
+    ):
+        if code and code.strip():
+            stages.append(box.run(stage, code))
+
+    encounters = []
+    if fire_encounters:
+        for i, enc in enumerate(box.encounters):
+            name = f"Encounter[{i + 1}]"
+            first = box.run(name, enc["code"])
+            # 再次进入触发盒：有 _G.encXX_done 防重复时不应再调用任何 API
+            again = box.run(f"{name}#2", enc["code"])
+            if again["ok"] and again["calls"]:
+                box.warn(f"{name} 重复触发时仍调用了 {again['calls']} 次 API，可能缺少 _G.encXX_done 防重复")
+            encounters.append({**first, "npcs": enc["npcs"], "loc": enc["loc"], "range": enc["range"],
+                               "retrigger_calls": again["calls"]})
+        for i, trig in enumerate(box.triggers):
+            encounters.append({**box.run(f"Trigger[{i + 1}]", trig["code"]), "source": trig["source"]})
+
+    runs = stages + encounters
+    errors = [f"[{r['stage']}] {r['error']}" for r in runs if not r["ok"]]
+    return {
+        "ok": not errors,
+        "errors": errors,
+        "warnings": box.warnings,
+        "stages": stages,
+        "encounters": encounters,
+        "counts": dict(box.counts.most_common()),
+        "trace": box.trace,
+        "trace_dropped": box.trace_dropped,
+        "steps": sum(r["steps"] for r in runs),
+        "budget": budget,
+        "virtual_time": round(box.clock, 3),
+        "output": box.interp.output,
+        "wall_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="离线执行生成的 LUA（InitMap / InitEvent / StartGame + encounter 触发）")
+    parser.add_argument("init_event", help="InitEvent 代码文件")
+    parser.add_argument("--init-map", help="InitMap 代码文件（默认固定阶段 step1~3）")
+    parser.add_argument("--start-game", help="StartGame 代码文件（默认 step5）")
+    parser.add_argument("--budget", type=int, help="每段代码的指令预算")
+    parser.add_argument("--choice", type=int, default=1, help="UI.Ask / AskMany 选择第几个选项")
+    parser.add_argument("--trace", action="store_true", help="输出完整调用记录")
+    args = parser.parse_args()
+    read = lambda p: Path(p).read_text(encoding="utf-8") if p else None  # noqa: E731
+    report = dry_run(read(args.init_event), read(args.init_map), read(args.start_game), args.budget, choice=args.choice)
+    if not args.trace:
+        report.pop("trace")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(0 if report["ok"] else 1)
@@ -0,0 +1,278 @@
+"""
+Job queue: 长时间生成以任务形式提交，立即返回 job_id，由本地 worker 池执行 run_full_pipeline_async。
+任务状态与结果持久化在 SQLite，服务重启后已完成的结果仍可获取。
+客户端可轮询、长轮询（wait）或订阅完成通知（HTTP SSE / TCP 推送）。
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable
+
+import config
+from orchestrator import run_full_pipeline_async
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class JobStore:
+    """SQLite 任务存储（线程安全）。api_key 不落盘。"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, "
+                "result TEXT, error TEXT, created REAL NOT NULL, started REAL, finished REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created)")
+            self._db.commit()
+        return self._db
+
+    def create(self, kind: str, params: dict) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            db = self._conn()
+            db.execute(
+                "INSERT INTO jobs (job_id, kind, status, params, created) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(params, ensure_ascii=False), time.time()),
+            )
+            (count,) = db.execute("SELECT COUNT(*) FROM jobs").fetchone()
+            if count > config.JOBS_MAX:
+                db.execute(
+                    "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE status IN "
+                    "('succeeded', 'failed', 'cancelled') ORDER BY created LIMIT ?)",
+                    (count - config.JOBS_MAX,),
+                )
+            db.commit()
+        return job_id
+
+    def mark_running(self, job_id: str) -> None:
+        with self._lock:
+            db = self._conn()
+            db.execute("UPDATE jobs SET status = 'running', started = ? WHERE job_id = ?", (time.time(), job_id))
+            db.commit()
+
+    def finish(self, job_id: str, status: str, result: dict | None = None, error: str | None = None) -> None:
+        with self._lock:
+            db = self._conn()
+            db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE job_id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job_id),
+            )
+            db.commit()
+
+    def get(self, job_id: str, with_result: bool = False) -> dict | None:
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT job_id, kind, status, error, created, started, finished, result FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        record = {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "error": row[3],
+            "created": row[4],
+            "started": row[5],
+            "finished": row[6],
+        }
+        if with_result:
+            record["result"] = json.loads(row[7]) if row[7] else None
+        return record
+
+    def list(self, limit: int = 20) -> list[dict]:
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT job_id, kind, status, error, created, started, finished FROM jobs "
+                "ORDER BY created DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        keys = ("job_id", "kind", "status", "error", "created", "started", "finished")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def fail_interrupted(self) -> int:
+        """启动时调用：上次进程未完成的任务无法恢复（api_key 不落盘），标记为失败。"""
+        with self._lock:
+            db = self._conn()
+            cur = db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart', finished = ? "
+                "WHERE status IN ('queued', 'running')",
+                (time.time(),),
+            )
+            db.commit()
+            return cur.rowcount
+
+
+class JobManager:
+    """在独立线程的事件循环中执行任务，并发数受 JOB_WORKERS 限制。HTTP 与 TCP（任意线程）均可提交。"""
+
+    def __init__(self, store: JobStore, workers: int):
+        self.store = store
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._stages: dict[str, str] = {}
+        self._subscribers: dict[str, list[Callable[[dict], None]]] = {}
+        self._pending_cancel: set[str] = set()  # 已提交但 _run 尚未登记 task 时收到的取消
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="job-workers", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, kwargs: dict) -> str:
+        """提交生成任务（kwargs 为 run_full_pipeline_async 参数），立即返回 job_id。"""
+        params = {k: v for k, v in kwargs.items() if k != "api_key"}
+        job_id = self.store.create("generate", params)
+        asyncio.run_coroutine_threadsafe(self._run(job_id, kwargs), self._ensure_loop())
+        return job_id
+
+    async def _run(self, job_id: str, kwargs: dict) -> None:
+        with self._lock:
+            cancelled = job_id in self._pending_cancel
+            self._pending_cancel.discard(job_id)
+            if not cancelled:
+                self._tasks[job_id] = asyncio.current_task()
+        if cancelled:
+            self.store.finish(job_id, "cancelled", error="Cancelled")
+            self._notify(job_id)
+            return
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+
+        async def on_event(event: str, data: dict) -> None:
+            if event == "stage":
+                self._stages[job_id] = data.get("stage", "")
+
+        try:
+            async with self._semaphore:
+                self.store.mark_running(job_id)
+                result = await run_full_pipeline_async(**kwargs, on_event=on_event)
+            self.store.finish(job_id, "succeeded", result=result)
+        except asyncio.CancelledError:
+            self.store.finish(job_id, "cancelled", error="Cancelled")
+        except Exception as e:
+            self.store.finish(job_id, "failed", error=str(e))
+        finally:
+            self._tasks.pop(job_id, None)
+            self._stages.pop(job_id, None)
+            self._notify(job_id)
+
+    def get(self, job_id: str, with_result: bool = False) -> dict | None:
+        record = self.store.get(job_id, with_result=with_result)
+        if record is not None and record["status"] == "running":
+            record["stage"] = self._stages.get(job_id)
+        return record
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队中或运行中的任务；已提交但 worker 尚未开始的任务记为待取消，由 _run 开始时处理。"""
+        with self._lock:
+            task = self._tasks.get(job_id)
+            if task is None:
+                record = self.store.get(job_id)
+                if record is None or record["status"] != "queued":
+                    return False
+                self._pending_cancel.add(job_id)
+                return True
+        self._loop.call_soon_threadsafe(task.cancel)
+        return True
+
+    def subscribe(self, job_id: str, callback: Callable[[dict], None]) -> Callable[[], None] | None:
+        """
+        任务结束时以状态记录回调 callback（在 worker 线程中调用）；已结束则立即回调。
+        返回取消订阅函数（等待超时的调用方需在 finally 中调用，避免回调堆积）；job 不存在返回 None。
+        """
+        with self._lock:
+            record = self.store.get(job_id)
+            if record is None:
+                return None
+            if record["status"] not in FINISHED:
+                self._subscribers.setdefault(job_id, []).append(callback)
+                return lambda: self._unsubscribe(job_id, callback)
+        callback(record)
+        return lambda: None
+
+    def _unsubscribe(self, job_id: str, callback: Callable[[dict], None]) -> None:
+        with self._lock:
+            callbacks = self._subscribers.get(job_id)
+            if callbacks and callback in callbacks:
+                callbacks.remove(callback)
+                if not callbacks:
+                    del self._subscribers[job_id]
+
+    def _notify(self, job_id: str) -> None:
+        with self._lock:
+            callbacks = self._subscribers.pop(job_id, [])
+        if not callbacks:
+            return
+        record = self.store.get(job_id)
+        for cb in callbacks:
+            try:
+                cb(record)
+            except Exception:
+                pass
+
+    def wait(self, job_id: str, timeout: float) -> dict | None:
+        """阻塞等待任务结束（最多 timeout 秒），返回最新状态记录。供线程内调用（如 TCP 长轮询）。"""
+        done = threading.Event()
+        unsubscribe = self.subscribe(job_id, lambda _record: done.set())
+        if unsubscribe is None:
+            return None
+        try:
+            done.wait(timeout)
+        finally:
+            unsubscribe()
+        return self.get(job_id)
+
+    async def wait_async(self, job_id: str, timeout: float) -> dict | None:
+        """在调用方事件循环中等待任务结束（最多 timeout 秒），不占用线程。"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def _done(_record: dict) -> None:
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(None))
+
+        unsubscribe = self.subscribe(job_id, _done)
+        if unsubscribe is None:
+            return None
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            unsubscribe()
+        return self.get(job_id)
+
+
+_manager: JobManager | None = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """进程级共享实例；首次获取时将上次进程遗留的未完成任务标记为失败。"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            store = JobStore(config.JOBS_PATH)
+            store.fail_interrupted()
+            _manager = JobManager(store, config.JOB_WORKERS)
+        return _manager
@@ -0,0 +1,164 @@
+"""
+LLM response cache: 内容寻址（model + messages/input + reasoning + 素材库指纹 的哈希）。
+内存 LRU 在前，SQLite 持久化在后；支持容量上限、TTL 与命中统计。
+同一故事、同一模型、同一素材库重复生成时直接返回缓存结果，不再调用 API。
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import config
+
+
+def make_key(model: str, payload, reasoning: dict | None = None, fingerprint: str = "") -> str:
+    """缓存键：对 (model, messages/input, reasoning, 素材库指纹) 的规范化 JSON 取 sha256。"""
+    raw = json.dumps(
+        {"model": model, "payload": payload, "reasoning": reasoning, "assets": fingerprint},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def asset_fingerprint(assets: dict | None) -> str:
+    """素材库指纹：资产集合不变则指纹不变。"""
+    if not assets:
+        return ""
+    raw = json.dumps(assets, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class LLMCache:
+    """内存 LRU + SQLite 两级缓存（线程安全）。"""
+
+    def __init__(self, path: Path | None, max_memory: int = 256, max_disk: int = 5000, ttl: float = 0):
+        self.path = Path(path) if path else None
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.ttl = ttl  # 秒；0 表示不过期
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "bypassed": 0}
+
+    def _conn(self) -> sqlite3.Connection | None:
+        if self.path is None:
+            return None
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed)")
+            self._db.commit()
+        return self._db
+
+    def _expired(self, created: float, now: float) -> bool:
+        return bool(self.ttl) and now - created > self.ttl
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+            db = self._conn()
+            if db is not None:
+                row = db.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                        db.commit()
+                        self._remember(key, row[0], row[1])
+                        self._stats["hits"] += 1
+                        self._stats["disk_hits"] += 1
+                        return row[0]
+                    db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    db.commit()
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._stats["writes"] += 1
+            db = self._conn()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            # 超出磁盘容量时按最近访问时间淘汰
+            (count,) = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            if count > self.max_disk:
+                db.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)",
+                    (count - self.max_disk,),
+                )
+            if self.ttl:
+                db.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+            db.commit()
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            db = self._conn()
+            if db is not None:
+                db.execute("DELETE FROM llm_cache")
+                db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            db = self._conn()
+            stats["disk_entries"] = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] if db else 0
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["enabled"] = config.LLM_CACHE_ENABLED
+        stats["ttl"] = self.ttl
+        stats["max_memory"] = self.max_memory
+        stats["max_disk"] = self.max_disk
+        return stats
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache:
+    """进程级共享缓存实例。"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                config.LLM_CACHE_PATH,
+                max_memory=config.LLM_CACHE_MEMORY_ENTRIES,
+                max_disk=config.LLM_CACHE_DISK_ENTRIES,
+                ttl=config.LLM_CACHE_TTL,
+            )
+        return _cache
@@ -0,0 +1,166 @@
+"""
+LLM client registry: 按 (api_key, base_url) 复用 OpenAI / AsyncOpenAI 客户端。
+每个客户端持有 keep-alive HTTP 连接池，NPC 思考/对话等高频请求不再每次重新 TLS 握手。
+客户端数量有上限，超出时按 LRU 淘汰并关闭最久未用的客户端。
+AsyncOpenAI 的连接池绑定事件循环，按循环分表；同步调用方经 run_sync 共用一个常驻后台循环，不再每次新建循环与客户端。
+"""
+import asyncio
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Coroutine
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+import config
+
+_lock = threading.Lock()
+_sync_clients: "OrderedDict[tuple, OpenAI]" = OrderedDict()
+# AsyncOpenAI 的连接池绑定创建时的事件循环：事件循环（弱引用，循环被回收时整表释放）-> {(api_key, base_url): 客户端}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OrderedDict[tuple, AsyncOpenAI]]" = \
+    weakref.WeakKeyDictionary()
+_sync_loop: asyncio.AbstractEventLoop | None = None
+
+_stats = {
+    "clients_created": 0,
+    "clients_reused": 0,
+    "clients_evicted": 0,
+    "requests": 0,
+    "connections_opened": 0,
+}
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _lock:
+        _stats[key] += n
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_MAX_KEEPALIVE,
+        keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+# httpcore 的 trace 扩展：每次新建 TCP 连接时触发 connection.connect_tcp.*，
+# 请求数 - 新建连接数 = 复用 keep-alive 连接的请求数
+def _trace(event_name: str, info: dict) -> None:
+    if event_name == "connection.connect_tcp.complete":
+        _count("connections_opened")
+
+
+async def _trace_async(event_name: str, info: dict) -> None:
+    _trace(event_name, info)
+
+
+def _on_request(request: httpx.Request) -> None:
+    _count("requests")
+    request.extensions["trace"] = _trace
+
+
+async def _on_request_async(request: httpx.Request) -> None:
+    _count("requests")
+    request.extensions["trace"] = _trace_async
+
+
+def _resolve_base_url(base_url: str | None) -> str | None:
+    return base_url or config.OPENAI_BASE_URL or None
+
+
+def get_client(api_key: str, base_url: str | None = None) -> OpenAI:
+    """返回 (api_key, base_url) 对应的共享 OpenAI 客户端（线程安全）。"""
+    key = (api_key, _resolve_base_url(base_url))
+    evicted = []
+    with _lock:
+        client = _sync_clients.get(key)
+        if client is not None:
+            _sync_clients.move_to_end(key)
+            _stats["clients_reused"] += 1
+            return client
+        client = OpenAI(
+            api_key=api_key,
+            base_url=key[1],
+            http_client=DefaultHttpxClient(limits=_limits(), event_hooks={"request": [_on_request]}),
+        )
+        _sync_clients[key] = client
+        _stats["clients_created"] += 1
+        while len(_sync_clients) > max(1, config.LLM_CLIENT_POOL_SIZE):
+            _, old = _sync_clients.popitem(last=False)
+            evicted.append(old)
+            _stats["clients_evicted"] += 1
+    for old in evicted:
+        try:
+            old.close()
+        except Exception:
+            pass
+    return client
+
+
+def get_async_client(api_key: str, base_url: str | None = None) -> AsyncOpenAI:
+    """返回当前事件循环内 (api_key, base_url) 对应的共享 AsyncOpenAI 客户端。须在事件循环中调用。"""
+    loop = asyncio.get_running_loop()
+    key = (api_key, _resolve_base_url(base_url))
+    evicted = []
+    with _lock:
+        clients = _async_clients.get(loop)
+        if clients is None:
+            clients = _async_clients[loop] = OrderedDict()
+        client = clients.get(key)
+        if client is not None:
+            clients.move_to_end(key)
+            _stats["clients_reused"] += 1
+            return client
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=key[1],
+            http_client=DefaultAsyncHttpxClient(limits=_limits(), event_hooks={"request": [_on_request_async]}),
+        )
+        clients[key] = client
+        _stats["clients_created"] += 1
+        # 上限按循环计：常驻循环（FastAPI / TCP / 任务 worker / run_sync）各自保留最近使用的客户端
+        while len(clients) > max(1, config.LLM_CLIENT_POOL_SIZE):
+            _, old = clients.popitem(last=False)
+            evicted.append(old)
+            _stats["clients_evicted"] += 1
+    for old in evicted:
+        loop.create_task(old.close())
+    return client
+
+
+async def close_async_clients() -> None:
+    """关闭当前事件循环的全部 AsyncOpenAI 客户端（自行创建短生命周期循环的调用方在循环结束前调用）。"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, None)
+    if clients:
+        await asyncio.gather(*(c.close() for c in clients.values()), return_exceptions=True)
+
+
+def run_sync(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    在常驻后台事件循环中执行协程并等待结果，供同步调用方（线程 / 脚本）使用。
+    与 asyncio.run 不同，循环不随调用结束而关闭，其 AsyncOpenAI 客户端与 keep-alive 连接在多次调用间复用。
+    """
+    global _sync_loop
+    with _lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="llm-sync-loop", daemon=True).start()
+        loop = _sync_loop
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def get_pool_stats() -> dict:
+    """连接池统计：客户端数量、请求数、新建连接数、复用连接数。"""
+    with _lock:
+        stats = dict(_stats)
+        stats["sync_clients"] = len(_sync_clients)
+        stats["async_clients"] = sum(len(c) for c in _async_clients.values())
+    stats["connections_reused"] = max(0, stats["requests"] - stats["connections_opened"])
+    stats["pool_size"] = config.LLM_CLIENT_POOL_SIZE
+    stats["max_connections"] = config.LLM_MAX_CONNECTIONS
+    stats["max_keepalive"] = config.LLM_MAX_KEEPALIVE
+    stats["keepalive_expiry"] = config.LLM_KEEPALIVE_EXPIRY
+    return stats
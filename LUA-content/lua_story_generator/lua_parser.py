@@ -0,0 +1,915 @@
+"""
+Lua lexer / parser（纯 Python，Lua 5.3 语法，兼容 5.4 的 <const>/<close>）。
+parse(source) 一次构建 AST，语法错误抛出带行列号的 LuaSyntaxError；walk(node) 按源码顺序遍历节点。
+供 validate_lua 的规则访问器使用。
+"""
+import gc
+import re
+
+KEYWORDS = frozenset(
+    "and break do else elseif end false for function goto if in local nil not or repeat return then true until while".split()
+)
+_NAME_TYPE = {k: k for k in KEYWORDS}  # 名字 token 的 type：关键字为其文本，其余为 "name"（dict.get 比 in + 条件表达式快）
+
+# 每次匹配跳过行内空白并捕获一个 token；按命中的分组（m.lastindex）分派，注释、转义等由 tokenize 处理
+_TOKEN_RE = re.compile(r"""
+    [ \t\r\f\v]*
+    (?:
+        (\.\.\.|\.\.|==|~=|<=|>=|<<|>>|//|::|-(?!-)|[+*/%^\#&~|<>=(){};:,\]]|\[(?!=*\[)|\.(?![0-9]))   # 1 运算符
+      | ([A-Za-z_][A-Za-z0-9_]*)                                                          # 2 名字 / 关键字
+      | (0[xX](?:[0-9a-fA-F]+(?:\.[0-9a-fA-F]*)?|\.[0-9a-fA-F]+)(?:[pP][+-]?[0-9]+)?
+        |(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)                              # 3 数字
+      | (\n)                                                                             # 4 换行
+      | ("(?:[^"\\\n]|\\z\s*|\\.)*"|'(?:[^'\\\n]|\\z\s*|\\.)*')                          # 5 短字符串（\z 可跨行）
+      | (--)                                                                             # 6 注释
+      | (\[(=*)\[.*?\]\8\])                                                               # 7 长字符串（8 为等号）
+      | (\[=*\[|["'])                                                                     # 9 未结束的字符串
+      | ($)                                                                              # 10 结尾
+      | (.)                                                                              # 11 非法字符
+    )
+""", re.VERBOSE | re.DOTALL)
+
+_LONG_BRACKET = re.compile(r"\[(=*)\[")
+_ESC_RE = re.compile(r"\\(?:([0-9]{1,3})|x([0-9a-fA-F]{2})|u\{([0-9a-fA-F]+)\}|z\s*|(\r\n|\n\r|\n|\r)|(.))", re.DOTALL)
+_SIMPLE_ESC = {"a": "\a", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v",
+               "\\": "\\", '"': '"', "'": "'"}
+
+
+# 二元运算符优先级 (左, 右)，与 lparser.c 一致
+_BINARY = {
+    "or": (1, 1), "and": (2, 2),
+    "<": (3, 3), ">": (3, 3), "<=": (3, 3), ">=": (3, 3), "~=": (3, 3), "==": (3, 3),
+    "|": (4, 4), "~": (5, 5), "&": (6, 6), "<<": (7, 7), ">>": (7, 7),
+    "..": (9, 8), "+": (10, 10), "-": (10, 10),
+    "*": (11, 11), "/": (11, 11), "//": (11, 11), "%": (11, 11),
+    "^": (14, 13),
+}
+_UNARY = frozenset(("not", "-", "#", "~"))
+_UNARY_PRIORITY = 12
+_BLOCK_END = frozenset(("else", "elseif", "end", "until", "<eof>"))
+_MAX_LEVELS = 200  # 语句块 / 表达式嵌套上限，同 LUAI_MAXCCALLS；不依赖 Python 递归上限（dry run 会调高它）
+
+
+class LuaSyntaxError(Exception):
+    """语法错误；str() 为 "line N:M: 描述"。"""
+
+    def __init__(self, msg: str, line: int, col: int):
+        super().__init__(f"line {line}:{col}: {msg}")
+        self.msg = msg
+        self.line = line
+        self.col = col
+
+
+# --- AST ---
+
+class Node:
+    """AST 节点基类：kind、起始行列；_fields 为子节点字段（按源码顺序）。"""
+    __slots__ = ("line", "col")
+    kind = "Node"
+    _fields = ()
+
+    def children(self):
+        for f in self._fields:
+            v = getattr(self, f)
+            if isinstance(v, Node):
+                yield v
+            elif isinstance(v, list):
+                for x in v:
+                    if isinstance(x, Node):
+                        yield x
+
+    def __repr__(self):
+        return f"<{self.kind} {self.line}:{self.col}>"
+
+
+class Chunk(Node):
+    __slots__ = ("body",)
+    kind = "Chunk"
+    _fields = ("body",)
+
+    def __init__(self, line, col, body):
+        self.line, self.col, self.body = line, col, body
+
+
+class Local(Node):
+    __slots__ = ("names", "attribs", "exprs")
+    kind = "Local"
+    _fields = ("exprs",)
+
+    def __init__(self, line, col, names, attribs, exprs):
+        self.line, self.col, self.names, self.attribs, self.exprs = line, col, names, attribs, exprs
+
+
+class Assign(Node):
+    __slots__ = ("targets", "exprs")
+    kind = "Assign"
+    _fields = ("targets", "exprs")
+
+    def __init__(self, line, col, targets, exprs):
+        self.line, self.col, self.targets, self.exprs = line, col, targets, exprs
+
+
+class CallStat(Node):
+    __slots__ = ("call",)
+    kind = "CallStat"
+    _fields = ("call",)
+
+    def __init__(self, line, col, call):
+        self.line, self.col, self.call = line, col, call
+
+
+class Do(Node):
+    __slots__ = ("body",)
+    kind = "Do"
+    _fields = ("body",)
+
+    def __init__(self, line, col, body):
+        self.line, self.col, self.body = line, col, body
+
+
+class While(Node):
+    __slots__ = ("cond", "body")
+    kind = "While"
+    _fields = ("cond", "body")
+
+    def __init__(self, line, col, cond, body):
+        self.line, self.col, self.cond, self.body = line, col, cond, body
+
+
+class Repeat(Node):
+    __slots__ = ("body", "cond")
+    kind = "Repeat"
+    _fields = ("body", "cond")
+
+    def __init__(self, line, col, body, cond):
+        self.line, self.col, self.body, self.cond = line, col, body, cond
+
+
+class If(Node):
+    """tests[i] 对应 blocks[i]（if / elseif），orelse 为 else 分支。"""
+    __slots__ = ("tests", "blocks", "orelse")
+    kind = "If"
+
+    def __init__(self, line, col, tests, blocks, orelse):
+        self.line, self.col, self.tests, self.blocks, self.orelse = line, col, tests, blocks, orelse
+
+    def children(self):
+        for test, block in zip(self.tests, self.blocks):
+            yield test
+            yield from block
+        yield from self.orelse
+
+
+class NumericFor(Node):
+    __slots__ = ("var", "start", "stop", "step", "body")
+    kind = "NumericFor"
+    _fields = ("start", "stop", "step", "body")
+
+    def __init__(self, line, col, var, start, stop, step, body):
+        self.line, self.col, self.var, self.start, self.stop, self.step, self.body = line, col, var, start, stop, step, body
+
+
+class GenericFor(Node):
+    __slots__ = ("names", "exprs", "body")
+    kind = "GenericFor"
+    _fields = ("exprs", "body")
+
+    def __init__(self, line, col, names, exprs, body):
+        self.line, self.col, self.names, self.exprs, self.body = line, col, names, exprs, body
+
+
+class Function(Node):
+    """function a.b:c() ... end；name 为点分名（含 :method）。"""
+    __slots__ = ("name", "target", "method", "func")
+    kind = "Function"
+    _fields = ("func",)
+
+    def __init__(self, line, col, name, target, method, func):
+        self.line, self.col, self.name, self.target, self.method, self.func = line, col, name, target, method, func
+
+
+class LocalFunction(Node):
+    __slots__ = ("name", "func")
+    kind = "LocalFunction"
+    _fields = ("func",)
+
+    def __init__(self, line, col, name, func):
+        self.line, self.col, self.name, self.func = line, col, name, func
+
+
+class Return(Node):
+    __slots__ = ("exprs",)
+    kind = "Return"
+    _fields = ("exprs",)
+
+    def __init__(self, line, col, exprs):
+        self.line, self.col, self.exprs = line, col, exprs
+
+
+class Break(Node):
+    __slots__ = ()
+    kind = "Break"
+
+    def __init__(self, line, col):
+        self.line, self.col = line, col
+
+
+class Goto(Node):
+    __slots__ = ("label",)
+    kind = "Goto"
+
+    def __init__(self, line, col, label):
+        self.line, self.col, self.label = line, col, label
+
+
+class Label(Node):
+    __slots__ = ("name",)
+    kind = "Label"
+
+    def __init__(self, line, col, name):
+        self.line, self.col, self.name = line, col, name
+
+
+class Nil(Node):
+    __slots__ = ()
+    kind = "Nil"
+
+    def __init__(self, line, col):
+        self.line, self.col = line, col
+
+
+class TrueExpr(Node):
+    __slots__ = ()
+    kind = "True"
+
+    def __init__(self, line, col):
+        self.line, self.col = line, col
+
+
+class FalseExpr(Node):
+    __slots__ = ()
+    kind = "False"
+
+    def __init__(self, line, col):
+        self.line, self.col = line, col
+
+
+class Vararg(Node):
+    __slots__ = ()
+    kind = "Vararg"
+
+    def __init__(self, line, col):
+        self.line, self.col = line, col
+
+
+class Number(Node):
+    __slots__ = ("value",)
+    kind = "Number"
+
+    def __init__(self, line, col, value):
+        self.line, self.col, self.value = line, col, value
+
+
+class String(Node):
+    """value 为解码后的内容；body_line / body_col 为正文在源码中的起始位置（解析嵌入代码时使用）。"""
+    __slots__ = ("value", "body_line", "body_col")
+    kind = "String"
+
+    def __init__(self, line, col, value, body_line=None, body_col=None):
+        self.line, self.col, self.value = line, col, value
+        self.body_line = line if body_line is None else body_line
+        self.body_col = col if body_col is None else body_col
+
+
+class FunctionExpr(Node):
+    __slots__ = ("params", "vararg", "body")
+    kind = "FunctionExpr"
+    _fields = ("body",)
+
+    def __init__(self, line, col, params, vararg, body):
+        self.line, self.col, self.params, self.vararg, self.body = line, col, params, vararg, body
+
+
+class Table(Node):
+    __slots__ = ("fields",)
+    kind = "Table"
+    _fields = ("fields",)
+
+    def __init__(self, line, col, fields):
+        self.line, self.col, self.fields = line, col, fields
+
+
+class Field(Node):
+    """表字段：key 为 None（位置字段）、String（name = 值）或任意表达式（[expr] = 值）。"""
+    __slots__ = ("key", "value")
+    kind = "Field"
+    _fields = ("key", "value")
+
+    def __init__(self, line, col, key, value):
+        self.line, self.col, self.key, self.value = line, col, key, value
+
+
+class BinOp(Node):
+    __slots__ = ("op", "left", "right")
+    kind = "BinOp"
+    _fields = ("left", "right")
+
+    def __init__(self, line, col, op, left, right):
+        self.line, self.col, self.op, self.left, self.right = line, col, op, left, right
+
+
+class UnOp(Node):
+    __slots__ = ("op", "operand")
+    kind = "UnOp"
+    _fields = ("operand",)
+
+    def __init__(self, line, col, op, operand):
+        self.line, self.col, self.op, self.operand = line, col, op, operand
+
+
+class Name(Node):
+    __slots__ = ("name",)
+    kind = "Name"
+
+    def __init__(self, line, col, name):
+        self.line, self.col, self.name = line, col, name
+
+
+class Index(Node):
+    """obj[key]；a.b 的 key 为 String。"""
+    __slots__ = ("obj", "key")
+    kind = "Index"
+    _fields = ("obj", "key")
+
+    def __init__(self, line, col, obj, key):
+        self.line, self.col, self.obj, self.key = line, col, obj, key
+
+
+class Call(Node):
+    __slots__ = ("func", "args")
+    kind = "Call"
+    _fields = ("func", "args")
+
+    def __init__(self, line, col, func, args):
+        self.line, self.col, self.func, self.args = line, col, func, args
+
+
+class MethodCall(Node):
+    __slots__ = ("obj", "method", "args")
+    kind = "MethodCall"
+    _fields = ("obj", "args")
+
+    def __init__(self, line, col, obj, method, args):
+        self.line, self.col, self.obj, self.method, self.args = line, col, obj, method, args
+
+
+class Paren(Node):
+    __slots__ = ("expr",)
+    kind = "Paren"
+    _fields = ("expr",)
+
+    def __init__(self, line, col, expr):
+        self.line, self.col, self.expr = line, col, expr
+
+
+def walk(node: Node):
+    """前序遍历（按源码顺序）。"""
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        yield n
+        stack.extend(reversed(list(n.children())))
+
+
+def dotted(expr: Node) -> str | None:
+    """Name / 常量键 Index 链的点分名，如 World.GetByID；其它表达式返回 None。"""
+    parts = []
+    while expr.kind == "Index":
+        if expr.key.kind != "String":
+            return None
+        parts.append(expr.key.value)
+        expr = expr.obj
+    if expr.kind != "Name":
+        return None
+    parts.append(expr.name)
+    return ".".join(reversed(parts))
+
+
+def call_name(node: Node) -> str | None:
+    """Call 返回点分函数名；MethodCall 返回方法名；其它节点返回 None。"""
+    if node.kind == "Call":
+        return dotted(node.func)
+    if node.kind == "MethodCall":
+        return node.method
+    return None
+
+
+# --- lexer ---
+
+def _unescape(s: str, line: int, col: int) -> str:
+    if "\\" not in s:
+        return s
+
+    def repl(m):
+        dec, hx, uni, nl, ch = m.groups()
+        if dec:
+            if int(dec) > 255:
+                raise LuaSyntaxError("decimal escape too large", line, col)
+            return chr(int(dec))
+        if hx:
+            return chr(int(hx, 16))
+        if uni:
+            if int(uni, 16) > 0x10FFFF:
+                raise LuaSyntaxError("UTF-8 value too large", line, col)
+            return chr(int(uni, 16))
+        if nl is not None:
+            return "\n"
+        if ch is not None:
+            if ch not in _SIMPLE_ESC:
+                raise LuaSyntaxError(f"invalid escape sequence '\\{ch}'", line, col)
+            return _SIMPLE_ESC[ch]
+        return ""  # \z
+
+    return _ESC_RE.sub(repl, s)
+
+
+def _skip_comment(source: str, pos: int, line: int, col: int) -> int:
+    """pos 位于 "--" 之后；返回注释结束位置（行注释止于换行符之前）。"""
+    m = _LONG_BRACKET.match(source, pos)
+    if m:
+        end = source.find("]" + m.group(1) + "]", m.end())
+        if end < 0:
+            raise LuaSyntaxError("unfinished long comment near '<eof>'", line, col)
+        return end + len(m.group(1)) + 2
+    end = source.find("\n", pos)
+    return len(source) if end < 0 else end
+
+
+def tokenize(source: str, line: int = 1, col: int = 1) -> list[tuple]:
+    """
+    返回 token 元组列表 (type, value, line, col)。type 为 name / number / string / <eof>，
+    关键字与运算符的 type 即其文本。string token 额外带正文起始行列 (…, body_line, body_col)。
+    line / col 为源码首字符在外层文件中的位置（解析嵌入的代码字符串时使用）。
+    """
+    tokens = []
+    append = tokens.append
+    name_type = _NAME_TYPE.get
+    line_start = 1 - col  # 当前行首字符的下标，列号 = pos - line_start + 1
+    pos, end = 0, len(source)
+    while pos <= end:
+        for m in _TOKEN_RE.finditer(source, pos):
+            g = m.lastindex
+            if g == 1:
+                text = m[1]
+                append((text, text, line, m.start(1) - line_start + 1))
+                continue
+            if g == 2:
+                text = m[2]
+                append((name_type(text, "name"), text, line, m.start(2) - line_start + 1))
+                continue
+            if g == 3:
+                append(("number", m[3], line, m.start(3) - line_start + 1))
+                continue
+            if g == 4:
+                line += 1
+                line_start = m.end()
+                continue
+            if g == 10:
+                pos = end + 1
+                break
+            s, e = m.span(g)
+            text = source[s:e]
+            c = s - line_start + 1
+            if g == 5:
+                append(("string", _unescape(text[1:-1], line, c), line, c, line, c + 1))
+                if "\n" in text:  # 反斜杠续行
+                    line += text.count("\n")
+                    line_start = s + text.rfind("\n") + 1
+            elif g == 6:
+                # 注释：跳过后从注释结尾重新开始匹配
+                pos = _skip_comment(source, e, line, c)
+                nl = source.count("\n", e, pos)
+                if nl:
+                    line += nl
+                    line_start = source.rfind("\n", e, pos) + 1
+                break
+            elif g == 7:
+                level = len(m.group(8)) + 2
+                body, body_line, body_col = text[level:-level], line, c + level
+                if body.startswith("\r\n") or body.startswith("\n\r"):
+                    body, body_line, body_col = body[2:], line + 1, 1
+                elif body.startswith("\n") or body.startswith("\r"):
+                    body, body_line, body_col = body[1:], line + 1, 1
+                append(("string", body, line, c, body_line, body_col))
+                if "\n" in text:
+                    line += text.count("\n")
+                    line_start = s + text.rfind("\n") + 1
+            elif g == 9:
+                if text[0] == "[":
+                    raise LuaSyntaxError("unfinished long string near '<eof>'", line, c)
+                near = source[s:s + 20].splitlines()[0]
+                raise LuaSyntaxError(f"unfinished string near '{near}'", line, c)
+            else:
+                raise LuaSyntaxError(f"unexpected symbol near '{text}'", line, c)
+        else:
+            break
+    append(("<eof>", "<eof>", line, end - line_start + 1))
+    return tokens
+
+
+# --- parser ---
+
+class _Parser:
+    """递归下降，结构与 lparser.c 对应。"""
+
+    def __init__(self, tokens: list[tuple]):
+        self.tokens = tokens
+        self.i = 0
+        self.tok = tokens[0]
+        self.level = 0
+
+    def next(self) -> tuple:
+        t = self.tok
+        self.i += 1
+        self.tok = self.tokens[self.i]
+        return t
+
+    def near(self) -> str:
+        t = self.tok
+        if t[0] == "<eof>":
+            return "<eof>"
+        if t[0] == "string":
+            return repr(t[1][:20])
+        return f"'{t[1]}'"
+
+    def error(self, msg: str):
+        raise LuaSyntaxError(f"{msg} near {self.near()}", self.tok[2], self.tok[3])
+
+    def check_next(self, what: str) -> tuple:
+        if self.tok[0] != what:
+            self.error(f"'{what}' expected")
+        return self.next()
+
+    def check_match(self, what: str, who: str, line: int) -> None:
+        if self.tok[0] != what:
+            if line == self.tok[2]:
+                self.error(f"'{what}' expected")
+            self.error(f"'{what}' expected (to close '{who}' at line {line})")
+        self.next()
+
+    def enter_level(self) -> None:
+        self.level += 1
+        if self.level > _MAX_LEVELS:
+            raise LuaSyntaxError("chunk has too many syntax levels", self.tok[2], self.tok[3])
+
+    def check_name(self) -> str:
+        if self.tok[0] != "name":
+            self.error("<name> expected")
+        return self.next()[1]
+
+    # --- statements ---
+
+    def block(self) -> list[Node]:
+        self.enter_level()
+        stats = []
+        while self.tok[0] not in _BLOCK_END:
+            if self.tok[0] == "return":
+                stats.append(self.retstat())
+                break
+            s = self.statement()
+            if s is not None:
+                stats.append(s)
+        self.level -= 1
+        return stats
+
+    def retstat(self) -> Node:
+        _, _, line, col = self.next()
+        exprs = [] if self.tok[0] in _BLOCK_END or self.tok[0] == ";" else self.exprlist()
+        if self.tok[0] == ";":
+            self.next()
+        return Return(line, col, exprs)
+
+    def statement(self) -> Node | None:
+        k, _, line, col = self.tok[:4]
+        if k == "name" or k == "(":
+            return self.exprstat(line, col)
+        if k == "local":
+            self.next()
+            if self.tok[0] == "function":
+                self.next()
+                name = self.check_name()
+                return LocalFunction(line, col, name, self.funcbody(line, col))
+            return self.localstat(line, col)
+        if k == "if":
+            return self.ifstat(line, col)
+        if k == ";":
+            self.next()
+            return None
+        if k == "function":
+            return self.funcstat(line, col)
+        if k == "for":
+            return self.forstat(line, col)
+        if k == "while":
+            self.next()
+            cond = self.expr()
+            self.check_next("do")
+            body = self.block()
+            self.check_match("end", "while", line)
+            return While(line, col, cond, body)
+        if k == "do":
+            self.next()
+            body = self.block()
+            self.check_match("end", "do", line)
+            return Do(line, col, body)
+        if k == "repeat":
+            self.next()
+            body = self.block()
+            self.check_match("until", "repeat", line)
+            return Repeat(line, col, body, self.expr())
+        if k == "::":
+            self.next()
+            name = self.check_name()
+            self.check_next("::")
+            return Label(line, col, name)
+        if k == "break":
+            self.next()
+            return Break(line, col)
+        if k == "goto":
+            self.next()
+            return Goto(line, col, self.check_name())
+        return self.exprstat(line, col)
+
+    def ifstat(self, line: int, col: int) -> Node:
+        self.next()
+        tests = [self.expr()]
+        self.check_next("then")
+        blocks = [self.block()]
+        while self.tok[0] == "elseif":
+            self.next()
+            tests.append(self.expr())
+            self.check_next("then")
+            blocks.append(self.block())
+        orelse = []
+        if self.tok[0] == "else":
+            self.next()
+            orelse = self.block()
+        self.check_match("end", "if", line)
+        return If(line, col, tests, blocks, orelse)
+
+    def forstat(self, line: int, col: int) -> Node:
+        self.next()
+        first = self.check_name()
+        if self.tok[0] == "=":
+            self.next()
+            start = self.expr()
+            self.check_next(",")
+            stop = self.expr()
+            step = None
+            if self.tok[0] == ",":
+                self.next()
+                step = self.expr()
+            self.check_next("do")
+            body = self.block()
+            self.check_match("end", "for", line)
+            return NumericFor(line, col, first, start, stop, step, body)
+        if self.tok[0] in (",", "in"):
+            names = [first]
+            while self.tok[0] == ",":
+                self.next()
+                names.append(self.check_name())
+            self.check_next("in")
+            exprs = self.exprlist()
+            self.check_next("do")
+            body = self.block()
+            self.check_match("end", "for", line)
+            return GenericFor(line, col, names, exprs, body)
+        self.error("'=' or 'in' expected")
+
+    def funcstat(self, line: int, col: int) -> Node:
+        self.next()
+        t = self.tok
+        target = Name(t[2], t[3], self.check_name())
+        method = None
+        while self.tok[0] == ".":
+            self.next()
+            t = self.tok
+            target = Index(target.line, target.col, target, String(t[2], t[3], self.check_name()))
+        if self.tok[0] == ":":
+            self.next()
+            method = self.check_name()
+        name = dotted(target) + (f":{method}" if method else "")
+        return Function(line, col, name, target, method, self.funcbody(line, col, is_method=method is not None))
+
+    def localstat(self, line: int, col: int) -> Node:
+        names, attribs = [], []
+        while True:
+            names.append(self.check_name())
+            attrib = None
+            if self.tok[0] == "<":
+                self.next()
+                t = self.tok
+                attrib = self.check_name()
+                if attrib not in ("const", "close"):
+                    raise LuaSyntaxError(f"unknown attribute '{attrib}'", t[2], t[3])
+                self.check_next(">")
+            attribs.append(attrib)
+            if self.tok[0] != ",":
+                break
+            self.next()
+        exprs = []
+        if self.tok[0] == "=":
+            self.next()
+            exprs = self.exprlist()
+        return Local(line, col, names, attribs, exprs)
+
+    def exprstat(self, line: int, col: int) -> Node:
+        e = self.suffixedexp()
+        if self.tok[0] == "=" or self.tok[0] == ",":
+            targets = [e]
+            while self.tok[0] == ",":
+                self.next()
+                targets.append(self.suffixedexp())
+            for target in targets:
+                if target.kind != "Name" and target.kind != "Index":
+                    raise LuaSyntaxError("syntax error (cannot assign to this expression)", target.line, target.col)
+            self.check_next("=")
+            return Assign(line, col, targets, self.exprlist())
+        if e.kind != "Call" and e.kind != "MethodCall":
+            self.error("syntax error")
+        return CallStat(line, col, e)
+
+    def funcbody(self, line: int, col: int, is_method: bool = False) -> Node:
+        self.check_next("(")
+        params, vararg = (["self"] if is_method else []), False
+        if self.tok[0] != ")":
+            while True:
+                if self.tok[0] == "name":
+                    params.append(self.next()[1])
+                elif self.tok[0] == "...":
+                    self.next()
+                    vararg = True
+                    break
+                else:
+                    self.error("<name> expected")
+                if self.tok[0] != ",":
+                    break
+                self.next()
+        self.check_next(")")
+        body = self.block()
+        self.check_match("end", "function", line)
+        return FunctionExpr(line, col, params, vararg, body)
+
+    # --- expressions ---
+
+    def exprlist(self) -> list[Node]:
+        exprs = [self.expr()]
+        while self.tok[0] == ",":
+            self.next()
+            exprs.append(self.expr())
+        return exprs
+
+    def expr(self, limit: int = 0) -> Node:
+        self.level += 1  # 同 enter_level，内联（表达式是最频繁的入口）
+        t = self.tok
+        if self.level > _MAX_LEVELS:
+            raise LuaSyntaxError("chunk has too many syntax levels", t[2], t[3])
+        k = t[0]
+        if k == "number":
+            self.next()
+            left = Number(t[2], t[3], t[1])
+        elif k == "string":
+            self.next()
+            left = String(t[2], t[3], t[1], t[4], t[5])
+        elif k in _UNARY:
+            self.next()
+            left = UnOp(t[2], t[3], k, self.expr(_UNARY_PRIORITY))
+        else:
+            left = self.simpleexp()
+        binary = _BINARY
+        while True:
+            prio = binary.get(self.tok[0])
+            if prio is None or prio[0] <= limit:
+                self.level -= 1
+                return left
+            op = self.next()[0]
+            left = BinOp(left.line, left.col, op, left, self.expr(prio[1]))
+
+    def simpleexp(self) -> Node:
+        t = self.tok
+        k = t[0]
+        if k == "{":
+            return self.table()
+        if k == "nil":
+            self.next()
+            return Nil(t[2], t[3])
+        if k == "true":
+            self.next()
+            return TrueExpr(t[2], t[3])
+        if k == "false":
+            self.next()
+            return FalseExpr(t[2], t[3])
+        if k == "function":
+            self.next()
+            return self.funcbody(t[2], t[3])
+        if k == "...":
+            self.next()
+            return Vararg(t[2], t[3])
+        if k == "number":
+            self.next()
+            return Number(t[2], t[3], t[1])
+        if k == "string":
+            self.next()
+            return String(t[2], t[3], t[1], t[4], t[5])
+        return self.suffixedexp()
+
+    def suffixedexp(self) -> Node:
+        t = self.tok
+        if t[0] == "name":
+            self.next()
+            e = Name(t[2], t[3], t[1])
+        elif t[0] == "(":
+            self.next()
+            inner = self.expr()
+            self.check_match(")", "(", t[2])
+            e = Paren(t[2], t[3], inner)
+        else:
+            self.error("unexpected symbol")
+        while True:
+            k = self.tok[0]
+            if k == ".":
+                self.next()
+                t = self.tok
+                e = Index(e.line, e.col, e, String(t[2], t[3], self.check_name()))
+            elif k == "(" or k == "string" or k == "{":
+                e = Call(e.line, e.col, e, self.callargs())
+            elif k == ":":
+                self.next()
+                method = self.check_name()
+                e = MethodCall(e.line, e.col, e, method, self.callargs())
+            elif k == "[":
+                self.next()
+                key = self.expr()
+                self.check_next("]")
+                e = Index(e.line, e.col, e, key)
+            else:
+                return e
+
+    def callargs(self) -> list[Node]:
+        t = self.tok
+        if t[0] == "(":
+            self.next()
+            args = [] if self.tok[0] == ")" else self.exprlist()
+            self.check_match(")", "(", t[2])
+            return args
+        if t[0] == "string":
+            self.next()
+            return [String(t[2], t[3], t[1], t[4], t[5])]
+        if t[0] == "{":
+            return [self.table()]
+        self.error("function arguments expected")
+
+    def table(self) -> Node:
+        _, _, line, col = self.next()
+        fields = []
+        tokens = self.tokens
+        while self.tok[0] != "}":
+            t = self.tok
+            if t[0] == "name" and tokens[self.i + 1][0] == "=":
+                self.i += 2
+                self.tok = tokens[self.i]
+                fields.append(Field(t[2], t[3], String(t[2], t[3], t[1]), self.expr()))
+            elif t[0] == "[":
+                self.next()
+                key = self.expr()
+                self.check_next("]")
+                self.check_next("=")
+                fields.append(Field(t[2], t[3], key, self.expr()))
+            else:
+                fields.append(Field(t[2], t[3], None, self.expr()))
+            k = self.tok[0]
+            if k != "," and k != ";":
+                break
+            self.next()
+        self.check_match("}", "{", line)
+        return Table(line, col, fields)
+
+
+def parse(source: str, line: int = 1, col: int = 1) -> Chunk:
+    """
+    解析 Lua 源码为 Chunk；line / col 为源码在外层文件中的起始位置。
+    解析期间暂停循环垃圾回收：token / AST 节点没有引用环，大量新建对象只会触发无用的分代回收（约占一半耗时）。
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        parser = _Parser(tokenize(source, line, col))
+        try:
+            body = parser.block()
+            if parser.tok[0] != "<eof>":
+                parser.error("'<eof>' expected")
+        except RecursionError:
+            raise LuaSyntaxError("chunk has too many syntax levels", parser.tok[2], parser.tok[3])
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return Chunk(line, col, body)
@@ -0,0 +1,1306 @@
+"""
+Lua runtime: 基于 lua_parser AST 的纯 Python Lua 5.3 解释器，供 dry-run 离线执行生成的脚本（不依赖外部 Lua）。
+
+- 值映射：nil -> None，boolean -> bool，number -> int / float，string -> str，table -> LuaTable，
+  Lua 函数 -> LuaFunction，Python 可调用对象即宿主函数（返回 tuple 表示多返回值）；
+- 宿主对象可实现 lua_index(key) 供 obj.key / obj:Method() 访问；
+- 指令预算：每条语句、每次函数调用、每轮循环计一步，超出 budget 或 deadline 抛 LuaBudgetExceeded（pcall 不可捕获）；
+- 标准库只实现脚本常用部分（print / pairs / ipairs / pcall / string / table / math / os.time 等），不支持协程。
+"""
+import functools
+import math
+import random
+import re
+import sys
+import threading
+import time
+
+from lua_parser import Node, parse
+
+MAX_DEPTH = 1000  # 默认 Lua 函数调用嵌套上限（超出报 stack overflow），dry run 取 config.DRY_RUN_MAX_DEPTH
+_FRAMES_PER_LEVEL = 40  # 每层 Lua 调用最多约占的 Python 栈帧（实测普通递归约 11 层，表达式嵌套更多）
+_THREAD_STACK = 256 * 1024 * 1024  # 执行线程的栈大小，递归深度不受调用方线程栈限制
+_RUN_THREAD = "lua-runtime"
+
+_INT_MIN = -2 ** 63
+_INT_MAX = 2 ** 63 - 1
+_INT_MASK = 0xFFFFFFFFFFFFFFFF
+
+
+class LuaError(Exception):
+    """Lua 运行期错误（含 error() 抛出的值）；value 为错误值，字符串时已带 "line N:M:" 前缀。"""
+
+    def __init__(self, value, traceback: list | None = None):
+        super().__init__(value if isinstance(value, str) else tostring(value))
+        self.value = value
+        self.traceback = traceback or []
+
+
+class LuaBudgetExceeded(Exception):
+    """超出指令预算或墙钟时间。"""
+
+    def __init__(self, msg: str, steps: int, line: int):
+        super().__init__(msg)
+        self.steps = steps
+        self.line = line
+
+
+class LuaTable:
+    """Lua 表：键统一为 int（整数值的 float 转 int）或包装后的 bool，避免与 1 / 0 冲突。"""
+    __slots__ = ("hash", "meta", "__weakref__")
+
+    def __init__(self, items=None):
+        self.hash = {}
+        self.meta = None
+        if items:
+            for k, v in (items.items() if isinstance(items, dict) else enumerate(items, 1)):
+                self.set(k, v)
+
+    def get(self, key):
+        return self.hash.get(_norm_key(key))
+
+    def set(self, key, value):
+        if key is None:
+            raise LuaError("table index is nil")
+        if isinstance(key, float) and key != key:
+            raise LuaError("table index is NaN")
+        key = _norm_key(key)
+        if value is None:
+            self.hash.pop(key, None)
+        else:
+            self.hash[key] = value
+
+    def length(self) -> int:
+        h = self.hash
+        n = len(h)
+        if n == 0:
+            return 0
+        if n in h and n + 1 not in h:
+            return n
+        i = 0
+        while i + 1 in h:
+            i += 1
+        return i
+
+    def items(self):
+        for k, v in self.hash.items():
+            yield _denorm_key(k), v
+
+    def __repr__(self):
+        return f"<table {id(self):#x}>"
+
+
+class _BoolKey:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+_TRUE_KEY, _FALSE_KEY = _BoolKey(True), _BoolKey(False)
+
+
+def _norm_key(key):
+    if key is True:
+        return _TRUE_KEY
+    if key is False:
+        return _FALSE_KEY
+    if isinstance(key, float) and key.is_integer():
+        return int(key)
+    return key
+
+
+def _denorm_key(key):
+    return key.value if isinstance(key, _BoolKey) else key
+
+
+class LuaFunction:
+    __slots__ = ("node", "scope", "name")
+
+    def __init__(self, node: Node, scope: "Scope", name: str = "?"):
+        self.node, self.scope, self.name = node, scope, name
+
+    def __repr__(self):
+        return f"<function {self.name}>"
+
+
+class Scope:
+    __slots__ = ("vars", "parent")
+
+    def __init__(self, parent: "Scope | None" = None):
+        self.vars = {}
+        self.parent = parent
+
+
+class _Return:
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = values
+
+
+class _Goto(Exception):
+    def __init__(self, label: str, node: Node):
+        self.label, self.node = label, node
+
+
+_BREAK = object()
+
+
+# --- 值的通用操作 ---
+
+def type_name(v) -> str:
+    if v is None:
+        return "nil"
+    if v is True or v is False:
+        return "boolean"
+    if isinstance(v, (int, float)):
+        return "number"
+    if isinstance(v, str):
+        return "string"
+    if isinstance(v, LuaTable):
+        return "table"
+    if isinstance(v, LuaFunction) or callable(v):
+        return "function"
+    return "userdata"
+
+
+def truthy(v) -> bool:
+    return v is not None and v is not False
+
+
+def fmt_number(v) -> str:
+    if isinstance(v, int):
+        return str(v)
+    if v != v:
+        return "nan" if math.copysign(1, v) > 0 else "-nan"
+    if v in (math.inf, -math.inf):
+        return "inf" if v > 0 else "-inf"
+    s = "%.14g" % v
+    return s + ".0" if re.fullmatch(r"-?\d+", s) else s
+
+
+def tostring(v) -> str:
+    """不查 __tostring 的 tostring（带元方法的版本见 Interpreter.tostring）。"""
+    if v is None:
+        return "nil"
+    if v is True:
+        return "true"
+    if v is False:
+        return "false"
+    if isinstance(v, (int, float)):
+        return fmt_number(v)
+    if isinstance(v, str):
+        return v
+    if isinstance(v, LuaTable):
+        return f"table: {id(v):#010x}"
+    if isinstance(v, LuaFunction) or callable(v):
+        return f"function: {id(v):#010x}"
+    return str(v)
+
+
+_NUM_RE = re.compile(r"\s*(-)?(?:0[xX]([0-9a-fA-F]+)|(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?))\s*")
+
+
+def tonumber(v):
+    if isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return v
+    if not isinstance(v, str):
+        return None
+    m = _NUM_RE.fullmatch(v)
+    if not m:
+        if v.strip().lower() in ("inf", "nan"):
+            return None
+        try:
+            return float.fromhex(v.strip())
+        except ValueError:
+            return None
+    sign, hx, dec = m.groups()
+    if hx is not None:
+        n = int(hx, 16)
+    elif re.fullmatch(r"\d+", dec):
+        n = int(dec)
+    else:
+        n = float(dec)
+    return -n if sign else n
+
+
+def lua_eq(a, b) -> bool:
+    if a is b:
+        return True
+    if isinstance(a, bool) or isinstance(b, bool):
+        return False
+    ta, tb = type(a), type(b)
+    if ta in (int, float) and tb in (int, float):
+        return a == b
+    if ta is str and tb is str:
+        return a == b
+    return False
+
+
+def to_lua(value):
+    """Python dict / list / tuple 递归转为 LuaTable（宿主函数返回结构化数据时使用）。"""
+    if isinstance(value, dict):
+        return LuaTable({k: to_lua(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return LuaTable([to_lua(v) for v in value])
+    return value
+
+
+def from_lua(value, depth: int = 0):
+    """LuaTable 转为 Python dict / list（调用记录等），循环引用按深度截断。"""
+    if not isinstance(value, LuaTable):
+        return value
+    if depth > 4:
+        return "{...}"
+    n = value.length()
+    if n == len(value.hash):
+        return [from_lua(value.hash[i], depth + 1) for i in range(1, n + 1)]
+    return {str(k) if not isinstance(k, str) else k: from_lua(v, depth + 1) for k, v in value.items()}
+
+
+_ARITH_EVENTS = {"+": "__add", "-": "__sub", "*": "__mul", "/": "__div", "%": "__mod", "^": "__pow",
+                 "//": "__idiv", "&": "__band", "|": "__bor", "~": "__bxor", "<<": "__shl", ">>": "__shr",
+                 "..": "__concat"}
+
+
+class Interpreter:
+    """
+    单个 Lua 状态：globals 为全局表，steps 为已执行步数。
+    run(source) 解析并执行一段代码；call(fn, args) 调用 Lua / 宿主函数。
+    """
+
+    def __init__(self, budget: int = 200_000, timeout: float | None = None, seed: int = 0,
+                 max_depth: int = MAX_DEPTH):
+        self.budget = budget
+        self.max_depth = max_depth
+        self.deadline = time.perf_counter() + timeout if timeout else None
+        self.steps = 0
+        self.calls = 0
+        self.depth = 0
+        self.line = 0
+        self.col = 0
+        self.random = random.Random(seed)
+        self.output: list[str] = []
+        self.globals = LuaTable()
+        self._exec = {
+            "Local": self._local, "Assign": self._assign, "CallStat": self._callstat, "Do": self._do,
+            "While": self._while, "Repeat": self._repeat, "If": self._if, "NumericFor": self._numfor,
+            "GenericFor": self._genfor, "Function": self._function, "LocalFunction": self._localfunction,
+            "Return": self._return, "Break": self._break, "Goto": self._goto, "Label": self._label,
+        }
+        self._eval = {
+            "Nil": lambda e, s: None, "True": lambda e, s: True, "False": lambda e, s: False,
+            "Number": self._number, "String": lambda e, s: e.value, "Vararg": self._vararg,
+            "FunctionExpr": lambda e, s: LuaFunction(e, s), "Table": self._table,
+            "BinOp": self._binop, "UnOp": self._unop, "Name": self._name, "Index": self._index,
+            "Call": lambda e, s: _first(self._call(e, s)), "MethodCall": lambda e, s: _first(self._call(e, s)),
+            "Paren": lambda e, s: self.eval(e.expr, s),
+        }
+        self._numbers: dict[str, int | float] = {}  # 数字字面量文本 -> 值
+        _install_stdlib(self)
+
+    # --- 入口 ---
+
+    def run(self, source: str, name: str = "chunk", line: int = 1, col: int = 1) -> list:
+        """
+        解析并执行；语法错误抛 LuaSyntaxError，运行错误抛 LuaError。
+        在独立的大栈线程中执行（已在其中时直接执行），Lua 调用深度只受 max_depth 限制。
+        """
+        if threading.current_thread().name != _RUN_THREAD:
+            return _run_in_thread(self.max_depth, self.run, source, name, line, col)
+        chunk = parse(source, line, col)
+        depth = self.depth
+        try:
+            return self.call(LuaFunction(_ChunkFunc(chunk), Scope(), name), [])
+        except RecursionError:
+            raise self.error("stack overflow")
+        finally:
+            self.depth = depth
+
+    def tick(self) -> None:
+        self.steps += 1
+        if self.steps > self.budget:
+            raise LuaBudgetExceeded(f"instruction budget exceeded ({self.budget} steps)", self.steps, self.line)
+        if self.deadline is not None and not self.steps & 1023 and time.perf_counter() > self.deadline:
+            raise LuaBudgetExceeded("time limit exceeded", self.steps, self.line)
+
+    def error(self, msg: str, node: Node | None = None) -> LuaError:
+        line, col = (node.line, node.col) if node is not None else (self.line, self.col)
+        return LuaError(f"line {line}:{col}: {msg}")
+
+    # --- 语句 ---
+
+    def exec_block(self, body: list, scope: Scope):
+        labels = None
+        i, n = 0, len(body)
+        execs = self._exec
+        while i < n:
+            stat = body[i]
+            self.tick()
+            self.line, self.col = stat.line, stat.col
+            try:
+                sig = execs[stat.kind](stat, scope)
+            except _Goto as g:
+                if labels is None:
+                    labels = {s.name: j for j, s in enumerate(body) if s.kind == "Label"}
+                if g.label not in labels:
+                    raise
+                i = labels[g.label] + 1
+                continue
+            if sig is not None:
+                return sig
+            i += 1
+        return None
+
+    def _local(self, stat, scope):
+        values = self.eval_list(stat.exprs, scope)
+        v = scope.vars
+        for i, name in enumerate(stat.names):
+            v[name] = values[i] if i < len(values) else None
+
+    def _assign(self, stat, scope):
+        values = self.eval_list(stat.exprs, scope)
+        for i, target in enumerate(stat.targets):
+            value = values[i] if i < len(values) else None
+            if target.kind == "Name":
+                self.set_var(target.name, value, scope)
+            else:
+                obj = self.eval(target.obj, scope)
+                self.setindex(obj, self.eval(target.key, scope), value, target, scope)
+
+    def _callstat(self, stat, scope):
+        self._call(stat.call, scope)
+
+    def _do(self, stat, scope):
+        return self.exec_block(stat.body, Scope(scope))
+
+    def _loop_body(self, body, scope):
+        sig = self.exec_block(body, scope)
+        if sig is _BREAK:
+            return _BREAK, None
+        return None, sig
+
+    def _while(self, stat, scope):
+        while truthy(self.eval(stat.cond, scope)):
+            self.tick()
+            brk, sig = self._loop_body(stat.body, Scope(scope))
+            if brk:
+                break
+            if sig is not None:
+                return sig
+
+    def _repeat(self, stat, scope):
+        while True:
+            self.tick()
+            inner = Scope(scope)
+            brk, sig = self._loop_body(stat.body, inner)
+            if brk:
+                break
+            if sig is not None:
+                return sig
+            if truthy(self.eval(stat.cond, inner)):
+                break
+
+    def _if(self, stat, scope):
+        for test, block in zip(stat.tests, stat.blocks):
+            if truthy(self.eval(test, scope)):
+                return self.exec_block(block, Scope(scope))
+        if stat.orelse:
+            return self.exec_block(stat.orelse, Scope(scope))
+
+    def _numfor(self, stat, scope):
+        start = self._for_number(self.eval(stat.start, scope), "initial", stat)
+        stop = self._for_number(self.eval(stat.stop, scope), "limit", stat)
+        step = self._for_number(self.eval(stat.step, scope), "step", stat) if stat.step is not None else 1
+        if step == 0:
+            raise self.error("'for' step is zero", stat)
+        if isinstance(start, int) and isinstance(step, int):
+            stop = math.floor(stop) if step > 0 else math.ceil(stop)
+        else:
+            start, step = float(start), float(step)
+        i = start
+        while (i <= stop) if step > 0 else (i >= stop):
+            self.tick()
+            inner = Scope(scope)
+            inner.vars[stat.var] = i
+            brk, sig = self._loop_body(stat.body, inner)
+            if brk:
+                break
+            if sig is not None:
+                return sig
+            i += step
+
+    def _for_number(self, v, what, node):
+        n = tonumber(v) if isinstance(v, str) else v
+        if isinstance(n, bool) or not isinstance(n, (int, float)):
+            raise self.error(f"'for' {what} value must be a number", node)
+        return n
+
+    def _genfor(self, stat, scope):
+        values = self.eval_list(stat.exprs, scope) + [None, None, None]
+        f, s, ctl = values[:3]
+        while True:
+            self.tick()
+            rets = self.call(f, [s, ctl], stat)
+            first = rets[0] if rets else None
+            if first is None:
+                break
+            ctl = first
+            inner = Scope(scope)
+            for i, name in enumerate(stat.names):
+                inner.vars[name] = rets[i] if i < len(rets) else None
+            brk, sig = self._loop_body(stat.body, inner)
+            if brk:
+                break
+            if sig is not None:
+                return sig
+
+    def _function(self, stat, scope):
+        fn = LuaFunction(stat.func, scope, stat.name)
+        target = stat.target
+        if stat.method:
+            self.setindex(self.eval(target, scope), stat.method, fn, stat)
+        elif target.kind == "Name":
+            self.set_var(target.name, fn, scope)
+        else:
+            self.setindex(self.eval(target.obj, scope), self.eval(target.key, scope), fn, target)
+
+    def _localfunction(self, stat, scope):
+        scope.vars[stat.name] = None
+        scope.vars[stat.name] = LuaFunction(stat.func, scope, stat.name)
+
+    def _return(self, stat, scope):
+        return _Return(self.eval_list(stat.exprs, scope))
+
+    def _break(self, stat, scope):
+        return _BREAK
+
+    def _goto(self, stat, scope):
+        raise _Goto(stat.label, stat)
+
+    def _label(self, stat, scope):
+        return None
+
+    # --- 变量 ---
+
+    def set_var(self, name, value, scope):
+        s = scope
+        while s is not None:
+            if name in s.vars:
+                s.vars[name] = value
+                return
+            s = s.parent
+        self.globals.set(name, value)
+
+    def _name(self, e, scope):
+        s = scope
+        name = e.name
+        while s is not None:
+            v = s.vars
+            if name in v:
+                return v[name]
+            s = s.parent
+        return self.globals.hash.get(name)
+
+    def _is_local(self, name, scope) -> bool:
+        s = scope
+        while s is not None:
+            if name in s.vars:
+                return True
+            s = s.parent
+        return False
+
+    def _describe(self, e, scope) -> str:
+        """错误信息中的变量描述，与 luaG_typeerror 一致：(global 'x') / (local 'x') / (field 'x') / (method 'x')。"""
+        if e is None:
+            return ""
+        if e.kind == "Name":
+            return f" ({'local' if self._is_local(e.name, scope) else 'global'} '{e.name}')"
+        if e.kind == "Index" and e.key.kind == "String":
+            return f" (field '{e.key.value}')"
+        if e.kind == "MethodCall":
+            return f" (method '{e.method}')"
+        return ""
+
+    # --- 表达式 ---
+
+    def eval(self, e, scope):
+        return self._eval[e.kind](e, scope)
+
+    def eval_list(self, exprs: list, scope) -> list:
+        if not exprs:
+            return []
+        out = [self.eval(e, scope) for e in exprs[:-1]]
+        last = exprs[-1]
+        if last.kind in ("Call", "MethodCall"):
+            out.extend(self._call(last, scope))
+        elif last.kind == "Vararg":
+            out.extend(self._varargs(last, scope))
+        else:
+            out.append(self.eval(last, scope))
+        return out
+
+    def _number(self, e, scope):
+        n = self._numbers.get(e.value)
+        if n is None:
+            n = tonumber(e.value)
+            self._numbers[e.value] = n
+        return n
+
+    def _varargs(self, e, scope) -> list:
+        s = scope
+        while s is not None:
+            if "..." in s.vars:
+                return s.vars["..."]
+            s = s.parent
+        raise self.error("cannot use '...' outside a vararg function", e)
+
+    def _vararg(self, e, scope):
+        return _first(self._varargs(e, scope))
+
+    def _table(self, e, scope):
+        t = LuaTable()
+        n = 0
+        fields = e.fields
+        for i, f in enumerate(fields):
+            if f.key is None:
+                if i == len(fields) - 1 and f.value.kind in ("Call", "MethodCall", "Vararg"):
+                    for v in (self._call(f.value, scope) if f.value.kind != "Vararg" else self._varargs(f.value, scope)):
+                        n += 1
+                        t.set(n, v)
+                else:
+                    n += 1
+                    t.set(n, self.eval(f.value, scope))
+            else:
+                key = f.key.value if f.key.kind == "String" else self.eval(f.key, scope)
+                if key is None:
+                    raise self.error("table index is nil", f)
+                t.set(key, self.eval(f.value, scope))
+        return t
+
+    def _index(self, e, scope):
+        obj = self.eval(e.obj, scope)
+        key = e.key.value if e.key.kind == "String" else self.eval(e.key, scope)
+        return self.index(obj, key, e.obj, scope)
+
+    def index(self, obj, key, node=None, scope=None):
+        for _ in range(100):
+            if isinstance(obj, LuaTable):
+                v = obj.hash.get(_norm_key(key))
+                if v is not None or obj.meta is None:
+                    return v
+                h = obj.meta.get("__index")
+                if h is None:
+                    return None
+                if isinstance(h, LuaTable):
+                    obj = h
+                    continue
+                return _first(self.call(h, [obj, key], node))
+            if isinstance(obj, str):
+                return self.string_lib.get(key)
+            lua_index = getattr(obj, "lua_index", None)
+            if lua_index is not None:
+                return lua_index(key)
+            raise self.error(f"attempt to index a {type_name(obj)} value{self._describe(node, scope)}", node)
+        raise self.error("'__index' chain too long; possible loop", node)
+
+    def setindex(self, obj, key, value, node=None, scope=None):
+        if isinstance(obj, LuaTable):
+            if obj.meta is not None and obj.hash.get(_norm_key(key)) is None:
+                h = obj.meta.get("__newindex")
+                if h is not None:
+                    if isinstance(h, LuaTable):
+                        return self.setindex(h, key, value, node, scope)
+                    self.call(h, [obj, key, value], node)
+                    return
+            try:
+                obj.set(key, value)
+            except LuaError as err:
+                raise self.error(str(err), node)
+            return
+        lua_setindex = getattr(obj, "lua_setindex", None)
+        if lua_setindex is not None:
+            lua_setindex(key, value)
+            return
+        target = node.obj if node is not None and node.kind == "Index" else node
+        raise self.error(f"attempt to index a {type_name(obj)} value{self._describe(target, scope)}", node)
+
+    def _metamethod(self, a, b, event):
+        for v in (a, b):
+            if isinstance(v, LuaTable) and v.meta is not None:
+                h = v.meta.get(event)
+                if h is not None:
+                    return h
+        return None
+
+    def _binop(self, e, scope):
+        op = e.op
+        if op == "and":
+            left = self.eval(e.left, scope)
+            return self.eval(e.right, scope) if truthy(left) else left
+        if op == "or":
+            left = self.eval(e.left, scope)
+            return left if truthy(left) else self.eval(e.right, scope)
+        a = self.eval(e.left, scope)
+        b = self.eval(e.right, scope)
+        return self.arith(op, a, b, e, scope)
+
+    def arith(self, op, a, b, e=None, scope=None):
+        if op == "==":
+            if lua_eq(a, b):
+                return True
+            if isinstance(a, LuaTable) and isinstance(b, LuaTable):
+                h = self._metamethod(a, b, "__eq")
+                if h is not None:
+                    return truthy(_first(self.call(h, [a, b], e)))
+            return False
+        if op == "~=":
+            return not self.arith("==", a, b, e, scope)
+        if op in ("<", "<=", ">", ">="):
+            if op in (">", ">="):
+                a, b, op = b, a, "<" if op == ">" else "<="
+            ta, tb = type(a), type(b)
+            if ta in (int, float) and tb in (int, float) or ta is str and tb is str:
+                return a < b if op == "<" else a <= b
+            h = self._metamethod(a, b, "__lt" if op == "<" else "__le")
+            if h is not None:
+                return truthy(_first(self.call(h, [a, b], e)))
+            if type_name(a) == type_name(b):
+                raise self.error(f"attempt to compare two {type_name(a)} values", e)
+            raise self.error(f"attempt to compare {type_name(a)} with {type_name(b)}", e)
+        if op == "..":
+            if isinstance(a, (str, int, float)) and not isinstance(a, bool) and \
+                    isinstance(b, (str, int, float)) and not isinstance(b, bool):
+                return (a if isinstance(a, str) else fmt_number(a)) + (b if isinstance(b, str) else fmt_number(b))
+            h = self._metamethod(a, b, "__concat")
+            if h is not None:
+                return _first(self.call(h, [a, b], e))
+            bad, node = (a, e.left) if not isinstance(a, (str, int, float)) or isinstance(a, bool) else (b, e.right)
+            raise self.error(f"attempt to concatenate a {type_name(bad)} value{self._describe(node, scope)}", e)
+        x = a if isinstance(a, (int, float)) and not isinstance(a, bool) else tonumber(a) if isinstance(a, str) else None
+        y = b if isinstance(b, (int, float)) and not isinstance(b, bool) else tonumber(b) if isinstance(b, str) else None
+        if x is None or y is None:
+            h = self._metamethod(a, b, _ARITH_EVENTS[op])
+            if h is not None:
+                return _first(self.call(h, [a, b], e))
+            bad, node = (a, e.left if e else None) if x is None else (b, e.right if e else None)
+            what = "perform bitwise operation on" if op in ("&", "|", "~", "<<", ">>") else "perform arithmetic on"
+            raise self.error(f"attempt to {what} a {type_name(bad)} value{self._describe(node, scope)}", e)
+        try:
+            if op == "+":
+                r = x + y
+                return _wrap(r) if type(r) is int else r
+            if op == "-":
+                r = x - y
+                return _wrap(r) if type(r) is int else r
+            if op == "*":
+                r = x * y
+                return _wrap(r) if type(r) is int else r
+            if op == "/":
+                return x / y if y != 0 else _div_zero(x, y)
+            if op == "^":
+                return float(x) ** y
+            if op == "%":
+                if isinstance(x, int) and isinstance(y, int):
+                    if y == 0:
+                        raise self.error("attempt to perform 'n%%0'", e)
+                    return x % y
+                if y == 0:
+                    return math.nan
+                r = math.fmod(x, y)
+                return r + y if r != 0 and (r < 0) != (y < 0) else r
+            if op == "//":
+                if isinstance(x, int) and isinstance(y, int):
+                    if y == 0:
+                        raise self.error("attempt to perform 'n//0'", e)
+                    return _wrap(x // y)
+                return math.floor(x / y) * 1.0 if y != 0 else _div_zero(x, y)
+            ix, iy = _to_int(x), _to_int(y)
+            if ix is None or iy is None:
+                raise self.error("number has no integer representation", e)
+            if op == "&":
+                return ix & iy
+            if op == "|":
+                return ix | iy
+            if op == "~":
+                return ix ^ iy
+            if op == ">>":
+                op, iy = "<<", -iy
+            if op == "<<":
+                # 逻辑移位，移出 64 位为 0
+                if iy <= -64 or iy >= 64:
+                    return 0
+                return _wrap(((ix & _INT_MASK) << iy if iy >= 0 else (ix & _INT_MASK) >> -iy) & _INT_MASK)
+        except OverflowError:
+            return math.inf
+        raise self.error(f"unknown operator '{op}'", e)
+
+    def _unop(self, e, scope):
+        op = e.op
+        v = self.eval(e.operand, scope)
+        if op == "not":
+            return not truthy(v)
+        if op == "#":
+            if isinstance(v, str):
+                return len(v.encode("utf-8"))
+            if isinstance(v, LuaTable):
+                h = self._metamethod(v, None, "__len")
+                return _first(self.call(h, [v], e)) if h is not None else v.length()
+            raise self.error(f"attempt to get length of a {type_name(v)} value{self._describe(e.operand, scope)}", e)
+        if op == "-":
+            n = v if isinstance(v, (int, float)) and not isinstance(v, bool) else tonumber(v) if isinstance(v, str) else None
+            if n is None:
+                h = self._metamethod(v, None, "__unm")
+                if h is not None:
+                    return _first(self.call(h, [v, v], e))
+                raise self.error(f"attempt to perform arithmetic on a {type_name(v)} value{self._describe(e.operand, scope)}", e)
+            return _wrap(-n) if type(n) is int else -n
+        n = _to_int(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else None
+        if n is None:
+            raise self.error(f"attempt to perform bitwise operation on a {type_name(v)} value", e)
+        return ~n
+
+    # --- 调用 ---
+
+    def _call(self, e, scope) -> list:
+        if e.kind == "MethodCall":
+            obj = self.eval(e.obj, scope)
+            fn = self.index(obj, e.method, e.obj, scope)
+            args = [obj] + self.eval_list(e.args, scope)
+            if fn is None:
+                raise self.error(f"attempt to call a nil value (method '{e.method}')", e)
+            return self.call(fn, args, e)
+        fn = self.eval(e.func, scope)
+        args = self.eval_list(e.args, scope)
+        if fn is None or not (isinstance(fn, LuaFunction) or callable(fn) or isinstance(fn, LuaTable)):
+            raise self.error(f"attempt to call a {type_name(fn)} value{self._describe(e.func, scope)}", e)
+        self.line, self.col = e.line, e.col
+        return self.call(fn, args, e)
+
+    def call(self, fn, args: list, node=None) -> list:
+        self.tick()
+        self.calls += 1
+        if isinstance(fn, LuaFunction):
+            return self._call_lua(fn, args)
+        if isinstance(fn, LuaTable):
+            h = fn.meta.get("__call") if fn.meta is not None else None
+            if h is None:
+                raise self.error("attempt to call a table value", node)
+            return self.call(h, [fn] + list(args), node)
+        if not callable(fn):
+            raise self.error(f"attempt to call a {type_name(fn)} value", node)
+        try:
+            r = fn(*args)
+        except (LuaError, LuaBudgetExceeded, _Goto):
+            raise
+        except RecursionError:
+            raise self.error("stack overflow", node)
+        except (TypeError, ValueError, AttributeError, IndexError, KeyError, OverflowError, ZeroDivisionError) as err:
+            name = getattr(fn, "__name__", "?")
+            raise self.error(f"bad argument to '{name}' ({err})", node)
+        if r is None:
+            return []
+        if isinstance(r, tuple):
+            return list(r)
+        return [r]
+
+    def _call_lua(self, fn: LuaFunction, args: list) -> list:
+        node = fn.node
+        scope = Scope(fn.scope)
+        v = scope.vars
+        params = node.params
+        for i, p in enumerate(params):
+            v[p] = args[i] if i < len(args) else None
+        if node.vararg:
+            v["..."] = list(args[len(params):])
+        if self.depth >= self.max_depth:
+            raise self.error("stack overflow")
+        self.depth += 1
+        saved = self.line, self.col
+        try:
+            sig = self.exec_block(node.body, scope)
+        except _Goto as g:
+            raise self.error(f"no visible label '{g.label}' for goto", g.node)
+        finally:
+            self.depth -= 1
+        self.line, self.col = saved
+        if sig is None or sig is _BREAK:
+            return []
+        return sig.values
+
+    def tostring(self, v) -> str:
+        if isinstance(v, LuaTable) and v.meta is not None:
+            h = v.meta.get("__tostring")
+            if h is not None:
+                return tostring(_first(self.call(h, [v])))
+            name = v.meta.get("__name")
+            if isinstance(name, str):
+                return f"{name}: {id(v):#010x}"
+        return tostring(v)
+
+
+class _ChunkFunc:
+    """把 Chunk 当作无参 vararg 函数执行。"""
+    __slots__ = ("params", "vararg", "body")
+
+    def __init__(self, chunk):
+        self.params, self.vararg, self.body = [], True, chunk.body
+
+
+def _first(values):
+    return values[0] if values else None
+
+
+def _wrap(v: int) -> int:
+    """整数运算按 64 位补码回绕（math.maxinteger + 1 == math.mininteger）。"""
+    if _INT_MIN <= v <= _INT_MAX:
+        return v
+    return ((v - _INT_MIN) & _INT_MASK) + _INT_MIN
+
+
+def _run_in_thread(max_depth: int, fn, *args):
+    """在栈大小为 _THREAD_STACK 的线程中执行 fn，并把递归上限提高到 max_depth 层 Lua 调用所需（只升不降）。"""
+    limit = max_depth * _FRAMES_PER_LEVEL + 1000
+    if sys.getrecursionlimit() < limit:
+        sys.setrecursionlimit(limit)
+    box: dict = {}
+
+    def target():
+        try:
+            box["result"] = fn(*args)
+        except BaseException as e:  # noqa: BLE001 - 原样转交调用方线程
+            box["error"] = e
+
+    with _stack_lock:
+        old = threading.stack_size(_THREAD_STACK)
+        try:
+            t = threading.Thread(target=target, name=_RUN_THREAD, daemon=True)
+            t.start()
+        finally:
+            threading.stack_size(old)
+    t.join()
+    if "error" in box:
+        raise box["error"]
+    return box.get("result")
+
+
+_stack_lock = threading.Lock()
+
+
+def _to_int(v):
+    if isinstance(v, int):
+        return v
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return None
+
+
+def _div_zero(x, y):
+    if x == 0 or x != x:
+        return math.nan
+    return math.copysign(math.inf, x) * math.copysign(1, y)
+
+
+# --- 标准库 ---
+
+_FMT_RE = re.compile(r"%([-+ #0]*\d*(?:\.\d+)?)([diouxXeEfgGqscaA%])")
+
+
+def _install_stdlib(interp: Interpreter) -> None:
+    g = interp.globals
+    call = interp.call
+
+    def lua_print(*args):
+        interp.output.append("\t".join(interp.tostring(a) for a in args))
+
+    def lua_type(*args):
+        if not args:
+            raise LuaError("bad argument #1 to 'type' (value expected)")
+        return type_name(args[0])
+
+    def lua_tonumber(v=None, base=None):
+        if base is None:
+            return tonumber(v)
+        try:
+            return int(str(v).strip().lower(), int(base))
+        except ValueError:
+            return None
+
+    def lua_next(t, k=None):
+        if not isinstance(t, LuaTable):
+            raise LuaError(f"bad argument #1 to 'next' (table expected, got {type_name(t)})")
+        keys = list(t.hash)
+        if k is None:
+            i = 0
+        else:
+            try:
+                i = keys.index(_norm_key(k)) + 1
+            except ValueError:
+                raise LuaError("invalid key to 'next'")
+        if i >= len(keys):
+            return None
+        return _denorm_key(keys[i]), t.hash[keys[i]]
+
+    def lua_pairs(t):
+        if isinstance(t, LuaTable) and t.meta is not None and t.meta.get("__pairs") is not None:
+            return tuple(call(t.meta.get("__pairs"), [t])[:3])
+        if not isinstance(t, LuaTable):
+            raise LuaError(f"bad argument #1 to 'pairs' (table expected, got {type_name(t)})")
+        it = iter(list(t.items()))
+
+        def iterator(*_):
+            for k, v in it:
+                if t.hash.get(_norm_key(k)) is not None:
+                    return k, v
+            return None
+        return iterator, t, None
+
+    def lua_ipairs(t):
+        if t is None:
+            raise LuaError("bad argument #1 to 'ipairs' (table expected, got nil)")
+
+        def iterator(tbl, i):
+            i += 1
+            v = interp.index(tbl, i)
+            return None if v is None else (i, v)
+        return iterator, t, 0
+
+    def lua_select(n, *args):
+        if n == "#":
+            return len(args)
+        n = int(n)
+        if n < 0:
+            n += len(args) + 1
+        if n <= 0:
+            raise LuaError("bad argument #1 to 'select' (index out of range)")
+        return tuple(args[n - 1:])
+
+    def lua_rawset(t, k, v):
+        t.set(k, v)
+        return t
+
+    def lua_error(msg=None, level=1):
+        if isinstance(msg, str) and level:
+            msg = f"line {interp.line}:{interp.col}: {msg}"
+        raise LuaError(msg)
+
+    def lua_assert(v=None, msg="assertion failed!", *rest):
+        if not truthy(v):
+            raise LuaError(msg if not isinstance(msg, str) else f"line {interp.line}:{interp.col}: {msg}")
+        return (v, msg, *rest)
+
+    def lua_pcall(fn=None, *args):
+        depth = interp.depth
+        try:
+            return (True, *call(fn, list(args)))
+        except LuaError as e:
+            interp.depth = depth
+            return False, e.value
+
+    def lua_xpcall(fn, handler, *args):
+        depth = interp.depth
+        try:
+            return (True, *call(fn, list(args)))
+        except LuaError as e:
+            interp.depth = depth
+            return (False, *call(handler, [e.value]))
+
+    def lua_setmetatable(t, mt):
+        if not isinstance(t, LuaTable):
+            raise LuaError(f"bad argument #1 to 'setmetatable' (table expected, got {type_name(t)})")
+        t.meta = mt
+        return t
+
+    def lua_getmetatable(t):
+        if isinstance(t, LuaTable) and t.meta is not None:
+            protected = t.meta.get("__metatable")
+            return protected if protected is not None else t.meta
+        return interp.string_meta if isinstance(t, str) else None
+
+    def lua_unpack(t, i=1, j=None):
+        j = t.length() if j is None else int(j)
+        return tuple(t.get(k) for k in range(int(i), j + 1))
+
+    for name, fn in {
+        "print": lua_print, "type": lua_type, "tostring": lambda v=None: interp.tostring(v),
+        "tonumber": lua_tonumber, "next": lua_next, "pairs": lua_pairs, "ipairs": lua_ipairs,
+        "select": lua_select, "error": lua_error, "assert": lua_assert, "pcall": lua_pcall,
+        "xpcall": lua_xpcall, "setmetatable": lua_setmetatable, "getmetatable": lua_getmetatable,
+        "rawget": lambda t, k: t.get(k), "rawset": lua_rawset,
+        "rawequal": lambda a, b: lua_eq(a, b), "rawlen": lambda t: t.length() if isinstance(t, LuaTable) else len(t.encode()),
+        "unpack": lua_unpack,
+    }.items():
+        g.set(name, fn)
+    g.set("_G", g)
+    g.set("_VERSION", "Lua 5.3")
+
+    # table
+    def t_insert(t, *args):
+        if len(args) == 1:
+            t.set(t.length() + 1, args[0])
+            return
+        pos, v = int(args[0]), args[1]
+        n = t.length()
+        for k in range(n, pos - 1, -1):
+            t.set(k + 1, t.get(k))
+        t.set(pos, v)
+
+    def t_remove(t, pos=None):
+        n = t.length()
+        if pos is None:
+            pos = n
+        pos = int(pos)
+        if n == 0 and pos in (0, n):
+            return t.get(pos)
+        v = t.get(pos)
+        for k in range(pos, n):
+            t.set(k, t.get(k + 1))
+        t.set(n, None)
+        return v
+
+    def t_concat(t, sep="", i=1, j=None):
+        j = t.length() if j is None else int(j)
+        parts = []
+        for k in range(int(i), j + 1):
+            v = t.get(k)
+            if not isinstance(v, (str, int, float)) or isinstance(v, bool):
+                raise LuaError(f"invalid value (at index {k}) in table for 'concat'")
+            parts.append(v if isinstance(v, str) else fmt_number(v))
+        return sep.join(parts)
+
+    def t_sort(t, comp=None):
+        n = t.length()
+        values = [t.get(k) for k in range(1, n + 1)]
+        if comp is None:
+            def cmp(a, b):
+                return -1 if interp.arith("<", a, b) else (1 if interp.arith("<", b, a) else 0)
+        else:
+            def cmp(a, b):
+                return -1 if truthy(_first(call(comp, [a, b]))) else (1 if truthy(_first(call(comp, [b, a]))) else 0)
+        values.sort(key=functools.cmp_to_key(cmp))
+        for k, v in enumerate(values, 1):
+            t.set(k, v)
+
+    def t_pack(*args):
+        t = LuaTable(list(args))
+        t.set("n", len(args))
+        return t
+
+    g.set("table", LuaTable({
+        "insert": t_insert, "remove": t_remove, "concat": t_concat, "sort": t_sort, "unpack": lua_unpack,
+        "pack": t_pack,
+    }))
+
+    # string（按 Python 字符处理；# 与 string.len 按 UTF-8 字节）
+    def s_sub(s, i=1, j=-1):
+        s = _as_str(s)
+        n = len(s)
+        i, j = int(i), int(j)
+        i = max(1, n + i + 1 if i < 0 else i)
+        j = min(n, n + j + 1 if j < 0 else j)
+        return s[i - 1:j] if i <= j else ""
+
+    def s_format(fmt, *args):
+        out, k = [], 0
+        pos = 0
+        for m in _FMT_RE.finditer(fmt):
+            out.append(fmt[pos:m.start()])
+            pos = m.end()
+            flags, conv = m.groups()
+            if conv == "%":
+                out.append("%")
+                continue
+            if k >= len(args):
+                raise LuaError(f"bad argument #{k + 2} to 'format' (no value)")
+            v = args[k]
+            k += 1
+            if conv == "s":
+                out.append(("%" + flags + "s") % interp.tostring(v))
+            elif conv == "q":
+                out.append('"' + interp.tostring(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"')
+            elif conv in "dioxXuc":
+                n = tonumber(v)
+                if n is None or _to_int(n) is None:
+                    raise LuaError(f"bad argument #{k + 1} to 'format' (number has no integer representation)")
+                out.append(("%" + flags + ("d" if conv in "iu" else conv)) % _to_int(n) if conv != "c" else chr(_to_int(n)))
+            else:
+                n = tonumber(v)
+                if n is None:
+                    raise LuaError(f"bad argument #{k + 1} to 'format' (number expected, got {type_name(v)})")
+                out.append(("%" + flags + conv) % n if conv not in "aA" else float(n).hex())
+        out.append(fmt[pos:])
+        return "".join(out)
+
+    def s_find(s, pattern, init=1, plain=False):
+        s = _as_str(s)
+        start = max(0, int(init) - 1 if int(init) > 0 else len(s) + int(init))
+        if plain or not re.search(r"[\^$*+?.()\[\]%-]", pattern):
+            i = s.find(pattern, start)
+            return None if i < 0 else (i + 1, i + len(pattern))
+        m = _lua_pattern(pattern).search(s, start)
+        if not m:
+            return None
+        return (m.start() + 1, m.end(), *_captures(m))
+
+    def s_match(s, pattern, init=1):
+        s = _as_str(s)
+        m = _lua_pattern(pattern).search(s, max(0, int(init) - 1))
+        if not m:
+            return None
+        return _captures(m) if m.re.groups else m.group(0)
+
+    def s_gmatch(s, pattern):
+        it = _lua_pattern(pattern).finditer(_as_str(s))
+
+        def iterator(*_):
+            for m in it:
+                return _captures(m) if m.re.groups else m.group(0)
+            return None
+        return iterator
+
+    def s_gsub(s, pattern, repl, n=None):
+        s = _as_str(s)
+        count = 0
+
+        def sub(m):
+            nonlocal count
+            count += 1
+            whole = m.group(0)
+            caps = _captures(m) or (whole,)
+            cap = caps[0]
+            if isinstance(repl, str):
+                return re.sub(r"%([0-9%])", lambda r: whole if r.group(1) == "0" else
+                              "%" if r.group(1) == "%" else interp.tostring(caps[int(r.group(1)) - 1]), repl)
+            if isinstance(repl, LuaTable):
+                v = repl.get(cap)
+            else:
+                v = _first(call(repl, list(caps)))
+            return whole if not truthy(v) else interp.tostring(v)
+        out = _lua_pattern(pattern).sub(sub, s, count=0 if n is None else int(n))
+        return out, count
+
+    string_lib = LuaTable({
+        "sub": s_sub, "format": s_format, "find": s_find, "match": s_match, "gmatch": s_gmatch, "gsub": s_gsub,
+        "len": lambda s: len(_as_str(s).encode("utf-8")), "upper": lambda s: _as_str(s).upper(),
+        "lower": lambda s: _as_str(s).lower(), "rep": lambda s, n, sep="": sep.join([_as_str(s)] * int(n)),
+        "reverse": lambda s: _as_str(s)[::-1], "byte": lambda s, i=1, j=None: tuple(
+            s_sub(s, i, i if j is None else j).encode("utf-8")),
+        "char": lambda *cs: bytes(int(c) for c in cs).decode("utf-8", "replace"),
+    })
+    g.set("string", string_lib)
+    interp.string_lib = string_lib
+    interp.string_meta = LuaTable({"__index": string_lib})
+
+    # math
+    rnd = interp.random
+
+    def m_random(m=None, n=None):
+        if m is None:
+            return rnd.random()
+        if n is None:
+            m, n = 1, m
+        return rnd.randint(int(m), int(n))
+
+    def m_floor(x):
+        return math.floor(x) if isinstance(x, float) and math.isfinite(x) else x
+
+    def m_ceil(x):
+        return math.ceil(x) if isinstance(x, float) and math.isfinite(x) else x
+
+    g.set("math", LuaTable({
+        "floor": m_floor, "ceil": m_ceil, "abs": abs, "sqrt": lambda x: math.sqrt(x),
+        "max": lambda *a: functools.reduce(lambda x, y: y if interp.arith("<", x, y) else x, a),
+        "min": lambda *a: functools.reduce(lambda x, y: y if interp.arith("<", y, x) else x, a),
+        "sin": math.sin, "cos": math.cos, "tan": math.tan, "asin": math.asin, "acos": math.acos,
+        "atan": lambda y, x=1.0: math.atan2(y, x), "exp": math.exp, "log": lambda x, b=None: math.log(x) if b is None else math.log(x, b),
+        "fmod": math.fmod, "modf": lambda x: (float(math.trunc(x)), x - math.trunc(x)), "pi": math.pi, "huge": math.inf,
+        "maxinteger": 2 ** 63 - 1, "mininteger": -2 ** 63, "random": m_random, "randomseed": lambda *a: rnd.seed(a[0] if a else 0),
+        "tointeger": lambda x: _to_int(x) if isinstance(x, (int, float)) and not isinstance(x, bool) else None,
+        "type": lambda x: ("integer" if isinstance(x, int) else "float") if isinstance(x, (int, float)) and not isinstance(x, bool) else None,
+    }))
+
+    # os（只读的时间函数）
+    start = time.perf_counter()
+    g.set("os", LuaTable({"time": lambda *a: int(time.time()), "clock": lambda: time.perf_counter() - start,
+                          "date": lambda fmt="%c", t=None: time.strftime(fmt.lstrip("!"), time.localtime(t))}))
+
+
+def _as_str(s) -> str:
+    if isinstance(s, str):
+        return s
+    if isinstance(s, (int, float)) and not isinstance(s, bool):
+        return fmt_number(s)
+    raise LuaError(f"bad argument #1 (string expected, got {type_name(s)})")
+
+
+_PATTERN_CLASSES = {"a": "[^\\W\\d_]", "d": "\\d", "l": "[a-z]", "s": "\\s", "u": "[A-Z]", "w": "[^\\W_]",
+                    "x": "[0-9a-fA-F]", "p": "[!-/:-@\\[-`{-~]", "c": "[\\x00-\\x1f]",
+                    "A": "[\\W\\d_]", "D": "\\D", "L": "[^a-z]", "S": "\\S", "U": "[^A-Z]", "W": "[\\W_]"}
+
+
+_POS_CAPTURE = "_pos"
+
+
+def _captures(m: "re.Match") -> tuple:
+    """匹配的捕获值：普通捕获为子串，位置捕获 () 为 1 起始的位置（整数）。"""
+    names = {i: name for name, i in m.re.groupindex.items()}
+    return tuple(m.start(i) + 1 if names.get(i, "").startswith(_POS_CAPTURE) else m.group(i)
+                 for i in range(1, m.re.groups + 1))
+
+
+@functools.lru_cache(maxsize=256)
+def _lua_pattern(pattern: str) -> "re.Pattern":
+    """Lua 模式 -> Python 正则（支持字符类、集合、锚点、捕获与 * + - ? 量词；%b / %f 不支持）。"""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "%" and i + 1 < n:
+            d = pattern[i + 1]
+            if d in ("b", "f"):
+                raise LuaError(f"pattern item '%{d}' not supported in dry-run")
+            out.append(_PATTERN_CLASSES.get(d, re.escape(d)))
+            i += 2
+        elif c == "[":
+            j = i + 1
+            body = ["["]
+            if j < n and pattern[j] == "^":
+                body.append("^")
+                j += 1
+            first = True
+            while j < n and (pattern[j] != "]" or first):
+                first = False
+                if pattern[j] == "%" and j + 1 < n:
+                    cls = _PATTERN_CLASSES.get(pattern[j + 1])
+                    body.append(cls[1:-1] if cls and cls.startswith("[") else cls or re.escape(pattern[j + 1]))
+                    j += 2
+                else:
+                    body.append("\\" + pattern[j] if pattern[j] in "\\[]^" else pattern[j])
+                    j += 1
+            body.append("]")
+            out.append("".join(body))
+            i = j + 1
+        elif c == "-":
+            out.append("*?" if out else re.escape(c))
+            i += 1
+        elif c == "." or c in "*+?()":
+            if c == "(" and pattern[i + 1:i + 2] == ")":
+                # 位置捕获 ()：用命名空组标记，_captures 取其位置
+                out.append(f"(?P<{_POS_CAPTURE}{i}>)")
+                i += 2
+            else:
+                out.append(c)
+                i += 1
+        elif c == "^" and i == 0:
+            out.append("^")
+            i += 1
+        elif c == "$" and i == n - 1:
+            out.append("$")
+            i += 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return re.compile("".join(out), re.S)
+
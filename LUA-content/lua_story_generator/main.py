@@ -1,15 +1,18 @@
 """FastAPI backend for LUA Story Generator."""
+import asyncio
 import json
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import AliasChoices, BaseModel, Field
 
 import config
-from datatable_loader import load_resources
-from orchestrator import run_full_pipeline
+from datatable_loader import get_resource_index, load_resources
+from orchestrator import iter_batch_async, rerun_pipeline_async, run_full_pipeline_async
 from stage_loader import get_init_map_code
 
 app = FastAPI(title="LUA Story to Script Generator")
@@ -40,6 +43,17 @@ class GenerateRequest(BaseModel):
     story_mode: str = "expand"  # expand=扩写(自然语言→剧本), continue=续写(前一章→下一章)
     init_map_code: str | None = None  # 用户在地图编辑器中编辑后的 InitMap 代码，若提供则优先使用（覆盖 stage_loader 模板）
     previous_init_event: str | None = None  # 续写时上一幕的 InitEvent 代码，用于提取 NPC 信息（id、resource、身份）
+    bypass_cache: bool = False  # True 时不读取 LLM 响应缓存，强制重新生成（新结果仍写回缓存）
+    speculative_candidates: int | None = None  # 推测式并发编码候选数 K，None 取 config.SPECULATIVE_CANDIDATES
+    known_stage_hashes: list[str] | None = None  # 客户端已缓存的 stage Hash；命中的 stage 只返回引用，且不返回 full_script
+
+
+class BatchGenerateRequest(BaseModel):
+    items: list[dict]  # 每项与 GenerateRequest 字段相同；未给 api_key 时使用顶层 api_key
+    api_key: str | None = None
+    concurrency: int | None = None  # 并发数，默认 config.BATCH_CONCURRENCY，上限 BATCH_MAX_CONCURRENCY
+    item_timeout: float | None = None  # 单条超时秒数，默认 config.BATCH_ITEM_TIMEOUT
+    stages_only: bool = False  # True 时每条结果仅含 stages
 
 
 class AssetsModel(BaseModel):
@@ -53,6 +67,7 @@ class AssetsModel(BaseModel):
 class StageItem(BaseModel):
     Type: str  # InitMap | InitEvent | StartGame | Reopen | AddEvent | Dialogue
     Code: str
+    Hash: str | None = None  # Code 的内容哈希
 
 
 class GenerateResponse(BaseModel):
@@ -60,8 +75,28 @@ class GenerateResponse(BaseModel):
     plan_output: str
     steps: list
     generated_files: dict
-    stages: list  # [{Type, Code}, ...]，按 InitMap -> InitEvent -> StartGame 顺序
+    stages: list  # [{Type, Code, Hash}, ...]，按 InitMap -> InitEvent -> StartGame 顺序；已缓存的为 {Type, Hash, Ref}
     full_script: str  # 所有 stages 的 Code 拼接（兼容旧用法）
+    run_id: str | None = None  # 阶段产物存储 ID，可用于 /runs/{run_id}/rerun 从指定阶段重跑
+
+
+class RerunOverrides(BaseModel):
+    expanded_story: str | None = None  # 编辑后的扩写剧本
+    plan_output: str | None = None  # 编辑后的规划输出
+    steps: list | None = None  # 编辑后的步骤列表
+
+
+class RerunRequest(BaseModel):
+    api_key: str
+    from_stage: str | None = None  # expanded_story | plan_output | steps | step_codes；缺省按 overrides 推断
+    overrides: RerunOverrides | None = None
+    story_model: str | None = None  # 为空时沿用原 run 的模型
+    planning_model: str | None = None
+    coding_model: str | None = None
+    encounter_locations: list[dict] | None = None
+    stages_only: bool = False
+    bypass_cache: bool = False
+    speculative_candidates: int | None = None
 
 
 @app.get("/")
@@ -149,15 +184,30 @@ def get_preset_map():
     return {"code": get_init_map_code()}
 
 
+def _versioned_response(request: Request, name: str, build, if_version: str | None) -> Response:
+    """带 ETag 的素材库响应；客户端版本未变时返回 304（无正文）。"""
+    from asset_catalog import catalog_key, etag, get_versioned, not_modified
+
+    data, version = get_versioned(name, catalog_key(ASSETS_FILE, DEFAULT_ASSETS), build)
+    headers = {"ETag": etag(version), "Cache-Control": "no-cache"}
+    if not_modified(version, request.headers.get("if-none-match"), if_version):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({**data, "version": version}, headers=headers)
+
+
 @app.get("/api/assets")
-def get_assets():
-    """获取素材库（从 DataTable 加载，启动时读取）"""
-    return _load_assets()
+def get_assets(request: Request, if_version: str | None = None):
+    """获取素材库（从 DataTable 加载，启动时读取）。支持 ETag / If-None-Match 与 ?if_version="""
+    return _versioned_response(request, "assets", _load_assets, if_version)
 
 
 @app.get("/api/resources")
-def get_resources():
-    """获取完整资源详情（含描述等，供前端展示）"""
+def get_resources(request: Request, if_version: str | None = None):
+    """获取完整资源详情（含描述等，供前端展示）。支持 ETag / If-None-Match 与 ?if_version="""
+    return _versioned_response(request, "resources", _resources_payload, if_version)
+
+
+def _resources_payload() -> dict:
     res = load_resources()
     return {
         "npcs": res["npcs"],
@@ -168,7 +218,43 @@ def get_resources():
         "minigames": res["minigames"],
         "source": res["source"],
         "datatable_dir": res["datatable_dir"],
-        "hint": "素材库从 DataTable CSV 加载，策划修改表格后重启服务生效",
+        "hint": "素材库从 DataTable CSV 加载，策划修改表格后自动生效（也可 POST /api/resources/reload 立即重新加载）",
+    }
+
+
+@app.post("/api/resources/reload")
+def reload_resources():
+    """立即重新解析 DataTable CSV 并替换内存中的素材库索引。"""
+    from datatable_loader import reload_resource_index
+    index = reload_resource_index()
+    return {"ok": True, "loaded_at": index.loaded_at, "fingerprint": index.fingerprint, "counts": index.counts()}
+
+
+@app.get("/api/resources/search")
+def search_resources(q: str = "", types: str = "", mode: str = "prefix", offset: int = 0, limit: int | None = None):
+    """
+    素材搜索（前端自动补全用）：按 id、物品显示名（NSLOCTEXT）、道具描述做前缀或子串匹配。
+    types 逗号分隔（npcs,enemies,props,items,animations），mode = prefix | substring。
+    """
+    from resource_search import MODES, TYPES, get_search_index
+
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {list(MODES)}")
+    wanted = [t.strip() for t in types.split(",") if t.strip()]
+    unknown = [t for t in wanted if t not in TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown types {unknown}, expected {list(TYPES)}")
+    offset = max(0, offset)
+    limit = max(1, min(limit or config.RESOURCE_SEARCH_LIMIT, config.RESOURCE_SEARCH_LIMIT_MAX))
+    total, results = get_search_index().search(q, wanted, mode, offset, limit)
+    return {
+        "q": q,
+        "mode": mode,
+        "types": wanted or list(TYPES),
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "results": results,
     }
 
 
@@ -185,16 +271,79 @@ class SendToUnrealRequest(BaseModel):
     code: str
 
 
+@app.get("/api/api-catalog")
+async def get_api_catalog(full: bool = False):
+    """API 签名表（由 lua_atomic_modules_call_guide.md 编译）：文档哈希、编译次数、各模块函数数；full=true 时附带全部签名。"""
+    import api_catalog
+    stats = api_catalog.get_catalog_stats()
+    if full:
+        catalog = api_catalog.get_catalog()
+        stats["modules"] = catalog["modules"]
+        stats["methods_detail"] = catalog["methods"]
+    return stats
+
+
+class DryRunRequest(BaseModel):
+    """离线执行生成的 LUA：init_map / start_game 为空时使用固定阶段代码"""
+    init_event: str
+    init_map: str | None = None
+    start_game: str | None = None
+    budget: int | None = None  # 每段代码的指令预算
+    choice: int = 1  # UI.Ask / AskMany 选择第几个选项
+    trace: bool = True
+
+
+@app.post("/api/dry-run")
+async def dry_run_lua(req: DryRunRequest):
+    """用纯 Python Lua 解释器与记录桩执行 InitMap / InitEvent / StartGame 及各 encounter，返回调用记录、步数与耗时。"""
+    from dry_run import dry_run
+    report = await asyncio.to_thread(
+        dry_run, req.init_event, req.init_map, req.start_game, req.budget, None, max(1, req.choice))
+    if not req.trace:
+        report.pop("trace")
+    return report
+
+
 @app.get("/api/tcp-status")
 def tcp_status():
-    """返回 TCP 已连接客户端数量，供前端显示通信状态。"""
+    """返回 TCP 已连接客户端数量，供前端显示通信状态；附带连接数上限、峰值、拒绝数等统计。"""
     try:
-        from tcp_server import get_connected_count
-        return {"connected": get_connected_count()}
+        from tcp_server import get_server_stats
+        stats = get_server_stats()
+        return {"connected": stats["connections"], **stats}
     except Exception:
         return {"connected": 0}
 
 
+@app.get("/api/llm-pool")
+def llm_pool_stats():
+    """LLM 客户端连接池统计：客户端数量、请求数、新建/复用连接数。"""
+    from llm_clients import get_pool_stats
+    return get_pool_stats()
+
+
+@app.get("/api/validation-stats")
+def validation_stats():
+    """生成代码的本地 Lua 语法检查与 Encounter 规则校验统计（次数、失败数、耗时）。"""
+    from orchestrator import get_validation_stats
+    return get_validation_stats()
+
+
+@app.get("/api/llm-cache")
+def llm_cache_stats():
+    """LLM 响应缓存统计：命中/未命中、内存与磁盘条目数。"""
+    from llm_cache import get_cache
+    return get_cache().stats()
+
+
+@app.delete("/api/llm-cache")
+def llm_cache_clear():
+    """清空 LLM 响应缓存（内存 + 磁盘）。"""
+    from llm_cache import get_cache
+    get_cache().clear()
+    return {"ok": True}
+
+
 @app.get("/api/ue-messages")
 def ue_messages(limit: int = 50, clear: bool = False):
     """获取 UE 端反馈消息，供前端展示。clear=true 时返回后清空队列。"""
@@ -207,7 +356,8 @@ def ue_messages(limit: int = 50, clear: bool = False):
 
 
 import time
-_send_dedup: dict = {}  # {(type, code): last_send_time} 用于去重
+_send_dedup: dict = {}  # {(type, code 哈希): last_send_time} 用于去重，只保留去重窗口内的条目
+_SEND_DEDUP_WINDOW = 0.5
 
 class NpcThinkRequest(BaseModel):
     """统一格式：Type + Code。Web/UE 端通用。"""
@@ -217,14 +367,14 @@ class NpcThinkRequest(BaseModel):
 
 
 @app.post("/api/npc-interaction/generate")
-def npc_interaction_generate(req: NpcThinkRequest):
+async def npc_interaction_generate(req: NpcThinkRequest):
     """根据 Type 分发：NPC_Think_Begin→思考LUA，NPC_Dialogue_Request→对话回复LUA。返回 {Type, Code} 格式。"""
     if not req.api_key or not req.api_key.strip():
         raise HTTPException(status_code=400, detail="API Key is required")
     msg_type = (req.Type or "").strip()
     try:
-        res = load_resources()
-        animations = res.get("animations", [])
+        # 直接读内存中的素材索引，不为每次请求复制整份资源表
+        animations = get_resource_index().resources.get("animations", [])
         if not animations:
             animations = [
                 "Happy", "Frustrated", "Wave", "Scared", "Shy", "Dance",
@@ -232,16 +382,16 @@ def npc_interaction_generate(req: NpcThinkRequest):
                 "Dialogue", "Admiring",
             ]
         if msg_type == "NPC_Dialogue_Request":
-            from npc_dialogue import generate_npc_dialogue_reply_lua
-            lua = generate_npc_dialogue_reply_lua(
+            from npc_dialogue import generate_npc_dialogue_reply_lua_async
+            lua = await generate_npc_dialogue_reply_lua_async(
                 api_key=req.api_key.strip(),
                 code=req.Code,
                 animations=animations,
             )
             return {"Type": "NPC_Dialogue_Reply", "Code": lua, "ok": True, "lua": lua}
         else:
-            from npc_interaction import generate_npc_think_lua
-            lua = generate_npc_think_lua(
+            from npc_interaction import generate_npc_think_lua_async
+            lua = await generate_npc_think_lua_async(
                 api_key=req.api_key.strip(),
                 code=req.Code,
                 animations=animations,
@@ -255,9 +405,13 @@ def npc_interaction_generate(req: NpcThinkRequest):
 def send_to_unreal(req: SendToUnrealRequest):
     """将 LUA 代码推送给已连接的 Unreal TCP 客户端，仅发送 { Type, Code }"""
     import sys
-    key = (req.type, req.code)
+    from stage_hashes import stage_hash
+    # 按内容哈希去重，不在内存中保留整段代码（正文只在确有客户端、可能按 Hash 取回时由 send_to_unreal_clients 登记）
+    key = (req.type, stage_hash(req.code))
     now = time.monotonic()
-    if key in _send_dedup and (now - _send_dedup[key]) < 0.5:
+    for k in [k for k, t in _send_dedup.items() if now - t >= _SEND_DEDUP_WINDOW]:
+        del _send_dedup[k]
+    if key in _send_dedup:
         print(f"[send-to-unreal] 去重跳过 Type={req.type}", file=sys.stderr)
         from tcp_server import get_connected_count
         return {"ok": True, "sent_to": get_connected_count(), "deduped": True}
@@ -278,9 +432,8 @@ def get_models():
     }
 
 
-@app.post("/generate")
-def generate(req: GenerateRequest):
-    """Run full pipeline: story expansion -> planning -> code generation."""
+async def _prepare_generate(req: GenerateRequest) -> dict:
+    """校验 GenerateRequest 并补全模型 / 素材库默认值，返回 run_full_pipeline_async 的参数。"""
     if not req.api_key or not req.api_key.strip():
         raise HTTPException(status_code=400, detail="API Key is required")
 
@@ -294,30 +447,274 @@ def generate(req: GenerateRequest):
     if req.coding_model not in config.CODING_MODELS:
         req.coding_model = config.CODING_MODELS[0]
 
-    assets = req.assets or _load_assets()
+    assets = req.assets or await run_in_threadpool(_load_assets)
     if not assets.get("npcs") and not assets.get("enemies") and not assets.get("props") and not assets.get("items"):
-        assets = _load_assets()
+        assets = await run_in_threadpool(_load_assets)
     if "minigames" not in assets or not assets["minigames"]:
         assets.setdefault("minigames", ["TTT"])
 
+    return {
+        "story_input": req.story_input.strip(),
+        "api_key": req.api_key.strip(),
+        "story_model": req.story_model,
+        "planning_model": req.planning_model,
+        "coding_model": req.coding_model,
+        "assets": assets,
+        "encounter_locations": req.encounter_locations,
+        "story_mode": req.story_mode,
+        "init_map_code": req.init_map_code.strip() if req.init_map_code else None,
+        "previous_init_event": req.previous_init_event.strip() if req.previous_init_event else None,
+        "use_cache": not req.bypass_cache,
+        "speculative": req.speculative_candidates,
+    }
+
+
+@app.post("/generate")
+async def generate(req: GenerateRequest):
+    """Run full pipeline: story expansion -> planning -> code generation (async，不占用工作线程)."""
+    kwargs = await _prepare_generate(req)
     try:
-        result = run_full_pipeline(
-            story_input=req.story_input.strip(),
+        result = await run_full_pipeline_async(**kwargs)
+        if req.known_stage_hashes:
+            from stage_hashes import delta_stages
+            result["stages"] = delta_stages(result.get("stages", []), set(req.known_stage_hashes))
+            result["full_script"] = ""  # 客户端按 stages 拼接，不再重复发送
+        if req.stages_only:
+            return result.get("stages", [])  # 仅返回 stages 数组，与 TCP 一致
+        return GenerateResponse(**result)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/stages/{stage_hash}")
+def get_stage(stage_hash: str):
+    """按 Hash 取回最近生成 / 推送过的 stage 正文（客户端缓存丢失时使用）。"""
+    from stage_hashes import get_stage_body
+    code = get_stage_body(stage_hash)
+    if code is None:
+        raise HTTPException(status_code=404, detail=f"Unknown stage hash: {stage_hash}")
+    return {"Hash": stage_hash, "Code": code}
+
+
+@app.get("/runs")
+def list_runs(limit: int = 20):
+    """最近的 pipeline run 列表（run_id、故事摘要、已保存阶段）。"""
+    from pipeline_runs import get_run_store
+    return {"runs": get_run_store().list(limit=min(limit, 200))}
+
+
+@app.get("/runs/{run_id}")
+def get_run(run_id: str):
+    """某次 run 的参数与各阶段产物（expanded_story、plan_output、steps、step_codes）。"""
+    from pipeline_runs import get_run_store
+    record = get_run_store().get(run_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown run_id: {run_id}")
+    return record
+
+
+@app.post("/runs/{run_id}/rerun")
+async def rerun(run_id: str, req: RerunRequest):
+    """从指定阶段重跑：之前阶段复用（或用 overrides 覆盖），只重新调用下游 Agent。返回新的 run_id。"""
+    if not req.api_key or not req.api_key.strip():
+        raise HTTPException(status_code=400, detail="API Key is required")
+    if req.story_model and req.story_model not in config.STORY_MODELS:
+        req.story_model = config.STORY_MODELS[0]
+    if req.planning_model and req.planning_model not in config.PLANNING_MODELS:
+        req.planning_model = config.PLANNING_MODELS[0]
+    if req.coding_model and req.coding_model not in config.CODING_MODELS:
+        req.coding_model = config.CODING_MODELS[0]
+    try:
+        result = await rerun_pipeline_async(
+            run_id,
             api_key=req.api_key.strip(),
+            from_stage=req.from_stage,
+            overrides=req.overrides.model_dump(exclude_none=True) if req.overrides else None,
+            use_cache=not req.bypass_cache,
             story_model=req.story_model,
             planning_model=req.planning_model,
             coding_model=req.coding_model,
-            assets=assets,
             encounter_locations=req.encounter_locations,
-            story_mode=req.story_mode,
-            init_map_code=req.init_map_code.strip() if req.init_map_code else None,
-            previous_init_event=req.previous_init_event.strip() if req.previous_init_event else None,
+            speculative=req.speculative_candidates,
         )
-        if req.stages_only:
-            return result.get("stages", [])  # 仅返回 stages 数组，与 TCP 一致
-        return GenerateResponse(**result)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if req.stages_only:
+        return result.get("stages", [])
+    return GenerateResponse(**result)
+
+
+@app.post("/generate/batch")
+async def generate_batch(req: BatchGenerateRequest):
+    """
+    批量生成：按 concurrency 并发执行，每条完成即输出一行 JSON（application/x-ndjson），
+    按完成顺序返回并以 index 标记输入下标：{"index", "ok", "result" | "error", "elapsed"}。
+    """
+    from pydantic import ValidationError
+
+    prepared: list[dict | str] = []
+    for item in req.items:
+        try:
+            item_req = GenerateRequest.model_validate({"api_key": req.api_key or "", **item})
+            prepared.append(await _prepare_generate(item_req))
+        except ValidationError as e:
+            prepared.append(f"Invalid item: {e.errors()[0].get('msg', e)}")
+        except HTTPException as e:
+            prepared.append(str(e.detail))
+
+    async def lines():
+        async for entry in iter_batch_async(prepared, req.concurrency, req.item_timeout):
+            if entry.get("ok") and req.stages_only:
+                entry["result"] = entry["result"].get("stages", [])
+            yield json.dumps(entry, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs")
+async def submit_job(req: GenerateRequest):
+    """提交生成任务，立即返回 job_id；由后台 worker 池执行，结果持久化，可轮询 / 长轮询 / 订阅。"""
+    from jobs import get_job_manager
+    kwargs = await _prepare_generate(req)
+    job_id = get_job_manager().submit(kwargs)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs")
+def list_jobs(limit: int = 20):
+    """最近的任务列表。"""
+    from jobs import get_job_manager
+    return {"jobs": get_job_manager().store.list(limit=min(limit, 200))}
+
+
+async def _job_record(job_id: str, wait: float, with_result: bool = False) -> dict:
+    from jobs import FINISHED, get_job_manager
+    manager = get_job_manager()
+    wait = min(max(wait, 0.0), config.JOB_WAIT_MAX)
+    record = await manager.wait_async(job_id, wait) if wait > 0 else manager.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id: {job_id}")
+    if with_result and record["status"] in FINISHED:
+        record = manager.get(job_id, with_result=True)
+    return record
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """任务状态；wait>0 时长轮询，任务结束或超时（上限 JOB_WAIT_MAX 秒）后返回。"""
+    return await _job_record(job_id, wait)
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, wait: float = 0, stages_only: bool = False):
+    """任务结果（可配合 wait 长轮询）。未结束返回 409，失败 / 取消时 result 为 null 并带 error。"""
+    record = await _job_record(job_id, wait, with_result=True)
+    if "result" not in record:
+        raise HTTPException(status_code=409, detail=f"Job not finished: {record['status']}")
+    if stages_only and record["result"]:
+        return record["result"].get("stages", [])
+    return record
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """取消排队中或运行中的任务。"""
+    from jobs import get_job_manager
+    if not get_job_manager().cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job not running: {job_id}")
+    return {"job_id": job_id, "cancelled": True}
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """订阅任务完成：SSE，先推送当前状态（status），任务结束时推送 done（含结果）。"""
+    from jobs import get_job_manager
+    manager = get_job_manager()
+    record = manager.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id: {job_id}")
+
+    async def events():
+        yield _sse("status", record)
+        # 整个连接只订阅一次；每 JOB_WAIT_MAX 秒发一次 keep-alive
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+        unsubscribe = manager.subscribe(job_id, lambda _record: loop.call_soon_threadsafe(done.set))
+        try:
+            while unsubscribe is not None and not done.is_set():
+                try:
+                    await asyncio.wait_for(done.wait(), config.JOB_WAIT_MAX)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            if unsubscribe is not None:
+                unsubscribe()
+        yield _sse("done", manager.get(job_id, with_result=True))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data) -> str:
+    """格式化一条 Server-Sent Event。"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/generate/stream")
+async def generate_stream(req: GenerateRequest):
+    """
+    SSE 版 /generate：边生成边推送事件。
+    事件：stage、expanded_story_delta、expanded_story、plan、coding_attempt、validation，
+    最后为 done（完整结果，stages_only 时仅 stages）或 error。客户端断开连接即取消生成。
+    """
+    kwargs = await _prepare_generate(req)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_event(event: str, data: dict) -> None:
+        await queue.put((event, data))
+
+    async def run() -> None:
+        try:
+            result = await run_full_pipeline_async(**kwargs, on_event=on_event)
+            await queue.put(("done", result.get("stages", []) if req.stages_only else result))
+        except Exception as e:
+            await queue.put(("error", {"error": str(e)}))
+        finally:
+            await queue.put(None)
+
+    async def events():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield _sse(*item)
+        finally:
+            # 客户端提前断开时取消流水线，不再为后续 LLM 调用付费
+            task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.on_event("startup")
+async def _warm_resource_index():
+    """启动时在线程中构建素材库索引、搜索索引与规则 / API 文档检索索引，之后的请求只做内存读取。"""
+    from doc_index import get_doc_index
+    from resource_search import get_search_index
+    await run_in_threadpool(get_search_index)
+    await run_in_threadpool(get_doc_index)
 
 
 def _start_tcp_server_thread(host: str = "127.0.0.1", port: int = 9000):
@@ -1,8 +1,8 @@
 """NPC 对话功能：根据 Type=NPC_Dialogue_Request、Code={NPCInfo, CurrentDialogue} 生成回复 LUA。"""
 import json
 import re
-from openai import OpenAI
 
+from llm_clients import get_async_client, get_client
 from prompts.npc_dialogue import NPC_DIALOGUE_MAIN_PROMPT
 
 
@@ -33,6 +33,32 @@ def generate_npc_dialogue_reply_lua(
     Code 包含 NPCInfo 与 CurrentDialogue。
     返回包含 _self_:Say() 等的 LUA 脚本。
     """
+    prompt = _build_npc_dialogue_prompt(code, animations)
+    client = get_client(api_key)
+    response = client.chat.completions.create(
+        model="gpt-4.1",
+        messages=[{"role": "user", "content": prompt}],
+    )
+    return _postprocess_lua(response.choices[0].message.content or "")
+
+
+async def generate_npc_dialogue_reply_lua_async(
+    api_key: str,
+    code: dict | None = None,
+    animations: list[str] | None = None,
+) -> str:
+    """Async 版 generate_npc_dialogue_reply_lua，供 async 端点使用，不占用工作线程。"""
+    prompt = _build_npc_dialogue_prompt(code, animations)
+    client = get_async_client(api_key)
+    response = await client.chat.completions.create(
+        model="gpt-4.1",
+        messages=[{"role": "user", "content": prompt}],
+    )
+    return _postprocess_lua(response.choices[0].message.content or "")
+
+
+def _build_npc_dialogue_prompt(code: dict | None, animations: list[str] | None) -> str:
+    """Build the model prompt from Code (shared by sync/async)."""
     npc_info, current_dialogue = _parse_dialogue_code(code)
 
     info_parts = []
@@ -61,17 +87,15 @@ def generate_npc_dialogue_reply_lua(
     npc_info_str = "\n".join(info_parts) if info_parts else "未提供"
     current_str = current_dialogue or "（无）"
 
-    prompt = NPC_DIALOGUE_MAIN_PROMPT.format(
+    return NPC_DIALOGUE_MAIN_PROMPT.format(
         npc_info_json=npc_info_str,
         current_dialogue=current_str,
     )
 
-    client = OpenAI(api_key=api_key)
-    response = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}],
-    )
-    text = (response.choices[0].message.content or "").strip()
+
+def _postprocess_lua(text: str) -> str:
+    """去掉 markdown 包裹，并将 npc: 调用统一为 _self_:。"""
+    text = text.strip()
     if text.startswith("```"):
         m = re.search(r"```(?:lua)?\s*\n([\s\S]*?)```", text)
         if m:
@@ -1,10 +1,14 @@
 """NPC 思考功能：根据 UE 传入的 Type=NPC_Think_Begin、Code={NPCInfo, TagList} 生成 LUA 表演脚本。"""
 import json
 import re
-from openai import OpenAI
 
+import config
+from llm_clients import get_async_client, get_client
+from prompt_budget import PromptBudget
 from prompts.npc_think import NPC_THINK_MAIN_PROMPT
 
+NPC_THINK_MODEL = "gpt-4.1"
+
 
 def _safe_str(v, default=""):
     if v is None:
@@ -35,6 +39,32 @@ def generate_npc_think_lua(
     Code 包含 NPCInfo 与 TagList。
     返回包含 _self_:Say()、_self_:PlayAnim()、_self_:PlayAnimLoop() 的 LUA 脚本。
     """
+    prompt = _build_npc_think_prompt(code, animations)
+    client = get_client(api_key)
+    response = client.chat.completions.create(
+        model=NPC_THINK_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+    )
+    return _postprocess_lua(response.choices[0].message.content or "")
+
+
+async def generate_npc_think_lua_async(
+    api_key: str,
+    code: dict | None = None,
+    animations: list[str] | None = None,
+) -> str:
+    """Async 版 generate_npc_think_lua，供 async 端点使用，不占用工作线程。"""
+    prompt = _build_npc_think_prompt(code, animations)
+    client = get_async_client(api_key)
+    response = await client.chat.completions.create(
+        model=NPC_THINK_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+    )
+    return _postprocess_lua(response.choices[0].message.content or "")
+
+
+def _build_npc_think_prompt(code: dict | None, animations: list[str] | None) -> str:
+    """Build the model prompt from Code (shared by sync/async)."""
     npc_info, tag_list = _parse_code(code)
 
     # 构建供模型参考的 NPCInfo 摘要
@@ -80,20 +110,20 @@ def generate_npc_think_lua(
         "Happy", "Frustrated", "Wave", "Scared", "Shy", "Dance", "Drink", "Eat",
         "Idle", "Sit", "Sleep", "Sing", "PickUp", "Dialogue", "Admiring",
     ]
-    anim_str = ", ".join(anims[:30])
-
-    prompt = NPC_THINK_MAIN_PROMPT.format(
+    budget = PromptBudget("npc_think", NPC_THINK_MODEL)
+    budget.fixed("template", NPC_THINK_MAIN_PROMPT.format(npc_info_json=npc_info_str, tag_list_json=tag_list_str, anim_str=""))
+    budget.add("animations", ", ".join(anims), priority=0, max_tokens=config.PROMPT_SECTION_TOKENS["animations"],
+               mode="head", unit="item")
+    return NPC_THINK_MAIN_PROMPT.format(
         npc_info_json=npc_info_str,
         tag_list_json=tag_list_str,
-        anim_str=anim_str,
+        anim_str=budget.build()["animations"],
     )
 
-    client = OpenAI(api_key=api_key)
-    response = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}],
-    )
-    text = (response.choices[0].message.content or "").strip()
+
+def _postprocess_lua(text: str) -> str:
+    """去掉 markdown 包裹，并将 npc: 调用统一为 _self_:。"""
+    text = text.strip()
     if text.startswith("```"):
         m = re.search(r"```(?:lua)?\s*\n([\s\S]*?)```", text)
         if m:
@@ -1,21 +1,129 @@
 """Orchestrator: Story -> Plan -> Code with Skills + Validation Feedback Loop."""
+import asyncio
 import re
-from pathlib import Path
-
-from openai import OpenAI
+import threading
+import time
+from typing import Any, Awaitable, Callable
 
 from agents import (
     extract_steps_from_planner_output,
-    run_coding_agent,
-    run_planner,
-    run_story_expert,
+    run_coding_agent_async,
+    run_planner_async,
+    run_story_expert_async,
 )
 from stage_loader import get_init_map_code, get_npc_located_code, get_start_game_code
+import config
 from config import GROUND_Z
-from validate_lua import validate_encounter
+from llm_clients import get_async_client, run_sync
+from pipeline_runs import get_run_store, infer_from_stage, seed_for_rerun
+from stage_hashes import tag_stages
+from autofix_lua import autofix_encounter
+from validate_lua import lint_api_calls, parse_checked, validate_encounter
 
 MAX_FIX_RETRIES = 2
 
+# 进度回调：on_event(event, data)，供 /generate/stream 等推送阶段进度
+EventCallback = Callable[[str, dict[str, Any]], Awaitable[None]]
+
+
+async def _emit(on_event: EventCallback | None, event: str, data: dict[str, Any]) -> None:
+    if on_event:
+        await on_event(event, data)
+
+
+# 本地语法 / 规则校验与自动修复统计（GET /api/validation-stats）
+_stats_lock = threading.Lock()
+_validation_stats = {
+    "syntax_checks": 0,
+    "syntax_failures": 0,
+    "syntax_ms_total": 0.0,
+    "syntax_ms_max": 0.0,
+    "validations": 0,
+    "validation_failures": 0,
+    "api_call_failures": 0,   # 有未知 API / 实参个数不符的步骤数（API_LINT_STRICT=0 时只作为警告）
+    "autofix_runs": 0,        # 校验失败后调用本地修复的次数
+    "autofix_applied": 0,     # 修复后错误减少、采用修复结果的次数
+    "retries_avoided": 0,     # 修复后零错误，省去的 LLM 修正调用
+    "autofix_done_guard": 0,
+    "autofix_is_valid": 0,
+    "autofix_ask_compare": 0,
+    "autofix_asset_id": 0,
+}
+
+
+def get_validation_stats() -> dict:
+    """语法检查次数 / 失败数 / 耗时，Encounter 规则校验次数 / 失败数，自动修复次数与省去的重试数。"""
+    with _stats_lock:
+        stats = dict(_validation_stats)
+    checks = stats["syntax_checks"]
+    stats["syntax_ms_avg"] = round(stats["syntax_ms_total"] / checks, 3) if checks else 0.0
+    stats["syntax_ms_total"] = round(stats["syntax_ms_total"], 3)
+    stats["syntax_ms_max"] = round(stats["syntax_ms_max"], 3)
+    return stats
+
+
+def _check_step(code: str, assets: dict, is_encounter: bool) -> tuple[list[str], list[str]]:
+    """
+    _clean_code_output 之后立即做本地 Lua 语法检查（不依赖外部 Lua），有语法错误直接返回；
+    通过后用同一份 AST 检查 API 调用（api_catalog 签名表），Encounter 另做规则校验。
+    返回 (errors, warnings)：errors（含 "line N:M: ..."）直接进入 CODING_FIX；
+    API 调用问题在 API_LINT_STRICT=0 时为 warnings（签名表可能不全，不消耗修正次数）。
+    """
+    t0 = time.perf_counter()
+    chunk, errors = parse_checked(code)
+    ms = (time.perf_counter() - t0) * 1000
+    api_errors, warnings = [], []
+    if chunk is not None:
+        if is_encounter:
+            errors = validate_encounter(code, assets, chunk)  # API_LINT_STRICT=1 时已含 API 调用检查
+        if not (is_encounter and config.API_LINT_STRICT):
+            api_errors = lint_api_calls(code, chunk)
+            if config.API_LINT_STRICT:
+                errors = api_errors
+            else:
+                warnings = api_errors
+    with _stats_lock:
+        _validation_stats["syntax_checks"] += 1
+        _validation_stats["syntax_ms_total"] += ms
+        _validation_stats["syntax_ms_max"] = max(_validation_stats["syntax_ms_max"], ms)
+        _validation_stats["syntax_failures"] += chunk is None
+        _validation_stats["api_call_failures"] += bool(api_errors)
+        if is_encounter:
+            _validation_stats["validations"] += 1
+            _validation_stats["validation_failures"] += bool(errors)
+    return errors, warnings
+
+
+def _autofix_step(code: str, errors: list[str], assets: dict, done_key: str) -> tuple[str, list[str], list[str]]:
+    """本地修复机械性违规并重新校验；错误变少才采用。返回 (code, errors, 已应用的修复类别)。"""
+    fixed, applied = autofix_encounter(code, assets, done_key)
+    fixed_errors = validate_encounter(fixed, assets) if applied else errors
+    accepted = bool(applied) and len(fixed_errors) < len(errors)
+    with _stats_lock:
+        _validation_stats["autofix_runs"] += 1
+        if accepted:
+            _validation_stats["autofix_applied"] += 1
+            _validation_stats["retries_avoided"] += not fixed_errors
+            for name in applied:
+                _validation_stats[f"autofix_{name}"] += 1
+    if not accepted:
+        return code, errors, []
+    return fixed, fixed_errors, applied
+
+
+async def _validate_attempt(code: str, assets: dict, is_encounter: bool, done_key: str,
+                            on_event: EventCallback | None, info: dict) -> tuple[str, list[str]]:
+    """语法检查 + 规则校验；Encounter 未通过时先尝试本地修复，仍有错误才交给 LLM 修正。"""
+    errors, warnings = _check_step(code, assets, is_encounter)
+    if not is_encounter and not errors and not warnings:
+        return code, errors
+    await _emit(on_event, "validation", {**info, "errors": errors, "warnings": warnings})
+    if errors and is_encounter and config.AUTOFIX_ENABLED:
+        code, errors, applied = _autofix_step(code, errors, assets, done_key)
+        if applied:
+            await _emit(on_event, "autofix", {**info, "fixes": applied, "errors": errors, "code": code})
+    return code, errors
+
 
 def _inject_encounter_location(code: str, user_loc: dict) -> str:
     """强制将用户在地图上指定的奇遇点坐标注入到生成代码中，确保故事发生在指定位置。"""
@@ -85,60 +193,244 @@ def run_full_pipeline(
     story_mode: str = "expand",
     init_map_code: str | None = None,
     previous_init_event: str | None = None,
+    use_cache: bool = True,
+    speculative: int | None = None,
+) -> dict:
+    """
+    同步封装：在共享的后台事件循环（llm_clients.run_sync）中执行 run_full_pipeline_async，供线程 / 脚本调用，
+    多次调用复用同一组 AsyncOpenAI 客户端。已处于事件循环中（FastAPI async 端点等）请直接 await run_full_pipeline_async。
+    """
+    return run_sync(run_full_pipeline_async(
+        story_input, api_key,
+        story_model=story_model,
+        planning_model=planning_model,
+        coding_model=coding_model,
+        assets=assets,
+        encounter_locations=encounter_locations,
+        story_mode=story_mode,
+        init_map_code=init_map_code,
+        previous_init_event=previous_init_event,
+        use_cache=use_cache,
+        speculative=speculative,
+    ))
+
+
+async def run_full_pipeline_async(
+    story_input: str,
+    api_key: str,
+    story_model: str = "gpt-4.1",
+    planning_model: str = "gpt-4.1",
+    coding_model: str = "gpt-5.1-codex-max",
+    assets: dict | None = None,
+    encounter_locations: list[dict] | None = None,
+    story_mode: str = "expand",
+    init_map_code: str | None = None,
+    previous_init_event: str | None = None,
+    on_event: EventCallback | None = None,
+    use_cache: bool = True,
+    seed: dict | None = None,
+    parent_run_id: str | None = None,
+    speculative: int | None = None,
 ) -> dict:
     """
     Execute: Story Expert -> Planner -> Coding Agent (encounters only).
     输出 stages 数组：InitMap, InitEvent, StartGame。
+    全程使用 AsyncOpenAI，等待 LLM 时不占用线程。
+    on_event 可选，按发生顺序接收事件：run、stage、expanded_story_delta、expanded_story、plan、
+    coding_attempt、validation。
+    use_cache=False 时绕过 LLM 响应缓存，强制重新生成。
+    各阶段产物按 run_id 保存（pipeline_runs.py）；seed 中已有的阶段（expanded_story / plan_output / steps）
+    直接复用，不再调用对应 Agent，见 rerun_pipeline_async。
+    speculative: 推测式并发候选数 K（None 时取 config.SPECULATIVE_CANDIDATES，<=1 关闭）。
     """
-    client = OpenAI(api_key=api_key)
     assets = assets or {"npcs": [], "enemies": [], "props": [], "items": []}
-    # 若用户提供了编辑后的 InitMap，从中提取 NPC 布置供编码参考
-    if init_map_code and init_map_code.strip():
-        npc_match = re.search(r"-- =+ 放置路人NPC[\s\S]*?(?=\n\n|\Z)", init_map_code)
-        npc_located = npc_match.group(0).strip() if npc_match else init_map_code[:3000]
-    else:
-        npc_located = get_npc_located_code()
+    seed = seed or {}
+    # run store 为同步 SQLite，读写放到线程中，不阻塞事件循环
+    store = get_run_store()
+    run_id = await asyncio.to_thread(store.create, {
+        "story_input": story_input,
+        "story_model": story_model,
+        "planning_model": planning_model,
+        "coding_model": coding_model,
+        "assets": assets,
+        "encounter_locations": encounter_locations,
+        "story_mode": story_mode,
+        "init_map_code": init_map_code,
+        "previous_init_event": previous_init_event,
+    }, parent_run_id)
+    await _emit(on_event, "run", {"run_id": run_id, "parent_run_id": parent_run_id, "reused": sorted(seed)})
+    npc_located = _npc_located_context(init_map_code)
 
     previous_npc_info = []
     if story_mode == "continue" and previous_init_event and previous_init_event.strip():
         previous_npc_info = _extract_previous_npc_info(previous_init_event)
 
-    expanded_story = run_story_expert(client, story_input, story_model, story_mode=story_mode,
-                                     previous_npc_info=previous_npc_info)
-    plan_output = run_planner(client, expanded_story, planning_model, assets=assets)
-    steps = extract_steps_from_planner_output(plan_output)
-    steps = [s for s in steps if str(s.get("type", "")).lower() == "encounter"]
-    # 【强制单奇遇】仅保留第 1 个 step，禁止多步
-    if steps:
-        steps = [steps[0]]
-    if not steps:
-        steps = [{"id": 1, "name": "SpawnEncounter_main", "type": "encounter", "description": "Main encounter"}]
-    steps[0]["name"] = "SpawnEncounter_main"
+    async def _on_story_delta(delta: str) -> None:
+        await _emit(on_event, "expanded_story_delta", {"delta": delta})
+
+    client = get_async_client(api_key)
+    if seed.get("expanded_story"):
+        expanded_story = seed["expanded_story"]
+    else:
+        await _emit(on_event, "stage", {"stage": "story_expert", "model": story_model})
+        expanded_story = await run_story_expert_async(client, story_input, story_model, story_mode=story_mode,
+                                                      previous_npc_info=previous_npc_info,
+                                                      on_delta=_on_story_delta if on_event else None,
+                                                      use_cache=use_cache)
+    await asyncio.to_thread(store.save_stage, run_id, "expanded_story", expanded_story)
+    await _emit(on_event, "expanded_story", {"expanded_story": expanded_story})
+
+    if seed.get("plan_output"):
+        plan_output = seed["plan_output"]
+    else:
+        await _emit(on_event, "stage", {"stage": "planner", "model": planning_model})
+        plan_output = await run_planner_async(client, expanded_story, planning_model, assets=assets,
+                                              use_cache=use_cache)
+    await asyncio.to_thread(store.save_stage, run_id, "plan_output", plan_output)
+    steps = seed.get("steps") or _select_steps(plan_output)
+    await asyncio.to_thread(store.save_stage, run_id, "steps", steps)
+    await _emit(on_event, "plan", {"plan_output": plan_output, "steps": steps})
+
+    await _emit(on_event, "stage", {"stage": "coding", "model": coding_model})
 
     previous_code = ""
     init_event_parts = []
 
     for i, step in enumerate(steps):
-        code = _generate_step_with_validation(
+        code = await _generate_step_with_validation_async(
             client, step, expanded_story, previous_code, coding_model,
             assets=assets, all_steps=steps, step_index=i,
             npc_located_context=npc_located,
             encounter_locations=encounter_locations,
             previous_npc_info=previous_npc_info,
+            on_event=on_event,
+            use_cache=use_cache,
+            speculative=config.SPECULATIVE_CANDIDATES if speculative is None else speculative,
         )
         code = _clean_code_output(code)
-        user_loc = None
-        if encounter_locations and i < len(encounter_locations):
-            loc = encounter_locations[i]
-            if isinstance(loc, dict):
-                x = loc.get("x") or loc.get("X")
-                y = loc.get("y") or loc.get("Y")
-                if x is not None and y is not None:
-                    user_loc = {"X": int(x), "Y": int(y), "Z": int(loc.get("z") or loc.get("Z") or GROUND_Z)}
-        code = _inject_encounter_location(code, user_loc)
+        code = _inject_encounter_location(code, _user_location(encounter_locations, i))
         init_event_parts.append(code)
         previous_code += "\n\n" + code
+    await asyncio.to_thread(store.save_stage, run_id, "step_codes", init_event_parts)
 
+    result = _assemble_result(expanded_story, plan_output, steps, init_event_parts, init_map_code)
+    result["run_id"] = run_id
+    return result
+
+
+async def rerun_pipeline_async(
+    run_id: str,
+    api_key: str,
+    from_stage: str | None = None,
+    overrides: dict | None = None,
+    on_event: EventCallback | None = None,
+    use_cache: bool = True,
+    **params,
+) -> dict:
+    """
+    从已保存 run 的指定阶段重跑（生成新的 run_id，原 run 保持不变）。
+    from_stage: expanded_story | plan_output | steps | step_codes；之前的阶段复用已保存结果。
+    overrides: 编辑后的 expanded_story / plan_output / steps，替代保存的结果；未指定 from_stage 时
+    从最后一个被覆盖阶段的下一阶段开始。
+    params: 覆盖原 run 的参数（如 coding_model、encounter_locations）。
+    """
+    record = await asyncio.to_thread(get_run_store().get, run_id)
+    if record is None:
+        raise KeyError(f"Unknown run_id: {run_id}")
+    from_stage = from_stage or infer_from_stage(overrides)
+    seed = seed_for_rerun(record, from_stage, overrides)
+    run_params = {**record["params"], **{k: v for k, v in params.items() if v is not None}}
+    return await run_full_pipeline_async(
+        api_key=api_key,
+        on_event=on_event,
+        use_cache=use_cache,
+        seed=seed,
+        parent_run_id=run_id,
+        **run_params,
+    )
+
+
+async def iter_batch_async(
+    items: list[dict | str],
+    concurrency: int | None = None,
+    item_timeout: float | None = None,
+):
+    """
+    批量执行 run_full_pipeline_async，并发数受 concurrency 限制，每条受 item_timeout（秒）限制。
+    items 为 run_full_pipeline_async 参数字典；若为字符串则视为该条的参数错误。
+    按完成顺序 yield {"index", "ok", "result" | "error", "elapsed"}，index 为输入下标。
+    """
+    concurrency = max(1, min(concurrency or config.BATCH_CONCURRENCY, config.BATCH_MAX_CONCURRENCY))
+    item_timeout = item_timeout or config.BATCH_ITEM_TIMEOUT
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(index: int, kwargs: dict | str) -> dict:
+        if isinstance(kwargs, str):
+            return {"index": index, "ok": False, "error": kwargs, "elapsed": 0.0}
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(run_full_pipeline_async(**kwargs), timeout=item_timeout)
+                return {"index": index, "ok": True, "result": result,
+                        "elapsed": round(time.monotonic() - started, 3)}
+            except asyncio.TimeoutError:
+                error = f"Timed out after {item_timeout:g}s"
+            except Exception as e:
+                error = str(e)
+            return {"index": index, "ok": False, "error": error, "elapsed": round(time.monotonic() - started, 3)}
+
+    tasks = [asyncio.create_task(run_one(i, kwargs)) for i, kwargs in enumerate(items)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        # 调用方提前结束（如客户端断开）时取消未完成的条目
+        for t in tasks:
+            t.cancel()
+
+
+def _npc_located_context(init_map_code: str | None) -> str:
+    """若用户提供了编辑后的 InitMap，从中提取 NPC 布置供编码参考（长度由 prompt 预算裁剪）；否则用 step3。"""
+    if init_map_code and init_map_code.strip():
+        npc_match = re.search(r"-- =+ 放置路人NPC[\s\S]*?(?=\n\n|\Z)", init_map_code)
+        return npc_match.group(0).strip() if npc_match else init_map_code
+    return get_npc_located_code()
+
+
+def _select_steps(plan_output: str) -> list:
+    """从规划输出中取 encounter 步骤。【强制单奇遇】仅保留第 1 个 step，禁止多步。"""
+    steps = extract_steps_from_planner_output(plan_output)
+    steps = [s for s in steps if str(s.get("type", "")).lower() == "encounter"]
+    if steps:
+        steps = [steps[0]]
+    if not steps:
+        steps = [{"id": 1, "name": "SpawnEncounter_main", "type": "encounter", "description": "Main encounter"}]
+    steps[0]["name"] = "SpawnEncounter_main"
+    return steps
+
+
+def _user_location(encounter_locations: list[dict] | None, index: int) -> dict | None:
+    """用户在地图上为第 index 步指定的奇遇点，返回 {X, Y, Z} 或 None。"""
+    if not encounter_locations or index >= len(encounter_locations):
+        return None
+    loc = encounter_locations[index]
+    if not isinstance(loc, dict):
+        return None
+    x = loc.get("x") or loc.get("X")
+    y = loc.get("y") or loc.get("Y")
+    if x is None or y is None:
+        return None
+    return {"X": int(x), "Y": int(y), "Z": int(loc.get("z") or loc.get("Z") or GROUND_Z)}
+
+
+def _assemble_result(
+    expanded_story: str,
+    plan_output: str,
+    steps: list,
+    init_event_parts: list[str],
+    init_map_code: str | None = None,
+) -> dict:
+    """拼装 stages（InitMap -> InitEvent -> StartGame）与返回结果。"""
     init_map_final = (init_map_code and init_map_code.strip()) or get_init_map_code()
     init_event_code = "\n\n".join(init_event_parts) if init_event_parts else ""
     # 单奇遇时添加正确格式注释
@@ -150,11 +442,11 @@ def run_full_pipeline(
         )
     start_game_code = get_start_game_code()
 
-    stages = [
+    stages = tag_stages([
         {"Type": "InitMap", "Code": init_map_final},
         {"Type": "InitEvent", "Code": init_event_code},
         {"Type": "StartGame", "Code": start_game_code},
-    ]
+    ])
     full_script = "\n\n".join(s["Code"] for s in stages if s["Code"])
 
     generated_files = {}
@@ -174,41 +466,102 @@ def run_full_pipeline(
     }
 
 
-def _generate_step_with_validation(
+async def _generate_step_with_validation_async(
     client, step, expanded_story, previous_code, coding_model, assets: dict,
     all_steps: list | None = None,
     step_index: int = 0,
     npc_located_context: str = "",
     encounter_locations: list[dict] | None = None,
     previous_npc_info: list[dict] | None = None,
+    on_event: EventCallback | None = None,
+    use_cache: bool = True,
+    speculative: int = 0,
 ) -> str:
-    """Generate code for one step, with validation feedback loop for Encounter."""
-    def _call_agent(errors=None):
-        return run_coding_agent(
+    """
+    Generate code for one step, with validation feedback loop
+    (本地语法检查对所有步骤生效，Encounter 另做规则校验；机械性违规先本地修复，修不了的才交给 LLM).
+    speculative > 1 时为推测模式：并发发起 K 个候选，首个零错误者胜出并取消其余；
+    均未通过则以错误最少的候选进入修正循环。总调用次数不超过 SPECULATIVE_MAX_CALLS。
+    """
+    step_name = step.get("name", f"step_{step_index + 1}")
+
+    async def _call_agent(errors=None, variant=0):
+        return await run_coding_agent_async(
             client, step, expanded_story, previous_code, coding_model,
             validation_errors=errors, assets=assets, all_steps=all_steps or [],
             step_index=step_index, npc_located_context=npc_located_context,
             encounter_locations=encounter_locations,
             previous_npc_info=previous_npc_info or [],
+            use_cache=use_cache,
+            variant=variant,
         )
 
-    code = _call_agent(errors=None)
-    code = _clean_code_output(code)
-
-    if step.get("type") != "encounter":
-        return code
+    is_encounter = step.get("type") == "encounter"
+    done_key = f"enc{step_index + 1:02d}_done"
+    max_calls = max(1, config.SPECULATIVE_MAX_CALLS)
+    candidates = min(speculative, max_calls) if is_encounter else 0
+    if candidates > 1:
+        code, errors = await _race_candidates(_call_agent, candidates, assets, step_name, on_event, done_key)
+        max_retries = min(MAX_FIX_RETRIES, max_calls - candidates)
+    else:
+        code = await _call_agent(errors=None)
+        code = _clean_code_output(code)
+        await _emit(on_event, "coding_attempt", {"step": step_name, "attempt": 0, "code": code})
+        code, errors = await _validate_attempt(
+            code, assets, is_encounter, done_key, on_event, {"step": step_name, "attempt": 0})
+        max_retries = MAX_FIX_RETRIES
 
-    errors = validate_encounter(code, assets)
     retries = 0
-    while errors and retries < MAX_FIX_RETRIES:
-        code = _call_agent(errors=errors)
+    while errors and retries < max_retries:
+        code = await _call_agent(errors=errors)
         code = _clean_code_output(code)
-        errors = validate_encounter(code, assets)
         retries += 1
+        await _emit(on_event, "coding_attempt", {"step": step_name, "attempt": retries, "code": code})
+        code, errors = await _validate_attempt(
+            code, assets, is_encounter, done_key, on_event, {"step": step_name, "attempt": retries})
 
     return code
 
 
+async def _race_candidates(call_agent, k: int, assets: dict, step_name: str,
+                           on_event: EventCallback | None = None, done_key: str = "enc01_done") -> tuple[str, list]:
+    """
+    并发生成 k 个候选，按到达顺序校验；返回首个零错误候选，否则返回错误最少的 (code, errors)。
+    事件中 candidate 为产生该代码的变体序号（call_agent 的 variant），arrival 为到达名次。
+    """
+    async def run_variant(i: int):
+        try:
+            return i, await call_agent(variant=i), None
+        except Exception as e:
+            return i, None, e
+
+    tasks = [asyncio.create_task(run_variant(i)) for i in range(k)]
+    best = None
+    last_exc = None
+    try:
+        for arrival, fut in enumerate(asyncio.as_completed(tasks)):
+            variant, text, exc = await fut
+            if exc is not None:
+                last_exc = exc
+                continue
+            code = _clean_code_output(text)
+            tag = {"step": step_name, "attempt": 0, "candidate": variant, "arrival": arrival}
+            await _emit(on_event, "coding_attempt", {**tag, "code": code})
+            code, errors = await _validate_attempt(code, assets, True, done_key, on_event, tag)
+            if not errors:
+                return code, []
+            if best is None or len(errors) < len(best[1]):
+                best = (code, errors)
+    finally:
+        # 已有胜出者（或出错）时取消仍在进行的候选，不再为其付费
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+    if best is None:
+        raise last_exc or RuntimeError("No coding candidate returned")
+    return best
+
+
 def _clean_code_output(text: str) -> str:
     """Remove markdown code blocks if present."""
     text = text.strip()
@@ -0,0 +1,151 @@
+"""
+Pipeline run store: 按 run_id 持久化每次生成的各阶段产物（SQLite）。
+阶段：expanded_story → plan_output → steps → step_codes。
+重跑时可从任一阶段开始，之前阶段直接复用（或用编辑后的内容覆盖），只为下游 LLM 调用付费。
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import config
+
+# 阶段顺序：从某阶段重跑时，之前的阶段复用已保存结果
+STAGES = ("expanded_story", "plan_output", "steps", "step_codes")
+
+
+class PipelineRunStore:
+    """SQLite 存储（线程安全）。api_key 不落盘。"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pipeline_runs ("
+                "run_id TEXT PRIMARY KEY, parent_run_id TEXT, created REAL NOT NULL, updated REAL NOT NULL, "
+                "params TEXT NOT NULL, outputs TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_pipeline_runs_created ON pipeline_runs(created)")
+            self._db.commit()
+        return self._db
+
+    def create(self, params: dict, parent_run_id: str | None = None) -> str:
+        run_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute(
+                "INSERT INTO pipeline_runs (run_id, parent_run_id, created, updated, params, outputs) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, parent_run_id, now, now, json.dumps(params, ensure_ascii=False), "{}"),
+            )
+            self._prune(db)
+            db.commit()
+        return run_id
+
+    def save_stage(self, run_id: str, stage: str, value) -> None:
+        with self._lock:
+            db = self._conn()
+            row = db.execute("SELECT outputs FROM pipeline_runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                return
+            outputs = json.loads(row[0])
+            outputs[stage] = value
+            db.execute(
+                "UPDATE pipeline_runs SET outputs = ?, updated = ? WHERE run_id = ?",
+                (json.dumps(outputs, ensure_ascii=False), time.time(), run_id),
+            )
+            db.commit()
+
+    def get(self, run_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT run_id, parent_run_id, created, updated, params, outputs FROM pipeline_runs WHERE run_id = ?",
+                (run_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "run_id": row[0],
+            "parent_run_id": row[1],
+            "created": row[2],
+            "updated": row[3],
+            "params": json.loads(row[4]),
+            "outputs": json.loads(row[5]),
+        }
+
+    def list(self, limit: int = 20) -> list[dict]:
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT run_id, parent_run_id, created, params, outputs FROM pipeline_runs "
+                "ORDER BY created DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        result = []
+        for run_id, parent, created, params, outputs in rows:
+            result.append({
+                "run_id": run_id,
+                "parent_run_id": parent,
+                "created": created,
+                "story_input": json.loads(params).get("story_input", "")[:80],
+                "stages": [s for s in STAGES if s in json.loads(outputs)],
+            })
+        return result
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        """超出 PIPELINE_RUNS_MAX 时删除最旧的记录。"""
+        (count,) = db.execute("SELECT COUNT(*) FROM pipeline_runs").fetchone()
+        if count > config.PIPELINE_RUNS_MAX:
+            db.execute(
+                "DELETE FROM pipeline_runs WHERE run_id IN "
+                "(SELECT run_id FROM pipeline_runs ORDER BY created LIMIT ?)",
+                (count - config.PIPELINE_RUNS_MAX,),
+            )
+
+
+def seed_for_rerun(record: dict, from_stage: str, overrides: dict | None = None) -> dict:
+    """
+    计算重跑的种子：from_stage 之前的阶段取已保存结果，再叠加 overrides（编辑后的 expanded_story / plan_output / steps）。
+    """
+    if from_stage not in STAGES:
+        raise ValueError(f"Unknown stage: {from_stage}，可选: {', '.join(STAGES)}")
+    outputs = record.get("outputs") or {}
+    seed = {}
+    for stage in STAGES[:STAGES.index(from_stage)]:
+        if stage not in outputs:
+            raise ValueError(f"run {record.get('run_id')} 缺少阶段 {stage} 的结果，无法从 {from_stage} 重跑")
+        seed[stage] = outputs[stage]
+    for stage, value in (overrides or {}).items():
+        if stage in STAGES and stage != "step_codes" and value:
+            seed[stage] = value
+    return seed
+
+
+def infer_from_stage(overrides: dict | None) -> str:
+    """未指定 from_stage 时：从最后一个被覆盖阶段的下一阶段开始；无覆盖则只重跑代码生成。"""
+    last = -1
+    for i, stage in enumerate(STAGES):
+        if (overrides or {}).get(stage):
+            last = i
+    return STAGES[min(last + 1, len(STAGES) - 1)] if last >= 0 else "step_codes"
+
+
+_store: PipelineRunStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_run_store() -> PipelineRunStore:
+    """进程级共享实例。"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PipelineRunStore(config.PIPELINE_RUNS_PATH)
+        return _store
@@ -0,0 +1,187 @@
+"""
+Prompt 预算：按模型的输入 token 预算组装 prompt，代替 agents.py 中按字符截断（[:2500] / [:2000] / [:3000] ...）。
+
+- count_tokens：离线近似分词，中日韩按字计、英文 / 标识符按子词计、数字按 3 位一组、标点单独计；
+- PromptBudget：固定部分（system prompt、模板）只计数；可裁剪的段落按优先级分配剩余预算，
+  每段另有上限（config.PROMPT_SECTION_TOKENS）；超出时按段落 / 行 / 列表项裁剪，被省略处留 "…（省略约 N tokens）…"；
+- 每次组装在 stderr 打印各段 token 数。
+"""
+import re
+import sys
+from typing import Callable
+
+import config
+
+# 中日韩字符 | 英文单词 | 数字（3 位一组）| 换行 | 连续空白 | 其它单个字符（标点）
+_TOKEN = re.compile(r"[㐀-鿿豈-﫿぀-ヿ가-힯]|[A-Za-z]+|\d{1,3}|\n+|[ \t]{2,}|[^\sA-Za-z\d]")
+_SEPARATORS = {"block": "\n\n", "line": "\n", "item": ", "}
+_FINER = {"block": "line", "line": None, "item": None}
+_MARKER = "…（省略约 {n} tokens）…"
+
+
+def count_tokens(text: str) -> int:
+    """近似 token 数（不依赖 tiktoken）：中日韩字符 1 / 字，英文单词 1 + (长度 - 1) // 6，数字 3 位一组，标点 / 换行 1。"""
+    if not text:
+        return 0
+    n = 0
+    for tok in _TOKEN.findall(text):
+        c = tok[0]
+        if "A" <= c <= "z" and c.isalpha():
+            n += 1 + (len(tok) - 1) // 6
+        else:
+            n += 1
+    return n
+
+
+def model_budget(model: str) -> int:
+    """模型的输入 token 预算：PROMPT_BUDGET 环境变量 > PROMPT_BUDGETS[model] > 默认值。"""
+    if config.PROMPT_BUDGET_OVERRIDE:
+        return config.PROMPT_BUDGET_OVERRIDE
+    return config.PROMPT_BUDGETS.get(model, config.PROMPT_BUDGET_DEFAULT)
+
+
+def _split(text: str, unit: str) -> list[str]:
+    if unit == "block":
+        return [b.strip("\n") for b in re.split(r"\n\s*\n", text) if b.strip()]
+    if unit == "item":
+        return [i.strip() for i in text.split(",") if i.strip()]
+    return text.split("\n")
+
+
+def _take(units: list[str], budget: int, sep_cost: int, finer: str | None, from_tail: bool) -> tuple[list[str], int]:
+    """从头（或尾）取完整单元直到预算用完；放不下的单元在更细的粒度上截取一部分。返回 (单元, 已用 tokens)。"""
+    out, used = [], 0
+    for u in (reversed(units) if from_tail else units):
+        n = count_tokens(u) + (sep_cost if out else 0)
+        if used + n > budget:
+            rest = budget - used - (sep_cost if out else 0)
+            if finer and rest > 20:
+                part = _take(_split(u, finer), rest, count_tokens(_SEPARATORS[finer]), _FINER[finer], from_tail)[0]
+                part = _SEPARATORS[finer].join(part)
+                if part:
+                    out.append(part)
+                    used += count_tokens(part) + (sep_cost if len(out) > 1 else 0)
+            break
+        out.append(u)
+        used += n
+    return (out[::-1] if from_tail else out), used
+
+
+def _relevance(units: list[str], query: str) -> list[float]:
+    """与 query 共有的检索词项占比（词项同 doc_index）。"""
+    from doc_index import terms
+    q = set(terms(query))
+    scores = []
+    for u in units:
+        t = set(terms(u))
+        scores.append(len(q & t) / (len(t) ** 0.5) if t else 0.0)
+    return scores
+
+
+def _render(units: list[str], keep: list[int], sep: str) -> str:
+    """按原顺序输出保留的单元，连续被省略的单元替换为一个省略标记。"""
+    out, gap = [], 0
+    for i, u in enumerate(units):
+        if i in keep:
+            if gap:
+                out.append(_MARKER.format(n=gap))
+                gap = 0
+            out.append(u)
+        else:
+            gap += count_tokens(u)
+    if gap:
+        out.append(_MARKER.format(n=gap))
+    return sep.join(out)
+
+
+def trim(text: str, max_tokens: int, mode: str = "head_tail", unit: str = "block", query: str = "") -> str:
+    """
+    把 text 裁剪到约 max_tokens：
+    - head / tail：保留开头 / 结尾；
+    - head_tail：开头约 60%，结尾其余；
+    - relevant：保留第一个单元，其余按与 query 的相关度取，输出保持原顺序。
+    unit 为裁剪粒度：block（空行分隔的段落）、line、item（逗号分隔的列表项）；单个段落放不下时退到行。
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    sep = _SEPARATORS[unit]
+    sep_cost = count_tokens(sep)
+    marker_cost = 0 if unit == "item" else count_tokens(_MARKER.format(n=1000)) + sep_cost
+    units = _split(text, unit)
+    finer = _FINER[unit]
+    if unit == "item":
+        kept, _ = _take(units, max_tokens - 1, sep_cost, None, mode == "tail")
+        return sep.join(kept) + ("…" if len(kept) < len(units) else "")
+    budget = max_tokens - marker_cost
+    if mode == "head":
+        kept, _ = _take(units, budget, sep_cost, finer, False)
+        return sep.join(kept + [_MARKER.format(n=count_tokens(text) - sum(map(count_tokens, kept)))])
+    if mode == "tail":
+        kept, _ = _take(units, budget, sep_cost, finer, True)
+        return sep.join([_MARKER.format(n=count_tokens(text) - sum(map(count_tokens, kept)))] + kept)
+    if mode == "head_tail":
+        head, used = _take(units, int(budget * 0.6), sep_cost, finer, False)
+        tail, _ = _take(units[len(head):], budget - used, sep_cost, finer, True)
+        omitted = count_tokens(text) - sum(map(count_tokens, head + tail))
+        return sep.join(head + [_MARKER.format(n=max(omitted, 0))] + tail)
+    if mode == "relevant":
+        scores = _relevance(units, query)
+        order = [0] + sorted(range(1, len(units)), key=lambda i: (-scores[i], i))
+        keep, used = [], 0
+        for i in order:
+            n = count_tokens(units[i]) + sep_cost + marker_cost
+            if used + n <= max_tokens:
+                keep.append(i)
+                used += n
+        if not keep:
+            return trim(text, max_tokens, "head", unit)
+        return _render(units, keep, sep)
+    raise ValueError(f"unknown trim mode: {mode}")
+
+
+class PromptBudget:
+    """
+    一次 prompt 组装：fixed() 登记不可裁剪的部分，add() 登记可裁剪的段落，build() 按优先级分配预算并返回 {段名: 文本}。
+    add 的 text 可以是 callable(max_tokens) -> str（如按预算检索文档），在分配到预算后再生成。
+    """
+
+    def __init__(self, name: str, model: str, budget: int | None = None):
+        self.name = name
+        self.model = model
+        self.budget = budget or model_budget(model)
+        self.fixed_tokens: dict[str, int] = {}
+        self.sections: list[dict] = []
+
+    def fixed(self, name: str, text: str) -> str:
+        self.fixed_tokens[name] = self.fixed_tokens.get(name, 0) + count_tokens(text)
+        return text
+
+    def add(self, name: str, text: str | Callable[[int], str], priority: int, max_tokens: int | None = None,
+            mode: str = "head_tail", unit: str = "block", query: str = "", min_tokens: int = 0) -> None:
+        """priority 越小越先分配；max_tokens 为该段上限（None 为不限）；min_tokens 为预算不足时仍保留的下限。"""
+        self.sections.append({
+            "name": name, "text": text, "priority": priority, "max_tokens": max_tokens,
+            "mode": mode, "unit": unit, "query": query, "min_tokens": min_tokens,
+        })
+
+    def build(self) -> dict[str, str]:
+        remaining = self.budget - sum(self.fixed_tokens.values())
+        out: dict[str, str] = {}
+        report: list[str] = [f"{k} {v}" for k, v in self.fixed_tokens.items()]
+        for s in sorted(self.sections, key=lambda s: s["priority"]):
+            limit = max(remaining, 0) if s["max_tokens"] is None else min(s["max_tokens"], max(remaining, 0))
+            limit = max(limit, s["min_tokens"])
+            text = s["text"](limit) if callable(s["text"]) else (s["text"] or "")
+            full = count_tokens(text)
+            if full > limit:
+                text = trim(text, limit, s["mode"], s["unit"], s["query"])
+            used = count_tokens(text)
+            remaining -= used
+            out[s["name"]] = text
+            report.append(f"{s['name']} {used}" + (f"/{full}" if used < full else ""))
+        total = self.budget - remaining
+        print(f"[Prompt] {self.name} ({self.model}): {total}/{self.budget} tokens | " + " | ".join(report),
+              file=sys.stderr)
+        return out
@@ -31,6 +31,7 @@ CODING_BASE = """你是一位精通LUA和CineText/Narrative API的资深程序
 CODING_FIX = """
 === 上一版代码未通过校验，请修正以下问题后重新输出 ===
 {validation_errors}
+（"line N:M" 为上一版代码中的行号:列号）
 
 请输出修正后的完整代码。
 """
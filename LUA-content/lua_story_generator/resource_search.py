@@ -0,0 +1,125 @@
+"""
+Resource search: 素材库搜索索引（/api/resources/search），每个 ResourceIndex 构建一次，素材库重载后自动重建。
+
+- prefix：每种类型一个按小写键排序的数组（id、物品显示名、道具描述），bisect 定位匹配区间；
+- substring：1~3 字符 n-gram 倒排表，取查询中最短的倒排表逐条校验。
+结果按类型、id 排序，支持类型过滤与 offset/limit 分页。
+"""
+import bisect
+import threading
+from array import array
+from typing import Any
+
+from datatable_loader import ResourceIndex, get_resource_index
+
+TYPES = ("npcs", "enemies", "props", "items", "animations")
+PREFIX = "prefix"
+SUBSTRING = "substring"
+MODES = (PREFIX, SUBSTRING)
+
+_GRAM = 3
+_MAX_CHAR = "\U0010ffff"
+
+
+def _grams(text: str) -> set[str]:
+    out = set()
+    for field in text.split("\n"):
+        for n in range(1, _GRAM + 1):
+            for i in range(len(field) - n + 1):
+                out.add(field[i:i + n])
+    return out
+
+
+class SearchIndex:
+    """entries 按 (类型, id) 顺序编号；前缀数组与倒排表都只存编号。"""
+
+    def __init__(self, index: ResourceIndex):
+        self.index = index
+        res = index.resources
+        sources = {
+            "npcs": [{"id": x} for x in res["npcs"]],
+            "enemies": [{"id": x} for x in res["enemies"]],
+            "props": res["props_detail"],
+            "items": res["items_detail"],
+            "animations": [{"id": x} for x in res["animations"]],
+        }
+        self.entries: list[dict[str, Any]] = []
+        self.types: list[str] = []
+        self.texts: list[str] = []
+        self.ranges: dict[str, tuple[int, int]] = {}
+        self._keys: dict[str, list[str]] = {}
+        self._eids: dict[str, array] = {}
+        grams: dict[str, array] = {}
+        for t in TYPES:
+            start = len(self.entries)
+            pairs = []
+            for e in sources[t]:
+                eid = len(self.entries)
+                self.entries.append({"type": t, **e})
+                self.types.append(t)
+                fields = list(dict.fromkeys(
+                    f.lower() for f in (e["id"], e.get("name", ""), e.get("description", "")) if f))
+                pairs.extend((f, eid) for f in fields)
+                text = "\n".join(fields)
+                self.texts.append(text)
+                for g in _grams(text):
+                    grams.setdefault(g, array("i")).append(eid)
+            pairs.sort()
+            self._keys[t] = [k for k, _ in pairs]
+            self._eids[t] = array("i", (eid for _, eid in pairs))
+            self.ranges[t] = (start, len(self.entries))
+        self._grams = grams
+
+    def search(self, q: str, types=None, mode: str = PREFIX, offset: int = 0, limit: int = 50) -> tuple[int, list[dict]]:
+        """返回 (匹配总数, 当前页结果)。"""
+        q = (q or "").strip().lower()
+        types = [t for t in TYPES if t in types] if types else list(TYPES)
+        if not q:
+            matched = [eid for t in types for eid in range(*self.ranges[t])]
+        elif mode == SUBSTRING:
+            matched = self._substring(q, types)
+        else:
+            matched = []
+            for t in types:
+                keys = self._keys[t]
+                lo = bisect.bisect_left(keys, q)
+                hi = bisect.bisect_left(keys, q + _MAX_CHAR, lo)
+                if hi - lo == 1:
+                    matched.append(self._eids[t][lo])
+                elif hi > lo:
+                    matched.extend(sorted(set(self._eids[t][lo:hi])))
+        return len(matched), [self.entries[eid] for eid in matched[offset:offset + limit]]
+
+    def _substring(self, q: str, types: list[str]) -> list[int]:
+        n = min(len(q), _GRAM)
+        postings = []
+        for i in range(len(q) - n + 1):
+            p = self._grams.get(q[i:i + n])
+            if p is None:
+                return []
+            postings.append(p)
+        candidates = min(postings, key=len)
+        wanted = set(types)
+        if len(q) <= _GRAM:
+            # 查询本身就是一个 n-gram，倒排表即精确结果
+            if len(wanted) == len(TYPES):
+                return list(candidates)
+            return [eid for eid in candidates if self.types[eid] in wanted]
+        return [eid for eid in candidates if self.types[eid] in wanted and q in self.texts[eid]]
+
+
+_search: SearchIndex | None = None
+_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    """当前素材库对应的搜索索引（素材库索引替换后首次调用时重建）。"""
+    global _search
+    index = get_resource_index()
+    search = _search
+    if search is not None and search.index is index:
+        return search
+    with _lock:
+        if _search is None or _search.index is not index:
+            _search = SearchIndex(index)
+        return _search
@@ -0,0 +1,56 @@
+"""
+Stage content hashes: 每个 stage 附带 Code 的内容哈希（Hash）。
+UE 声明已缓存的哈希后，服务端对未变化的 stage 只发送引用 {"Type", "Hash", "Ref": true}，
+新的 stage 才发送完整 Code。近期发出过的 stage 正文保留在内存中，客户端缓存丢失时可按哈希取回。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import config
+
+_lock = threading.Lock()
+_bodies: "OrderedDict[str, str]" = OrderedDict()
+
+
+def stage_hash(code: str) -> str:
+    """Code 的内容哈希（sha256 前 16 位十六进制）。"""
+    return hashlib.sha256((code or "").encode("utf-8")).hexdigest()[:16]
+
+
+def remember(code: str) -> str:
+    """登记 stage 正文，返回其哈希（LRU，容量 STAGE_STORE_MAX）。"""
+    h = stage_hash(code)
+    with _lock:
+        _bodies[h] = code
+        _bodies.move_to_end(h)
+        while len(_bodies) > config.STAGE_STORE_MAX:
+            _bodies.popitem(last=False)
+    return h
+
+
+def get_stage_body(h: str) -> str | None:
+    with _lock:
+        code = _bodies.get(h)
+        if code is not None:
+            _bodies.move_to_end(h)
+        return code
+
+
+def tag_stages(stages: list[dict]) -> list[dict]:
+    """为每个 stage 添加 Hash。"""
+    return [{**s, "Hash": remember(s.get("Code", ""))} for s in stages]
+
+
+def delta_stages(stages: list[dict], known) -> list[dict]:
+    """客户端已缓存（known 含其 Hash）的 stage 只保留引用，其余保持完整。"""
+    if not known:
+        return stages
+    out = []
+    for s in stages:
+        h = s.get("Hash") or stage_hash(s.get("Code", ""))
+        if h in known:
+            out.append({"Type": s.get("Type"), "Hash": h, "Ref": True})
+        else:
+            out.append({**s, "Hash": h})
+    return out
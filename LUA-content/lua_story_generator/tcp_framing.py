@@ -0,0 +1,162 @@
+"""
+TCP framing: 每个连接一个缓冲区，从字节流中切出完整帧，剩余字节保留到下一帧（支持 pipelining）。
+
+两种模式：
+- line：JSON 行，以 \\n 结尾（默认）。只扫描新到达的字节，整体线性时间。
+- length：4 字节大端长度前缀 + 负载，无需在数百 KB 的脚本中查找换行符。
+
+超过 max_frame 的帧抛出 FrameTooLarge 并被整体跳过，连接可继续使用。
+
+Codec：hello 握手协商后使用（length 帧）。负载首字节为标志位（0 = 原文，1 = zlib 压缩），
+其后为 MessagePack 或 JSON（UTF-8）。msgpack 为可选依赖，未安装时只提供 json。
+"""
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+LINE = "line"
+LENGTH = "length"
+MODES = (LINE, LENGTH)
+
+_HEADER = 4
+
+JSON = "json"
+MSGPACK = "msgpack"
+ZLIB = "zlib"
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+
+class FrameTooLarge(Exception):
+    """单帧超过 max_frame。"""
+
+
+class Framer:
+    """按 mode 切帧 / 封帧。mode 可在连接中途切换（已缓冲的字节按新模式解析）。"""
+
+    def __init__(self, max_frame: int, mode: str = LINE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown framing mode: {mode}")
+        self.max_frame = max_frame
+        self.mode = mode
+        self._buf = bytearray()
+        self._scan = 0  # line 模式：已确认不含 \n 的前缀长度，下次从这里继续查找
+        self._skip = 0  # 正在丢弃的超长帧剩余字节数（length 模式）
+        self._discarding = False  # 正在丢弃超长行直到下一个 \n（line 模式）
+
+    def feed(self, data: bytes) -> None:
+        self._buf += data
+
+    def buffered(self) -> int:
+        return len(self._buf)
+
+    def next_frame(self) -> bytes | None:
+        """取出下一完整帧；数据不足返回 None；超长帧抛出 FrameTooLarge（每个超长帧一次）。"""
+        if self.mode == LENGTH:
+            return self._next_length_frame()
+        return self._next_line()
+
+    def _next_line(self) -> bytes | None:
+        while True:
+            idx = self._buf.find(b"\n", self._scan)
+            if idx < 0:
+                self._scan = len(self._buf)
+                if self._discarding:
+                    # 丢弃超长行已到达的部分，不再占用内存
+                    del self._buf[:]
+                    self._scan = 0
+                elif len(self._buf) > self.max_frame:
+                    del self._buf[:]
+                    self._scan = 0
+                    self._discarding = True
+                    raise FrameTooLarge(f"Frame exceeds {self.max_frame} bytes")
+                return None
+            frame = bytes(self._buf[:idx])
+            del self._buf[:idx + 1]
+            self._scan = 0
+            if self._discarding:
+                self._discarding = False
+                continue
+            if len(frame) > self.max_frame:
+                raise FrameTooLarge(f"Frame exceeds {self.max_frame} bytes")
+            return frame
+
+    def _next_length_frame(self) -> bytes | None:
+        while True:
+            if self._skip:
+                n = min(self._skip, len(self._buf))
+                del self._buf[:n]
+                self._skip -= n
+                if self._skip:
+                    return None
+            if len(self._buf) < _HEADER:
+                return None
+            size = int.from_bytes(self._buf[:_HEADER], "big")
+            if size > self.max_frame:
+                del self._buf[:_HEADER]
+                self._skip = size
+                raise FrameTooLarge(f"Frame exceeds {self.max_frame} bytes")
+            if len(self._buf) < _HEADER + size:
+                return None
+            frame = bytes(self._buf[_HEADER:_HEADER + size])
+            del self._buf[:_HEADER + size]
+            return frame
+
+    def encode(self, payload: bytes) -> bytes:
+        """按当前模式封帧。"""
+        if self.mode == LENGTH:
+            return len(payload).to_bytes(_HEADER, "big") + payload
+        return payload + b"\n"
+
+
+def available_codecs() -> list[str]:
+    """服务端支持的编码，按优先级排列。"""
+    return [MSGPACK, JSON] if msgpack is not None else [JSON]
+
+
+class CodecError(ValueError):
+    """负载无法解码（标志位未知、解压失败或超出大小）。"""
+
+
+class Codec:
+    """协商后的编码：序列化 + 超过阈值时 zlib 压缩。"""
+
+    def __init__(self, name: str = JSON, compression: str | None = None, threshold: int = 1024, max_size: int = 0):
+        if name not in available_codecs():
+            raise ValueError(f"Unsupported codec: {name}")
+        self.name = name
+        self.compression = compression
+        self.threshold = threshold
+        self.max_size = max_size  # 解压后上限，防止压缩炸弹；0 表示不限
+
+    def dumps(self, obj) -> bytes:
+        if self.name == MSGPACK:
+            body = msgpack.packb(obj, use_bin_type=True)
+        else:
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        if self.compression == ZLIB and len(body) >= self.threshold:
+            return _ZLIB + zlib.compress(body, 6)
+        return _RAW + body
+
+    def loads(self, payload: bytes):
+        flag, body = payload[:1], payload[1:]
+        if flag == _ZLIB:
+            d = zlib.decompressobj()
+            try:
+                body = d.decompress(body, self.max_size)
+            except zlib.error as e:
+                raise CodecError(f"Invalid zlib payload: {e}")
+            if d.unconsumed_tail:
+                raise CodecError(f"Decompressed payload exceeds {self.max_size} bytes")
+        elif flag != _RAW:
+            raise CodecError(f"Unknown payload flag: {flag!r}")
+        try:
+            if self.name == MSGPACK:
+                return msgpack.unpackb(body, raw=False)
+            return json.loads(body)
+        except Exception as e:
+            raise CodecError(f"Invalid {self.name} payload: {e}")
@@ -5,22 +5,205 @@ Unreal Engine connects as TCP client to send story input and receive LUA script.
 Protocol: JSON lines (each message = one JSON line, UTF-8).
 Request:  {"cmd": "generate", "story_input": "...", "api_key": "...", ...}
 Response: {"ok": true, "full_script": "...", "expanded_story": "...", ...}
+
+Jobs: {"cmd": "job_submit", ...generate 参数} -> {"ok": true, "job_id": "..."}
+      {"cmd": "job_status", "job_id": "...", "wait": 30} -> 任务状态（wait>0 时长轮询）
+      {"cmd": "job_result", "job_id": "..."} -> 任务结果
+      {"cmd": "job_subscribe", "job_id": "..."} -> 任务结束时在本连接推送 {"cmd": "job_done", ...}
+
+Server: asyncio.start_server，每个连接一个协程（而非线程），连接数与 backlog 见 config.TCP_*。
+Multiplexing: 请求带 "req_id" 时在本连接上并发执行，响应按完成顺序返回并带回同一 req_id；
+              不带 req_id 的请求保持原有的逐个处理、按序响应。
+Framing: 默认 JSON 行；发送 {"cmd": "set_framing", "framing": "length"} 后该连接改为
+         4 字节大端长度前缀帧（见 tcp_framing.py）。同一连接可连续发送多个请求（pipelining）。
+Stages: 每个 stage 带内容哈希 Hash；{"cmd": "stage_cache", "hashes": [...]} 声明 UE 已缓存的哈希后，
+        generate 响应与前端推送对未变化的 stage 只发送 {"Type", "Hash", "Ref": true}；{"cmd": "get_stage", "hash": ...} 取回正文。
+Codec: {"cmd": "hello", "codecs": ["msgpack", "json"], "compression": ["zlib"]} 协商编码，
+       之后该连接改用 length 帧 + MessagePack（超过阈值 zlib 压缩）；未握手的旧插件保持 JSON 行。
 """
+import asyncio
 import json
-import socket
+import sys
 import threading
+import time
+from collections import deque
 from pathlib import Path
 
 import config
-from orchestrator import run_full_pipeline
+from orchestrator import iter_batch_async, run_full_pipeline_async
+from stage_hashes import delta_stages, get_stage_body, remember
+from tcp_framing import JSON, LENGTH, MODES, ZLIB, Codec, CodecError, FrameTooLarge, Framer, available_codecs
 
 DEFAULT_HOST = "127.0.0.1"
 DEFAULT_PORT = 9000
 ASSETS_FILE = Path(__file__).parent / "assets.json"
 
+_READ_SIZE = 65536
+
+
+class _Pinned(bytes):
+    """drop_oldest 不丢弃的帧（经 put 入队）；队列满时只淘汰推送 / 广播帧。"""
+
+
+class _Response(_Pinned):
+    """请求响应：客户端在等待它，丢弃会使请求永远没有回复。"""
+
+
+class _Control(_Pinned):
+    """协议控制帧（hello / set_framing 确认）：丢失会使双方编码不一致。"""
+
+
+class _Client:
+    """
+    一个 UE 连接。所有写入都在服务端事件循环中进行，无需加锁。
+    发送经有界队列由独立的 writer 协程写出：推送（广播、任务通知）只入队，慢客户端不会阻塞其他客户端；
+    队列满时按 TCP_SEND_POLICY 丢弃最旧的推送（drop_oldest）或断开该客户端（disconnect）；
+    协议控制帧与请求响应经 put 入队（等待空间，标记为 _Pinned），drop_oldest 不会丢弃它们。
+    """
+
+    __slots__ = (
+        "reader", "writer", "peer", "framer", "codec", "known_hashes", "tasks", "inflight",
+        "queue", "queued_bytes", "max_depth", "sent", "dropped", "closing", "_ready", "_space", "_writer_task",
+        "__weakref__",
+    )
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info("peername")
+        self.framer = Framer(config.TCP_MAX_FRAME)
+        self.codec: Codec | None = None  # None = 旧协议（JSON 文本）；hello 协商后为 Codec
+        self.known_hashes: set = set()  # UE 声明已缓存的 stage Hash
+        self.tasks: set = set()  # 带 req_id 的并发请求
+        self.inflight = asyncio.Semaphore(max(1, config.TCP_MAX_INFLIGHT))
+        self.queue: deque = deque()  # 已封帧、待写出的字节
+        self.queued_bytes = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.dropped = 0
+        self.closing = False
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._writer_task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._writer_task = asyncio.create_task(self._write_loop())
+
+    async def flush(self, timeout: float) -> None:
+        """等待发送队列写空（正常断开前把已入队的响应发完），最多 timeout 秒。"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.queue and not self.closing:
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                break
+
+    def stop(self) -> None:
+        self.closing = True
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+
+    def _body(self, obj) -> bytes:
+        if self.codec is not None:
+            return self.codec.dumps(obj)
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def _encode(self, obj) -> bytes:
+        return self.framer.encode(self._body(obj))
+
+    def codec_key(self) -> tuple | None:
+        return (self.codec.name, self.codec.compression) if self.codec is not None else None
+
+    def _enqueue(self, data: bytes) -> None:
+        self.queue.append(data)
+        self.queued_bytes += len(data)
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self._ready.set()
+
+    def send(self, obj, cache: dict | None = None) -> None:
+        """
+        入队一条推送（不等待）。队列满时按 TCP_SEND_POLICY 处理：drop_oldest 丢弃最旧的推送，
+        队列中全是响应 / 控制帧时丢弃本条。
+        cache：广播时按编码缓存序列化结果，同一编码的客户端只序列化一次。
+        """
+        if self.closing:
+            return
+        if cache is None:
+            payload = self._body(obj)
+        else:
+            key = self.codec_key()
+            payload = cache.get(key)
+            if payload is None:
+                payload = cache[key] = self._body(obj)
+        if len(self.queue) >= config.TCP_SEND_QUEUE:
+            if config.TCP_SEND_POLICY == "disconnect":
+                # 慢消费者：直接断开，避免其拖累服务端内存
+                self.closing = True
+                _count_stat("slow_disconnects")
+                self.writer.transport.abort()
+                return
+            i = next((i for i, d in enumerate(self.queue) if not isinstance(d, _Pinned)), None)
+            self.dropped += 1
+            _count_stat("dropped")
+            if i is None:
+                return
+            old = self.queue[i]
+            del self.queue[i]
+            self.queued_bytes -= len(old)
+        self._enqueue(self.framer.encode(payload))
+
+    async def put(self, obj, control: bool = False) -> None:
+        """
+        入队一条请求响应；队列满时等待（对该连接自身形成背压），之后 drop_oldest 也不会丢弃它。
+        control=True 为协议控制帧（按入队时的编码封帧）。
+        """
+        while len(self.queue) >= config.TCP_SEND_QUEUE and not self.closing:
+            self._space.clear()
+            await self._space.wait()
+        if not self.closing:
+            data = self._encode(obj)
+            self._enqueue(_Control(data) if control else _Response(data))
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                while not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                data = self.queue.popleft()
+                self.queued_bytes -= len(data)
+                self._space.set()
+                self.writer.write(data)
+                self.sent += 1
+                await self.writer.drain()
+        except (ConnectionError, OSError):
+            self.closing = True
+            self._space.set()
+
+    def stats(self) -> dict:
+        return {
+            "peer": f"{self.peer[0]}:{self.peer[1]}" if isinstance(self.peer, tuple) else str(self.peer),
+            "framing": self.framer.mode,
+            "codec": self.codec.name if self.codec else "json-lines",
+            "compression": self.codec.compression if self.codec else None,
+            "queue_depth": len(self.queue),
+            "queued_bytes": self.queued_bytes,
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "inflight": len(self.tasks),
+            "known_hashes": len(self.known_hashes),
+        }
+
+
 # 已连接的 Unreal 客户端，用于前端「发送」时推送
 _connected_clients: set = set()
 _clients_lock = threading.Lock()
+# 服务端事件循环：HTTP 线程、任务 worker 线程通过 call_soon_threadsafe 向连接写入
+_server_loop: asyncio.AbstractEventLoop | None = None
+_server_stats = {"accepted": 0, "rejected": 0, "peak_connections": 0, "dropped": 0, "slow_disconnects": 0}
 
 # UE 端反馈消息队列，供前端展示
 _ue_messages: list = []
@@ -35,9 +218,28 @@ def get_connected_count() -> int:
         return len(_connected_clients)
 
 
+def _count_stat(key: str) -> None:
+    with _clients_lock:
+        _server_stats[key] += 1
+
+
+def get_server_stats() -> dict:
+    """TCP 服务统计：当前 / 峰值连接数、累计接受 / 拒绝 / 丢弃数、配置的上限及每个客户端的发送队列深度。"""
+    with _clients_lock:
+        stats = dict(_server_stats)
+        clients = list(_connected_clients)
+    stats["connections"] = len(clients)
+    stats["clients"] = [c.stats() for c in clients]
+    stats["max_connections"] = config.TCP_MAX_CONNECTIONS
+    stats["backlog"] = config.TCP_BACKLOG
+    stats["send_queue"] = config.TCP_SEND_QUEUE
+    stats["send_policy"] = config.TCP_SEND_POLICY
+    stats["running"] = _server_loop is not None and _server_loop.is_running()
+    return stats
+
+
 def push_ue_message(msg: dict) -> None:
     """存入 UE 端发来的反馈消息，供前端拉取。"""
-    import time
     entry = {"ts": time.time(), "time": time.strftime("%H:%M:%S", time.localtime()), **msg}
     with _ue_messages_lock:
         _ue_messages.append(entry)
@@ -54,21 +256,43 @@ def get_ue_messages(limit: int = 50, clear: bool = False) -> list:
     return out
 
 
+def _call_in_server_loop(fn, *args) -> bool:
+    """从任意线程把 fn(*args) 交给服务端事件循环执行；服务未运行返回 False。"""
+    loop = _server_loop
+    if loop is None or loop.is_closed():
+        return False
+    try:
+        loop.call_soon_threadsafe(fn, *args)
+    except RuntimeError:
+        return False
+    return True
+
+
 def send_to_unreal_clients(obj: dict) -> int:
-    """向前端已连接的 Unreal 客户端推送 JSON 消息，返回成功发送的客户端数量。"""
-    msg = json.dumps(obj, ensure_ascii=False) + "\n"
-    payload = msg.encode("utf-8")
+    """
+    向前端已连接的 Unreal 客户端推送 JSON 消息，返回推送的客户端数量。
+    每种编码只序列化一次并放入各客户端的发送队列（O(clients) 入队），由各自的 writer 写出，不等待发送完成。
+    含 Code 的消息附带 Hash；已声明缓存该 Hash 的客户端只收到引用。
+    """
     with _clients_lock:
         clients = list(_connected_clients)
-    count = 0
-    for conn in clients:
-        try:
-            conn.sendall(payload)
-            count += 1
-        except (BrokenPipeError, ConnectionResetError, OSError):
-            with _clients_lock:
-                _connected_clients.discard(conn)
-    return count
+    if not clients:
+        return 0
+    ref = None
+    if isinstance(obj.get("Code"), str):
+        obj = {**obj, "Hash": remember(obj["Code"])}
+        ref = {"Type": obj.get("Type"), "Hash": obj["Hash"], "Ref": True}
+
+    def _send_all() -> None:
+        cache: dict = {}
+        ref_cache: dict = {}
+        for client in clients:
+            if ref is not None and ref["Hash"] in client.known_hashes:
+                client.send(ref, ref_cache)
+            else:
+                client.send(obj, cache)
+
+    return len(clients) if _call_in_server_loop(_send_all) else 0
 
 
 def _load_assets() -> dict:
@@ -94,65 +318,249 @@ def _load_assets() -> dict:
     return data
 
 
-def _handle_request(raw: str) -> dict:
-    """Parse JSON request and execute, return response dict."""
+def _generate_kwargs(req: dict) -> dict | str:
+    """校验 generate 请求并补全默认值，返回 run_full_pipeline 参数；不合法时返回错误信息。"""
+    story_input = req.get("story_input") or req.get("content", "")
+    api_key = req.get("api_key", "")
+    if not api_key or not str(api_key).strip():
+        return "API Key is required"
+    if not story_input or not str(story_input).strip():
+        return "Story input is required"
+
+    story_model = req.get("story_model") or config.STORY_MODELS[0]
+    planning_model = req.get("planning_model") or config.PLANNING_MODELS[0]
+    coding_model = req.get("coding_model") or config.CODING_MODELS[0]
+    if story_model not in config.STORY_MODELS:
+        story_model = config.STORY_MODELS[0]
+    if planning_model not in config.PLANNING_MODELS:
+        planning_model = config.PLANNING_MODELS[0]
+    if coding_model not in config.CODING_MODELS:
+        coding_model = config.CODING_MODELS[0]
+
+    assets = req.get("assets") or _load_assets()
+    if "minigames" not in assets or not assets["minigames"]:
+        assets.setdefault("minigames", ["TTT"])
+
+    return {
+        "story_input": str(story_input or "").strip(),
+        "api_key": str(api_key).strip(),
+        "story_model": story_model,
+        "planning_model": planning_model,
+        "coding_model": coding_model,
+        "assets": assets,
+        "use_cache": not req.get("bypass_cache", False),
+        "speculative": req.get("speculative_candidates"),
+    }
+
+
+async def _iter_batch(prepared: list, concurrency: int | None, item_timeout: float | None):
+    """驱动 iter_batch_async，按完成顺序逐条产出响应，最后产出汇总行。"""
+    done = failed = 0
+    async for entry in iter_batch_async(prepared, concurrency, item_timeout):
+        done += 1
+        if entry.get("ok"):
+            result = entry.pop("result")
+            entry["stages"] = result.get("stages", [])
+            entry["run_id"] = result.get("run_id")
+        else:
+            failed += 1
+        yield {"cmd": "batch_item", **entry}
+    yield {"ok": True, "cmd": "batch_done", "count": done, "failed": failed}
+
+
+async def _job_command(cmd: str, req: dict, client: _Client | None):
+    """job_submit / job_status / job_result / job_subscribe / job_cancel。"""
+    from jobs import FINISHED, get_job_manager
+    manager = get_job_manager()
+    if cmd == "job_submit":
+        kwargs = await asyncio.to_thread(_generate_kwargs, req)
+        if isinstance(kwargs, str):
+            return {"ok": False, "error": kwargs}
+        return {"ok": True, "job_id": manager.submit(kwargs), "status": "queued"}
+
+    job_id = str(req.get("job_id") or "")
+    if cmd == "job_status":
+        wait = min(float(req.get("wait") or 0), config.JOB_WAIT_MAX)
+        record = await manager.wait_async(job_id, wait) if wait > 0 else manager.get(job_id)
+    elif cmd == "job_result":
+        record = manager.get(job_id, with_result=True)
+        if record is not None and record["status"] not in FINISHED:
+            return {"ok": False, "error": f"Job not finished: {record['status']}", "job_id": job_id}
+    elif cmd == "job_cancel":
+        return {"ok": manager.cancel(job_id), "job_id": job_id}
+    else:  # job_subscribe
+        if client is None:
+            return {"ok": False, "error": "job_subscribe requires a connection"}
+
+        tag = {"req_id": req["req_id"]} if req.get("req_id") is not None else {}
+
+        def _push(record: dict) -> None:
+            # 在任务 worker 线程中回调，交给服务端循环写入
+            _call_in_server_loop(client.send, {"cmd": "job_done", **manager.get(job_id, with_result=True), **tag})
+
+        if manager.subscribe(job_id, _push) is None:
+            return {"ok": False, "error": f"Job not found: {job_id}"}
+        return {"ok": True, "subscribed": job_id}
+
+    if record is None:
+        return {"ok": False, "error": f"Job not found: {job_id}"}
+    return {"ok": True, **record}
+
+
+def _npc_animations() -> list:
+    from datatable_loader import get_resource_index
+    animations = get_resource_index().resources.get("animations", [])
+    if not animations:
+        animations = ["Happy", "Frustrated", "Wave", "Drink", "Eat", "Idle", "Sit", "Dance", "Shy", "Dialogue"]
+    return animations
+
+
+def _parse_request(raw: str) -> tuple[dict | None, dict | None]:
+    """解析请求 JSON，返回 (req, None)；不合法时返回 (None, 错误响应)。"""
     try:
         req = json.loads(raw)
     except json.JSONDecodeError as e:
         # Log first 200 chars for debugging (avoid full content in case of API key)
         preview = repr(raw[:200]) if len(raw) > 200 else repr(raw)
-        import sys
         print(f"[TCP] JSON parse error: {e}", file=sys.stderr)
         print(f"[TCP] Raw preview (repr): {preview}", file=sys.stderr)
-        return {"ok": False, "error": f"Invalid JSON: {e}"}
+        return None, {"ok": False, "error": f"Invalid JSON: {e}"}
+    if not isinstance(req, dict):
+        return None, {"ok": False, "error": "Request must be a JSON object"}
+    return req, None
+
+
+def _load_request(codec: Codec, frame: bytes) -> tuple[dict | None, dict | None]:
+    """按协商的编码解析请求帧，返回值同 _parse_request。"""
+    try:
+        req = codec.loads(frame)
+    except CodecError as e:
+        return None, {"ok": False, "error": str(e)}
+    if not isinstance(req, dict):
+        return None, {"ok": False, "error": "Request must be a map"}
+    return req, None
+
+
+async def _hello(req: dict, client: _Client) -> None:
+    """协商编码：按服务端优先级选择双方都支持的 codec；选中 msgpack 或启用压缩时该连接切换为 length 帧。"""
+    offered = req.get("codecs") or [JSON]
+    codec = next((c for c in available_codecs() if c in offered), JSON)
+    compression = ZLIB if ZLIB in (req.get("compression") or []) else None
+    reply = {
+        "ok": True,
+        "cmd": "hello",
+        "codec": codec,
+        "compression": compression,
+        "compress_threshold": config.TCP_COMPRESS_THRESHOLD,
+        "framing": LENGTH if codec != JSON or compression else client.framer.mode,
+        "server_codecs": available_codecs(),
+    }
+    if req.get("req_id") is not None:
+        reply["req_id"] = req["req_id"]
+    # 以原编码确认（等待队列空间，不受丢弃 / 断开策略影响），之后双向使用新编码
+    await client.put(reply, control=True)
+    if codec != JSON or compression:
+        client.codec = Codec(codec, compression, config.TCP_COMPRESS_THRESHOLD, max_size=config.TCP_MAX_FRAME)
+        client.framer.mode = LENGTH
+    else:
+        client.codec = None
+
+
+async def _handle_request(raw: str, client: _Client | None = None):
+    """Parse JSON request and execute, return response dict (generate_batch 返回逐条产出响应的异步迭代器)."""
+    req, error = _parse_request(raw)
+    if error is not None:
+        return error
+    return await _dispatch(req, client)
 
+
+async def _dispatch(req: dict, client: _Client | None = None):
+    """执行已解析的请求，返回响应 dict / 异步迭代器（generate_batch）/ None（已自行回复）。"""
     cmd = req.get("cmd") or req.get("action") or req.get("Type") or req.get("type")
     if not cmd:
         return {"ok": False, "error": "Missing 'cmd'、'action' or 'Type' field"}
 
     if cmd == "generate":
-        story_input = req.get("story_input") or req.get("content", "")
-        api_key = req.get("api_key", "")
-        if not api_key or not str(api_key).strip():
-            return {"ok": False, "error": "API Key is required"}
-        if not story_input or not str(story_input).strip():
-            return {"ok": False, "error": "Story input is required"}
-
-        story_model = req.get("story_model") or config.STORY_MODELS[0]
-        planning_model = req.get("planning_model") or config.PLANNING_MODELS[0]
-        coding_model = req.get("coding_model") or config.CODING_MODELS[0]
-        if story_model not in config.STORY_MODELS:
-            story_model = config.STORY_MODELS[0]
-        if planning_model not in config.PLANNING_MODELS:
-            planning_model = config.PLANNING_MODELS[0]
-        if coding_model not in config.CODING_MODELS:
-            coding_model = config.CODING_MODELS[0]
-
-        assets = req.get("assets") or _load_assets()
-        if "minigames" not in assets or not assets["minigames"]:
-            assets.setdefault("minigames", ["TTT"])
-
+        kwargs = await asyncio.to_thread(_generate_kwargs, req)
+        if isinstance(kwargs, str):
+            return {"ok": False, "error": kwargs}
         try:
-            result = run_full_pipeline(
-                story_input=str(story_input or "").strip(),
-                api_key=str(api_key).strip(),
-                story_model=story_model,
-                planning_model=planning_model,
-                coding_model=coding_model,
-                assets=assets,
-            )
+            result = await run_full_pipeline_async(**kwargs)
+            known = set(req.get("known_stage_hashes") or [])
+            if client is not None:
+                known |= client.known_hashes
+            if known:
+                # UE 已缓存的 stage 只发引用；full_script 由 UE 按 stages 拼接，不再重复发送
+                return {
+                    "ok": True,
+                    "stages": delta_stages(result.get("stages", []), known),
+                    "run_id": result.get("run_id"),
+                }
             # 返回完整结果供 UE 使用（stages + full_script）
             return {
                 "ok": True,
                 "stages": result.get("stages", []),
                 "full_script": result.get("full_script", ""),
+                "run_id": result.get("run_id"),
             }
         except Exception as e:
             return {"error": str(e)}
 
+    elif cmd == "generate_batch":
+        items = req.get("items")
+        if not isinstance(items, list) or not items:
+            return {"ok": False, "error": "'items' must be a non-empty list"}
+        default_key = req.get("api_key", "")
+        prepared = [
+            await asyncio.to_thread(_generate_kwargs, {"api_key": default_key, **item})
+            if isinstance(item, dict) else "Invalid item"
+            for item in items
+        ]
+        return _iter_batch(prepared, req.get("concurrency"), req.get("item_timeout"))
+
+    elif cmd in ("job_submit", "job_status", "job_result", "job_subscribe", "job_cancel"):
+        return await _job_command(cmd, req, client)
+
     elif cmd == "ping" or cmd == "health":
         return {"ok": True, "msg": "pong"}
 
+    elif cmd == "stage_cache":
+        if client is None:
+            return {"ok": False, "error": "stage_cache requires a connection"}
+        hashes = [h for h in (req.get("hashes") or []) if isinstance(h, str)]
+        if req.get("replace"):
+            client.known_hashes = set()
+        client.known_hashes.update(hashes[:max(0, config.TCP_KNOWN_HASHES_MAX - len(client.known_hashes))])
+        for h in req.get("evict") or []:
+            client.known_hashes.discard(h)
+        return {"ok": True, "cached": len(client.known_hashes)}
+
+    elif cmd == "get_stage":
+        h = str(req.get("hash") or req.get("Hash") or "")
+        code = get_stage_body(h)
+        if code is None:
+            return {"ok": False, "error": f"Unknown stage hash: {h}"}
+        return {"ok": True, "Hash": h, "Code": code}
+
+    elif cmd == "hello":
+        if client is None:
+            return {"ok": False, "error": "hello requires a connection"}
+        await _hello(req, client)
+        return None
+
+    elif cmd == "set_framing":
+        mode = req.get("framing") or req.get("mode")
+        if client is not None and client.codec is not None:
+            return {"ok": False, "error": "set_framing is not available after codec negotiation"}
+        if mode not in MODES:
+            return {"ok": False, "error": f"Unknown framing: {mode}，可选: {', '.join(MODES)}"}
+        if client is None:
+            return {"ok": False, "error": "set_framing requires a connection"}
+        # 以原帧格式确认（同 hello），之后双向使用新格式
+        await client.put({"ok": True, "framing": mode}, control=True)
+        client.framer.mode = mode
+        return None
+
     # 统一格式：Type + Code。支持 NPC_Think_Begin、NPC_Dialogue_Request
     msg_type = req.get("Type") or req.get("type") or cmd
     api_key = (req.get("api_key") or req.get("apiKey") or "").strip()
@@ -166,13 +574,9 @@ def _handle_request(raw: str) -> dict:
         if not isinstance(code, dict):
             code = {"NPCInfo": {}, "CurrentDialogue": ""}
         try:
-            from datatable_loader import load_resources
-            res = load_resources()
-            animations = res.get("animations", [])
-            if not animations:
-                animations = ["Happy", "Frustrated", "Wave", "Drink", "Eat", "Idle", "Sit", "Dance", "Shy", "Dialogue"]
-            from npc_dialogue import generate_npc_dialogue_reply_lua
-            lua = generate_npc_dialogue_reply_lua(api_key=api_key, code=code, animations=animations)
+            animations = _npc_animations()
+            from npc_dialogue import generate_npc_dialogue_reply_lua_async
+            lua = await generate_npc_dialogue_reply_lua_async(api_key=api_key, code=code, animations=animations)
             return {"Type": "NPC_Dialogue_Reply", "Code": lua, "ok": True, "lua": lua}
         except Exception as e:
             return {"ok": False, "error": str(e)}
@@ -189,13 +593,9 @@ def _handle_request(raw: str) -> dict:
                 "TagList": [{"UID": req.get("PropTag") or req.get("prop_tag") or "", "Tags": [req.get("PropTag") or req.get("prop_tag")] or []}],
             }
         try:
-            from datatable_loader import load_resources
-            res = load_resources()
-            animations = res.get("animations", [])
-            if not animations:
-                animations = ["Happy", "Frustrated", "Wave", "Drink", "Eat", "Idle", "Sit", "Dance", "Shy", "Dialogue"]
-            from npc_interaction import generate_npc_think_lua
-            lua = generate_npc_think_lua(api_key=api_key, code=code, animations=animations)
+            animations = _npc_animations()
+            from npc_interaction import generate_npc_think_lua_async
+            lua = await generate_npc_think_lua_async(api_key=api_key, code=code, animations=animations)
             return {"Type": "NPC_Think_End", "Code": lua, "ok": True, "lua": lua}
         except Exception as e:
             return {"ok": False, "error": str(e)}
@@ -211,74 +611,166 @@ def _handle_request(raw: str) -> dict:
         return {"ok": True, "received": True}
 
     elif cmd == "get_assets":
-        return {"ok": True, "assets": _load_assets()}
+        from asset_catalog import catalog_key, get_versioned
+
+        assets, version = await asyncio.to_thread(
+            lambda: get_versioned("tcp_assets", catalog_key(ASSETS_FILE, DEFAULT_ASSETS), _load_assets))
+        if req.get("if_version") == version:
+            return {"ok": True, "not_modified": True, "version": version}
+        return {"ok": True, "assets": assets, "version": version}
 
     else:
         return {"ok": False, "error": f"Unknown command: {cmd}"}
 
 
-def _read_line(conn: socket.socket, buf_size: int = 65536) -> str | None:
-    """Read until newline (\\n). Returns None on disconnect. Handles UTF-8, BOM, UTF-16."""
-    data = b""
-    while True:
-        chunk = conn.recv(buf_size)
-        if not chunk:
-            return None
-        data += chunk
-        if b"\n" in data:
-            line, _ = data.split(b"\n", 1)
-            raw = line.strip()
-            if not raw:
-                return ""
-            # Strip UTF-8 BOM
-            if raw.startswith(b"\xef\xbb\xbf"):
-                raw = raw[3:]
-            # UE on Windows may send UTF-16 LE; detect via 0x00 after '{'
-            if len(raw) >= 2 and raw[0:1] == b"{" and raw[1:2] == b"\x00":
-                try:
-                    return raw.decode("utf-16-le", errors="replace").strip()
-                except Exception:
-                    pass
-            return raw.decode("utf-8", errors="replace").strip()
+def _decode_line(line: bytes) -> str:
+    """Decode one request frame. Handles UTF-8, BOM, UTF-16."""
+    # UTF-16 的 "\n\x00" 按 \n 切帧后，\x00 留在下一帧开头
+    raw = line.lstrip(b"\x00").strip()
+    if not raw:
+        return ""
+    # Strip UTF-8 BOM
+    if raw.startswith(b"\xef\xbb\xbf"):
+        raw = raw[3:]
+    # UE on Windows may send UTF-16 LE; detect via 0x00 after '{'
+    if len(raw) >= 2 and raw[0:1] == b"{" and raw[1:2] == b"\x00":
+        try:
+            return raw.decode("utf-16-le", errors="replace").strip()
+        except Exception:
+            pass
+    return raw.decode("utf-8", errors="replace").strip()
 
 
-def _handle_client(conn: socket.socket):
+# 改变连接状态的命令总是按序处理
+_INLINE_CMDS = ("set_framing", "hello")
+
+
+async def _respond(client: _Client, resp, req_id=None) -> None:
+    """发送响应；带 req_id 时为每条响应附上 req_id（generate_batch 的每一行也带）。"""
+    if resp is None:
+        return
+    tag = {"req_id": req_id} if req_id is not None else {}
+    if isinstance(resp, dict):
+        await client.put({**resp, **tag})
+    elif isinstance(resp, list):
+        await client.put({"ok": True, "result": resp, **tag} if tag else resp)
+    else:
+        # generate_batch 返回异步迭代器：每完成一条即发送一行
+        async for item in resp:
+            await client.put({**item, **tag})
+
+
+async def _run_tagged(client: _Client, req: dict, req_id) -> None:
+    """执行一个带 req_id 的请求；异常也以带 req_id 的错误响应返回。"""
+    try:
+        await _respond(client, await _dispatch(req, client), req_id)
+    except (ConnectionError, OSError):
+        pass
+    except Exception as e:
+        await client.put({"ok": False, "error": str(e), "req_id": req_id})
+    finally:
+        client.inflight.release()
+
+
+async def _handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
     """Handle one client connection (request-response loop)."""
+    client = _Client(reader, writer)
     with _clients_lock:
-        _connected_clients.add(conn)
+        if len(_connected_clients) >= config.TCP_MAX_CONNECTIONS:
+            _server_stats["rejected"] += 1
+            accepted = False
+        else:
+            _connected_clients.add(client)
+            _server_stats["accepted"] += 1
+            _server_stats["peak_connections"] = max(_server_stats["peak_connections"], len(_connected_clients))
+            accepted = True
+    if not accepted:
+        writer.write(client._encode({"ok": False, "error": "Too many connections"}))
+        try:
+            await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        writer.close()
+        return
+
+    client.start()
     try:
         while True:
-            line = _read_line(conn)
-            if line is None:
+            data = await reader.read(_READ_SIZE)
+            if not data:
                 break
-            if not line:
-                continue
-            resp = _handle_request(line)
-            out = json.dumps(resp, ensure_ascii=False) + "\n"
-            conn.sendall(out.encode("utf-8"))
-    except (ConnectionResetError, BrokenPipeError, OSError):
+            client.framer.feed(data)
+            # 一次 read 可能包含多个请求（pipelining），按顺序逐个处理
+            while True:
+                try:
+                    frame = client.framer.next_frame()
+                except FrameTooLarge as e:
+                    await client.put({"ok": False, "error": str(e)})
+                    continue
+                if frame is None:
+                    break
+                if client.codec is not None:
+                    req, error = _load_request(client.codec, frame)
+                else:
+                    line = _decode_line(frame)
+                    if not line:
+                        continue
+                    req, error = _parse_request(line)
+                if error is not None:
+                    await client.put(error)
+                    continue
+                req_id = req.get("req_id")
+                if req_id is None or req.get("cmd") in _INLINE_CMDS:
+                    await _respond(client, await _dispatch(req, client), req_id)
+                    continue
+                # 带 req_id：并发执行，在途请求达到 TCP_MAX_INFLIGHT 时暂停读取（TCP 背压）
+                await client.inflight.acquire()
+                task = asyncio.create_task(_run_tagged(client, req, req_id))
+                client.tasks.add(task)
+                task.add_done_callback(client.tasks.discard)
+    except (ConnectionError, OSError):
         pass
     finally:
         with _clients_lock:
-            _connected_clients.discard(conn)
+            _connected_clients.discard(client)
+        # 连接断开：取消仍在执行的并发请求，不再为其 LLM 调用付费
+        for task in list(client.tasks):
+            task.cancel()
         try:
-            conn.close()
-        except OSError:
+            await client.flush(5.0)
+        except (ConnectionError, OSError):
             pass
+        client.stop()
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+    """在当前事件循环中运行 TCP 服务（直到被取消）。"""
+    global _server_loop
+    from datatable_loader import get_resource_index
+    await asyncio.to_thread(get_resource_index)  # 预先构建素材库索引
+    server = await asyncio.start_server(
+        _handle_client, host, port, backlog=config.TCP_BACKLOG, reuse_address=True
+    )
+    _server_loop = asyncio.get_running_loop()
+    print(
+        f"[TCP] LUA Story Generator listening on tcp://{host}:{port} "
+        f"(backlog={config.TCP_BACKLOG}, max_connections={config.TCP_MAX_CONNECTIONS})"
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        _server_loop = None
 
 
 def run_tcp_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
     """Run TCP server (blocking)."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    sock.bind((host, port))
-    sock.listen(5)
-    print(f"[TCP] LUA Story Generator listening on tcp://{host}:{port}")
-
-    while True:
-        conn, addr = sock.accept()
-        t = threading.Thread(target=_handle_client, args=(conn,), daemon=True)
-        t.start()
+    asyncio.run(serve(host, port))
 
 
 if __name__ == "__main__":
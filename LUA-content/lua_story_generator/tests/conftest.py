@@ -0,0 +1,42 @@
+"""测试共用：把 lua_story_generator 加入 sys.path（模块是平铺的，不是包），提供一段通过全部规则的 Encounter。"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ENCOUNTER = '''\
+function SpawnEncounter_01()
+    local code = [[
+if _G.enc01_done then return end
+_G.enc01_done = true
+local player = World.GetByID("Player")
+if not player or not player:IsValid() then return end
+local npc = World.GetByID("NPC_Merchant")
+if not npc or not npc:IsValid() then return end
+local r = UI.Ask("要帮忙吗？", "答应", "拒绝")
+if r == "答应" then
+    npc:GiveItem("Item_Herb", 1)
+    UI.Toast("获得草药")
+end
+]]
+    World.SpawnEncounter({X = 11600, Y = 12000, Z = 90}, 300, {}, "Trigger", code)
+end
+
+function ResolveEncounterLoc()
+    return {X = 11600, Y = 12000, Z = 90}
+end
+'''
+
+ASSETS = {"items": ["Item_Herb", "Item_Sword"], "minigames": ["Fishing", "Archery"]}
+
+
+@pytest.fixture
+def encounter():
+    return ENCOUNTER
+
+
+@pytest.fixture
+def assets():
+    return {k: list(v) for k, v in ASSETS.items()}
@@ -0,0 +1,120 @@
+"""api_catalog：从文档编译签名表；ApiCallRule 的未知函数 / 实参个数 / 字面量类型检查；仓库内 Lua 文件与文档一致。"""
+from pathlib import Path
+
+import pytest
+
+import api_catalog
+from lua_parser import parse
+from validate_lua import ApiCallRule, lint_api_calls, run_rules
+
+GUIDE = """\
+## 3.1 `World`
+- `World.SpawnNPC(type, name, loc)` -> `Actor`
+  示例：`World.SpawnNPC("NPC_A", "阿福", {X=1,Y=2,Z=90})`
+- `World.GetByID(id)` -> `Actor|nil`
+- `Foo.Bar(x)` -> `nil`
+
+## 3.2 `UI`
+- `UI.Ask(msg, btnA, btnB)` -> `string`（异步）
+- `UI.Toast(msg)` -> `nil`
+
+### 3.6 `Performer` 接口
+- `npc:GiveItem(id, count)` -> `nil`；示例：`npc:GiveItem("Item_Herb", 2)`
+"""
+
+
+@pytest.fixture
+def catalog():
+    return api_catalog.build_catalog(GUIDE)
+
+
+def _lint(catalog, code):
+    return run_rules(parse(code), [ApiCallRule(catalog)])
+
+
+def test_build_catalog(catalog):
+    assert set(catalog["modules"]) == {"World", "UI"}  # Foo 不是 API 模块
+    spawn = catalog["modules"]["World"]["SpawnNPC"]
+    assert spawn["params"] == ["type", "name", "loc"]
+    assert spawn["kinds"] == ["string", "string", "table"]
+    assert spawn["returns"] == "Actor" and spawn["line"] == 2
+    assert catalog["modules"]["UI"]["Ask"]["async"] is True
+    give = catalog["methods"]["GiveItem"]
+    assert (give["owner"], give["kinds"]) == ("Performer", ["string", "number"])
+    assert api_catalog.format_signature(give) == "Performer:GiveItem(id: string, count: number) -> nil"
+
+
+def test_catalog_hash_tracks_content(catalog):
+    assert api_catalog.build_catalog(GUIDE)["hash"] == catalog["hash"]
+    assert api_catalog.build_catalog(GUIDE + "\n")["hash"] != catalog["hash"]
+
+
+@pytest.mark.parametrize("code", [
+    'World.SpawnNPC("NPC_A", "阿福", loc)',
+    'World.SpawnNPC("NPC_A", unpack(args))',  # 末位实参可展开为多个值
+    "World.SpawnNPC(...)",
+    'npc:GiveItem("Item_Herb", 1)',
+    'other:Whatever(1, 2, 3)',  # 来源不明的对象不检查未知方法
+])
+def test_arity_ok(catalog, code):
+    assert _lint(catalog, code) == []
+
+
+@pytest.mark.parametrize("code, message", [
+    ('World.SpawnNPC("NPC_A", "阿福")', "line 1:1: World.SpawnNPC 实参个数 2 与文档签名不符，应为 World.SpawnNPC(type, name, loc)"),
+    ('World.SpawnNPC("NPC_A", "阿福", loc, 1)', "line 1:1: World.SpawnNPC 实参个数 4 与文档签名不符"),
+    ('World.SpawnNPC("A", "B", loc, 1, f())', "line 1:1: World.SpawnNPC 实参个数 5 与文档签名不符"),
+    ('npc:GiveItem("Item_Herb")', "line 1:1: npc:GiveItem 实参个数 1 与文档签名不符"),
+    ('npc:GiveItem("Item_Herb", true)', "line 1:27: npc:GiveItem 第 2 个参数 count 应为 number"),
+])
+def test_arity_and_kind_errors(catalog, code, message):
+    errors = _lint(catalog, code)
+    assert len(errors) == 1 and errors[0].startswith(message)
+
+
+def test_number_string_coercion_accepted(catalog):
+    # Lua 会在数字与字符串之间自动转换，不算类型不符
+    assert _lint(catalog, 'UI.Toast(42)\nnpc:GiveItem("Item_Herb", "2")') == []
+
+
+def test_unknown_function_with_suggestion(catalog):
+    assert _lint(catalog, 'UI.Tost("hi")') == [
+        "line 1:1: UI.Tost 不在 API 文档（lua_atomic_modules_call_guide.md）中，是否为 UI.Toast？"]
+    assert _lint(catalog, "UI.Nothing()") == ["line 1:1: UI.Nothing 不在 API 文档（lua_atomic_modules_call_guide.md）中"]
+    # 非 API 模块的调用不检查
+    assert _lint(catalog, "string.format('%d', 1)\nMyLib.Anything()") == []
+
+
+def test_unknown_method_on_actor(catalog):
+    code = 'local npc = World.SpawnNPC("NPC_A", "阿福", loc)\nnpc:GiveItm("Item_Herb", 1)\nnpc = nil\nnpc:Foo()'
+    assert _lint(catalog, code) == ["line 2:1: npc:GiveItm 不是 Entity / Performer 接口中的方法，是否为 npc:GiveItem？"]
+
+
+def test_supplement_only_for_documented_modules(catalog):
+    # 合成文档没有 Env 模块：不补 Env 函数
+    assert "Env" not in catalog["modules"]
+    env = api_catalog.build_catalog("## Env\n- `Env.SetBlockRotation(block,yawDeg) -> bool`\n")["modules"]["Env"]
+    assert env["BlockGridToBlockLocalPos"]["line"] is None
+    assert api_catalog.format_signature(env["SetBlockRotation"]) == "Env.SetBlockRotation(block, yawDeg: number, [flag: bool]) -> bool"
+
+
+def test_optional_trailing_param():
+    catalog = api_catalog.build_catalog("## Env\n- `Env.SetBlockRotation(block,yawDeg) -> bool`\n")
+    assert _lint(catalog, "Env.SetBlockRotation(b, 0)\nEnv.SetBlockRotation(b, 0, true)") == []
+    assert len(_lint(catalog, "Env.SetBlockRotation(b)")) == 1
+    assert len(_lint(catalog, "Env.SetBlockRotation(b, 0, true, 1)")) == 1
+
+
+@pytest.mark.parametrize("name", [
+    "setup_template.lua", "step1_start.lua", "step2_map_generate.lua", "step3_npc_located.lua", "step5_gamestart.lua",
+])
+def test_shipped_lua_matches_guide(name):
+    # 固定模板与阶段代码按真实文档（及 _SUPPLEMENT / _OPTIONAL_PARAMS）检查，不应有未知函数或实参个数错误
+    source = (Path(__file__).resolve().parent.parent / name).read_text(encoding="utf-8")
+    assert lint_api_calls(source) == []
+
+
+def test_real_guide_has_core_modules():
+    modules = api_catalog.get_catalog()["modules"]
+    assert {"World", "UI", "Time", "Math"} <= set(modules)
+    assert modules["World"]["SpawnEncounter"]["params"] == ["loc", "range", "npcData", "luaType", "code"]
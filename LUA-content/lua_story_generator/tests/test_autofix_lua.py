@@ -0,0 +1,75 @@
+"""autofix_lua：每个修复类别一对修复前 / 修复后的代码（修复后应回到通过校验的 Encounter）。"""
+import pytest
+
+from autofix_lua import autofix_encounter
+from conftest import ASSETS, ENCOUNTER
+from validate_lua import validate_encounter
+
+GUARD = "if _G.enc01_done then return end\n"
+MARK = "_G.enc01_done = true\n"
+
+# 类别 -> (修复前, 修复后)
+CASES = {
+    "done_guard": (ENCOUNTER.replace(GUARD + MARK, ""), ENCOUNTER),
+    "is_valid": (ENCOUNTER.replace("if not npc or not npc:IsValid() then return end\n", ""), ENCOUNTER),
+    "ask_compare": (ENCOUNTER.replace('if r == "答应" then', "if r == true then"), ENCOUNTER),
+    "asset_id": (ENCOUNTER.replace('"Item_Herb"', '"Item_Herbs"'), ENCOUNTER),
+}
+
+
+@pytest.mark.parametrize("category", CASES)
+def test_autofix_category(category):
+    before, after = CASES[category]
+    assert validate_encounter(before, ASSETS) != []
+    fixed, applied = autofix_encounter(before, ASSETS, done_key="enc01_done")
+    assert applied == [category]
+    assert fixed == after.strip()
+    assert validate_encounter(fixed, ASSETS) == []
+
+
+def test_done_guard_half_present_uses_existing_key():
+    before = ENCOUNTER.replace(MARK, "").replace("enc01_done", "enc07_done")
+    fixed, applied = autofix_encounter(before, ASSETS)
+    assert applied == ["done_guard"]
+    assert fixed == ENCOUNTER.replace("enc01_done", "enc07_done").strip()
+
+
+def test_done_guard_without_key_is_left_to_llm():
+    before = ENCOUNTER.replace(GUARD + MARK, "")
+    assert autofix_encounter(before, ASSETS) == (before, [])
+
+
+def test_ask_compare_letter_maps_to_option():
+    fixed, applied = autofix_encounter(ENCOUNTER.replace('if r == "答应" then', "if r == 'B' then"), ASSETS)
+    assert applied == ["ask_compare"]
+    assert "if r == \"拒绝\" then" in fixed
+
+
+def test_asset_id_case_insensitive_match():
+    fixed, applied = autofix_encounter(ENCOUNTER.replace('"Item_Herb"', '"ITEM_HERB"'), ASSETS)
+    assert applied == ["asset_id"]
+    assert fixed == ENCOUNTER.strip()
+
+
+def test_asset_id_without_close_match_is_left_to_llm():
+    before = ENCOUNTER.replace('"Item_Herb"', '"Potato"')
+    assert autofix_encounter(before, ASSETS) == (before, [])
+
+
+def test_clean_and_unparsable_code_unchanged():
+    assert autofix_encounter(ENCOUNTER, ASSETS) == (ENCOUNTER, [])
+    broken = ENCOUNTER.replace("end\n\nfunction", "\n\nfunction")
+    assert autofix_encounter(broken, ASSETS) == (broken, [])
+
+
+def test_quoted_embedded_code_skips_line_inserts():
+    # code 写在引号字符串中时不插入新行（行列与原文不一一对应），其它修复照常
+    before = (
+        'function SpawnEncounter_01()\n'
+        '    local code = "local npc = World.GetByID(\\"NPC_A\\") npc:GiveItem(\\"Item_Herbs\\", 1)"\n'
+        '    World.SpawnEncounter({X = 1, Y = 2, Z = 90}, 300, {}, "Trigger", code)\n'
+        'end'
+    )
+    fixed, applied = autofix_encounter(before, ASSETS, done_key="enc01_done")
+    assert applied == []
+    assert fixed == before
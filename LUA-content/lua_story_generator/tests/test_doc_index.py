@@ -0,0 +1,74 @@
+"""doc_index：点名 API 的查询优先返回文档中定义它的小节；空查询 / 无命中的查询返回空结果。"""
+import pytest
+
+import doc_index
+from doc_index import DocIndex, terms
+
+GUIDE = """\
+# Narrative API
+
+## 3.2 `World`
+- `World.SpawnNPC(type, name, loc)` -> `Actor`
+- `World.SpawnEncounter(loc, range, npcData, luaType, code)` -> `Actor|nil`
+示例：`World.SpawnEncounter({X=0,Y=0,Z=0}, 400, {npc_a="Default"}, "EnterVolume", "Log('enc')")`
+""" + "\n".join(f"- `World.Helper{i}(x)` -> `nil`，说明文字 {i}" for i in range(40)) + """
+
+## 3.3 `UI`
+- `UI.Ask(msg, btnA, btnB)` -> `string`（异步）
+- `UI.Toast(msg)` -> `nil`
+"""
+
+RULE = """\
+6. Encounter 开发规范
+每个奇遇文件写一个 SpawnEncounter_XXX()，内部调用 World.SpawnEncounter。
+SpawnEncounter 的 code 在玩家进入范围后执行，SpawnEncounter 范围建议 200。
+
+7. 对话模块
+对话使用 UI.Toast 提示。
+"""
+
+
+@pytest.fixture
+def index():
+    return DocIndex({"guide.md": GUIDE, "rule.md": RULE}, (), 600)
+
+
+def test_terms_camel_and_cjk():
+    assert terms("World.SpawnEncounter") == ["world", "spawnencounter", "spawn", "encounter"]
+    assert terms("奇遇生成") == ["奇遇", "遇生", "生成"]
+
+
+@pytest.mark.parametrize("query", ["SpawnEncounter", "World.SpawnEncounter", "生成 SpawnEncounter 奇遇"])
+def test_api_query_ranks_defining_section_first(index, query):
+    # rule.md 的短小节多次提到 SpawnEncounter，仍应排在定义它的（较长的）World 小节之后
+    (first, _), *rest = index.search(query, 5)
+    assert (first["source"], first["title"]) == ("guide.md", "Narrative API > 3.2 `World`")
+    assert any(c["source"] == "rule.md" for c, _ in rest)
+
+
+def test_method_and_module_queries(index):
+    assert index.search("UI.Ask", 1)[0][0]["title"] == "Narrative API > 3.3 `UI`"
+
+
+@pytest.mark.parametrize("query", ["", "   ", "zzqx qqq", "！？"])
+def test_empty_or_unknown_query(index, query):
+    assert index.search(query, 5) == []
+    assert index.retrieve(query, 1000, 5) == []
+
+
+def test_retrieve_respects_budget_and_doc_order(index):
+    chunks = index.retrieve("SpawnEncounter UI.Toast", 10_000, 5)
+    assert [c["id"] for c in chunks] == sorted(c["id"] for c in chunks)
+    small = index.retrieve("SpawnEncounter UI.Toast", 60, 5)
+    assert sum(c["tokens"] for c in small) <= 60
+
+
+def test_real_guide_spawn_encounter_section_first():
+    (first, _), = doc_index.get_doc_index().search("SpawnEncounter", 1)
+    assert first["source"] == doc_index.config.LUA_API_DOC
+    assert "World.SpawnEncounter(loc, range, npcData, luaType, code)" in first["text"]
+
+
+def test_retrieve_docs_empty_query(capsys):
+    assert doc_index.retrieve_docs("", 500) == ""
+    assert "Retrieved 0 sections" in capsys.readouterr().err
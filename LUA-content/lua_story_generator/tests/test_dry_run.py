@@ -0,0 +1,56 @@
+"""dry_run：指令预算 / 墙钟上限终止死循环，nil 索引报告行列与变量名，encounter 触发与重复触发检查。"""
+from conftest import ENCOUNTER
+from dry_run import dry_run
+
+
+def _run(code, **kwargs):
+    # 只执行给定代码，不带固定阶段（InitMap / StartGame）
+    return dry_run(code, init_map="", start_game="", **kwargs)
+
+
+def test_budget_kills_infinite_loop():
+    report = _run("local i = 0\nwhile true do\n  i = i + 1\nend", budget=5000)
+    assert not report["ok"]
+    assert report["errors"] == ["[InitEvent] line 3: instruction budget exceeded (5000 steps)（疑似死循环）"]
+    assert report["stages"][0]["steps"] == 5001
+
+
+def test_timeout_kills_loop_under_large_budget():
+    report = _run("while true do end", budget=10 ** 9, timeout=0.2)
+    assert report["errors"] == ["[InitEvent] line 1: time limit exceeded（疑似死循环）"]
+    assert report["wall_ms"] < 5000
+
+
+def test_budget_is_per_stage():
+    loop = "for i = 1, 300 do local x = i end"
+    report = dry_run(loop, init_map=loop, start_game=loop, budget=2000)
+    assert report["ok"]
+    assert [s["stage"] for s in report["stages"]] == ["InitMap", "InitEvent", "StartGame"]
+
+
+def test_nil_index_reports_local():
+    report = _run("local t = nil\nlocal x = t.field")
+    assert report["errors"] == ["[InitEvent] line 2:11: attempt to index a nil value (local 't')"]
+
+
+def test_nil_index_reports_global_and_field():
+    assert _run("x = undefined_table.k")["errors"] == [
+        "[InitEvent] line 1:5: attempt to index a nil value (global 'undefined_table')"]
+    report = _run("local p = World.GetByID('Player')\nlocal q = p.Missing.X")
+    assert report["errors"] == ["[InitEvent] line 2:11: attempt to index a nil value (field 'Missing')"]
+
+
+def test_encounter_fires_once_with_done_guard():
+    report = _run(ENCOUNTER + "\nSpawnEncounter_01()")
+    assert report["ok"]
+    assert report["counts"]["World.SpawnEncounter"] == 1
+    [enc] = report["encounters"]
+    assert enc["stage"] == "Encounter[1]" and enc["ok"]
+    assert enc["retrigger_calls"] == 0
+
+
+def test_encounter_without_done_guard_warns_on_retrigger():
+    code = ENCOUNTER.replace("if _G.enc01_done then return end\n", "") + "\nSpawnEncounter_01()"
+    report = _run(code)
+    assert report["encounters"][0]["retrigger_calls"] > 0
+    assert any("重复触发时仍调用了" in w for w in report["warnings"])
@@ -0,0 +1,114 @@
+"""lua_parser：长字符串、goto / 标签、位运算、<const>/<close>、语法错误位置。"""
+import sys
+
+import pytest
+
+from lua_parser import LuaSyntaxError, parse, tokenize, walk
+
+
+def _kinds(node):
+    return [n.kind for n in walk(node)]
+
+
+def test_long_string_levels_and_body_position():
+    chunk = parse('local s = [==[\nab]]c]==]\nlocal t = "x"')
+    s = chunk.body[0].exprs[0]
+    # 开头的换行不属于正文，正文从下一行第 1 列开始；]] 在 level 2 的长字符串中不结束
+    assert s.value == "ab]]c"
+    assert (s.line, s.body_line, s.body_col) == (1, 2, 1)
+    assert chunk.body[1].line == 3
+
+
+def test_long_comment_keeps_line_numbers():
+    chunk = parse("--[[ a\nb\nc ]] x = 1\n--[==[\n]]\n]==]\ny = 2")
+    assert [(s.line, s.col) for s in chunk.body] == [(3, 6), (7, 1)]
+
+
+def test_short_string_escapes():
+    chunk = parse('x = "a\\tb\\65\\x42\\u{4E2D}\\z\n        c"')
+    assert chunk.body[0].exprs[0].value == "a\tbAB中c"
+
+
+def test_goto_and_label():
+    chunk = parse("for i = 1, 3 do\n  if i == 2 then goto continue end\n  ::continue::\nend")
+    kinds = _kinds(chunk)
+    assert "Goto" in kinds and "Label" in kinds
+    goto = next(n for n in walk(chunk) if n.kind == "Goto")
+    label = next(n for n in walk(chunk) if n.kind == "Label")
+    assert goto.label == label.name == "continue"
+    assert (label.line, label.col) == (3, 3)
+
+
+def test_bitwise_precedence():
+    # | < ~ < & < 移位 < 连接 < 加减 < 乘除（lparser.c）
+    e = parse("a = 1 | 2 ~ 3 & 4 << 1 >> 2 // 3").body[0].exprs[0]
+    assert (e.op, e.right.op, e.right.right.op) == ("|", "~", "&")
+    shift = e.right.right.right
+    assert (shift.op, shift.left.op, shift.right.op) == (">>", "<<", "//")
+
+
+def test_unary_bnot_and_binary_xor():
+    chunk = parse("a = ~b\nc = d ~ e\nf = ~~g")
+    assert (chunk.body[0].exprs[0].kind, chunk.body[0].exprs[0].op) == ("UnOp", "~")
+    assert (chunk.body[1].exprs[0].kind, chunk.body[1].exprs[0].op) == ("BinOp", "~")
+    assert chunk.body[2].exprs[0].operand.op == "~"
+
+
+def test_local_attribs():
+    local = parse("local x <const>, y <close>, z = 1, nil, 3").body[0]
+    assert local.names == ["x", "y", "z"]
+    assert local.attribs == ["const", "close", None]
+
+
+def test_minus_is_not_comment_start():
+    tokens = tokenize("a = b - -c --d\ne = 1")
+    assert [t[0] for t in tokens] == ["name", "=", "name", "-", "-", "name", "name", "=", "number", "<eof>"]
+
+
+def test_embedded_start_position():
+    # 嵌入代码（SpawnEncounter 的 code 字符串）按外层文件中的位置报告
+    chunk = parse("x = 1\ny = 2", 5, 10)
+    assert [(s.line, s.col) for s in chunk.body] == [(5, 10), (6, 1)]
+
+
+@pytest.mark.parametrize("source, line, col, msg", [
+    ("local x = = 1", 1, 11, "unexpected symbol near '='"),
+    ('x = "abc', 1, 5, "unfinished string"),
+    ("local s = [[abc", 1, 11, "unfinished long string"),
+    ("--[[ never closed", 1, 1, "unfinished long comment"),
+    ("if x then", 1, 10, "'end' expected"),
+    ("local x <foo> = 1", 1, 10, "unknown attribute 'foo'"),
+    ("goto", 1, 5, "<name> expected"),
+    ("x = 1 @", 1, 7, "unexpected symbol near '@'"),
+    ("f(\n\n  )) ", 3, 4, "unexpected symbol near ')'"),
+])
+def test_syntax_error_positions(source, line, col, msg):
+    with pytest.raises(LuaSyntaxError) as info:
+        parse(source)
+    err = info.value
+    assert (err.line, err.col) == (line, col)
+    assert msg in err.msg
+    assert str(err).startswith(f"line {line}:{col}: ")
+
+
+def test_syntax_error_position_with_offset():
+    with pytest.raises(LuaSyntaxError) as info:
+        parse("x = 1\ny = @", 5, 10)
+    assert (info.value.line, info.value.col) == (6, 5)
+
+
+@pytest.mark.parametrize("source", [
+    "x = " + "(" * 300 + "1" + ")" * 300,
+    "do " * 300 + "end " * 300,
+    "x = " + "f(" * 300 + ")" * 300,
+])
+def test_deep_nesting_is_a_syntax_error(source):
+    # 嵌套上限不依赖 Python 递归上限（lua_runtime 执行时会调高它）
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(50000)
+    try:
+        with pytest.raises(LuaSyntaxError, match="too many syntax levels"):
+            parse(source)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert parse("x = " + "(" * 150 + "1" + ")" * 150).body
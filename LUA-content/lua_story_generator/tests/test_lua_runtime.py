@@ -0,0 +1,58 @@
+"""lua_runtime：递归深度、64 位整数回绕与移位、位置捕获 ()。"""
+import pytest
+
+from lua_runtime import MAX_DEPTH, Interpreter, LuaError
+
+
+@pytest.fixture
+def interp():
+    return Interpreter()
+
+
+def test_deep_recursion_within_max_depth(interp):
+    code = "local function f(n) if n == 0 then return 0 end return 1 + f(n - 1) end return f(%d)"
+    assert interp.run(code % (MAX_DEPTH - 10)) == [MAX_DEPTH - 10]
+
+
+def test_unbounded_recursion_is_stack_overflow(interp):
+    with pytest.raises(LuaError, match=r"line 1:27: stack overflow"):
+        interp.run("local function f() return f() + 1 end f()")
+    # 出错后深度复位，仍可继续执行
+    assert interp.run("return 1") == [1]
+
+
+def test_custom_max_depth():
+    interp = Interpreter(max_depth=50)
+    with pytest.raises(LuaError, match="stack overflow"):
+        interp.run("local function f(n) if n == 0 then return 0 end return 1 + f(n - 1) end return f(100)")
+
+
+def test_integer_wraparound(interp):
+    assert interp.run("return math.maxinteger + 1 == math.mininteger") == [True]
+    assert interp.run("return math.mininteger - 1") == [2 ** 63 - 1]
+    assert interp.run("return math.maxinteger * 2") == [-2]
+    assert interp.run("return -math.mininteger") == [-2 ** 63]
+    assert interp.run("return math.mininteger // -1") == [-2 ** 63]
+    # 浮点运算不回绕
+    assert interp.run("return math.maxinteger + 1.0") == [2.0 ** 63]
+
+
+def test_shifts_are_logical(interp):
+    assert interp.run("return 1 << 63") == [-2 ** 63]
+    assert interp.run("return 1 << 64") == [0]
+    assert interp.run("return -1 >> 63") == [1]
+    assert interp.run("return 1 << -1") == [0]
+    assert interp.run("return 5 & 3, 5 | 3, 5 ~ 3, ~0") == [1, 7, 6, -1]
+
+
+def test_position_captures(interp):
+    assert interp.run("return string.find('hello', '()ll()')") == [3, 4, 3, 5]
+    assert interp.run("return string.match('abc', '()b()')") == [2, 3]
+    assert interp.run("return string.gsub('abc', '()', '%1')") == ["1a2b3c4", 4]
+    assert interp.run("local t = {} for p in string.gmatch('a,b', '()[^,]+') do t[#t + 1] = p end return table.concat(t, ' ')") == ["1 3"]
+
+
+def test_number_literals_not_shared_between_nodes(interp):
+    # 同一字面量文本在不同位置的值一致（曾按节点 id 缓存，节点回收后取到旧值）
+    code = "local function f(n) if n == 0 then return 0 end return 1 + f(n - 1) end return f(500), 699"
+    assert interp.run(code) == [500, 699]
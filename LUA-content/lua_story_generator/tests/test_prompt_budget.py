@@ -0,0 +1,108 @@
+"""prompt_budget：中日韩感知的 count_tokens、trim 各模式、PromptBudget.build 的预算分配。"""
+import pytest
+
+from prompt_budget import PromptBudget, count_tokens, trim
+
+PARAS = [f"para{i} " + "word " * 30 for i in range(10)]
+TEXT = "\n\n".join(PARAS)
+
+
+@pytest.mark.parametrize("text, n", [
+    ("", 0),
+    ("你好世界", 4),  # 中日韩按字计
+    ("こんにちは", 5),
+    ("hello", 1),
+    ("abcdefghijklm", 3),  # 长单词按子词计：1 + (13 - 1) // 6
+    ("1234567", 3),  # 数字 3 位一组
+    ("a, b", 3),  # 标点单独计，单个空格不计
+    ("生成 NPC 阿福", 5),
+])
+def test_count_tokens(text, n):
+    assert count_tokens(text) == n
+
+
+def test_short_text_untouched():
+    assert trim("短文本", 100) == "短文本"
+    assert trim(TEXT, 0) == ""
+
+
+@pytest.mark.parametrize("mode", ["head", "tail", "head_tail"])
+def test_trim_modes_respect_budget(mode):
+    out = trim(TEXT, 100, mode)
+    assert count_tokens(out) <= 100
+    assert "…（省略约" in out
+    blocks = out.split("\n\n")
+    if mode == "head":
+        assert blocks[0] == PARAS[0].strip("\n") and blocks[-1].startswith("…")
+    elif mode == "tail":
+        assert blocks[0].startswith("…") and blocks[-1] == PARAS[-1]
+    else:
+        assert blocks[0] == PARAS[0] and blocks[-1] == PARAS[-1]
+        assert any(b.startswith("…") for b in blocks[1:-1])
+
+
+def test_trim_relevant_keeps_matching_paragraph():
+    paras = PARAS[:]
+    paras[6] = "SpawnEncounter bandit camp near the village " + "word " * 25
+    out = trim("\n\n".join(paras), 100, "relevant", query="SpawnEncounter bandit")
+    blocks = out.split("\n\n")
+    assert count_tokens(out) <= 100
+    # 第一段总是保留，其余按相关度选取，输出保持原顺序，被省略处留标记
+    assert blocks[0] == paras[0]
+    assert paras[6] in blocks
+    assert blocks.index(paras[6]) > 0 and blocks[1].startswith("…")
+
+
+def test_trim_items():
+    assert trim("a, b, c, d, e, f, g, h", 5, unit="item") == "a, b…"
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        trim(TEXT, 50, "middle")
+
+
+def test_build_respects_budget_and_fixed_parts():
+    pb = PromptBudget("test", "any-model", budget=300)
+    system = pb.fixed("system", "你是剧情生成助手。" * 10)
+    pb.add("story", TEXT, priority=1, max_tokens=150)
+    pb.add("previous", TEXT, priority=2, mode="tail")
+    pb.add("lazy", lambda n: "x " * n, priority=3, min_tokens=5)
+    out = pb.build()
+    # 固定部分不裁剪，只计数
+    assert system == "你是剧情生成助手。" * 10
+    fixed = count_tokens(system)
+    used = {name: count_tokens(text) for name, text in out.items()}
+    assert used["story"] <= 150
+    assert used["previous"] <= 300 - fixed - used["story"]
+    assert out["previous"].startswith("…")
+    # callable 段按剩余预算生成
+    assert used["lazy"] == 300 - fixed - used["story"] - used["previous"]
+    assert sum(used.values()) + fixed <= 300
+
+
+def test_build_min_tokens_when_budget_exhausted():
+    pb = PromptBudget("test", "any-model", budget=10)
+    pb.fixed("system", "你是剧情生成助手。" * 10)
+    pb.add("lazy", lambda n: "x " * n, priority=1, min_tokens=5)
+    pb.add("optional", TEXT, priority=2)
+    out = pb.build()
+    assert out == {"lazy": "x " * 5, "optional": ""}
+
+
+def test_build_relevant_section():
+    paras = PARAS[:]
+    paras[8] = "SpawnEncounter ambush on the mountain road " + "word " * 25
+    pb = PromptBudget("test", "any-model", budget=120)
+    pb.add("docs", "\n\n".join(paras), priority=1, mode="relevant", query="SpawnEncounter ambush")
+    out = pb.build()["docs"]
+    assert count_tokens(out) <= 120 and paras[8] in out.split("\n\n")
+
+
+def test_build_logs_usage(capsys):
+    pb = PromptBudget("step2", "any-model", budget=200)
+    pb.fixed("system", "系统提示")
+    pb.add("story", TEXT, priority=1)
+    pb.build()
+    err = capsys.readouterr().err
+    assert err.startswith("[Prompt] step2 (any-model): ") and "system 4" in err and f"/{count_tokens(TEXT)}" in err
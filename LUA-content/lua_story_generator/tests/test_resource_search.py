@@ -0,0 +1,83 @@
+"""resource_search.SearchIndex：前缀 / n-gram 子串检索、中文名、类型过滤与分页、reload_resource_index 后重建。"""
+import pytest
+
+import config
+import datatable_loader
+import resource_search
+from resource_search import PREFIX, SUBSTRING
+
+CSVS = {
+    "DT_SpawnNPCTable.csv": "---,ActorClass\nNPC_Blacksmith,BP_A\nNPC_Baker,BP_B\nNPC_Guard,BP_C\n",
+    "DT_EnemyDataTable.csv": "---,Hp\nWolf_Grey,10\nBandit_Leader,50\n",
+    "PropVilligeData.csv": "Symbol,Description,Actor\nWell,村口的古井,BP_Well\nAnvil,铁匠铺的铁砧,BP_Anvil\n",
+    "DT_Items.csv": ('---,ItemName,ItemType,ItemQuality\n'
+                     'Item_Herb,"NSLOCTEXT(""Items"", ""Herb"", ""止血草药"")",Consumable,Common\n'
+                     'Item_Sword,"NSLOCTEXT(""Items"", ""Sword"", ""铁剑"")",Weapon,Rare\n'),
+    "DT_AnimStartTable.csv": "---,Montage\nWave,M_Wave\nBow,M_Bow\n",
+    "DT_MontageTable.csv": "---,Montage\nBlacksmith_Hammer,M_Hammer\n",
+}
+
+
+@pytest.fixture
+def datatable(tmp_path, monkeypatch):
+    for name, text in CSVS.items():
+        (tmp_path / name).write_text(text, encoding="utf-8")
+    monkeypatch.setattr(datatable_loader, "DATATABLE_DIR", tmp_path)
+    monkeypatch.setattr(config, "DATATABLE_SNAPSHOT_ENABLED", False)
+    monkeypatch.setattr(datatable_loader, "_index", None)
+    monkeypatch.setattr(resource_search, "_search", None)
+    return tmp_path
+
+
+@pytest.fixture
+def index(datatable):
+    return resource_search.get_search_index()
+
+
+def _ids(result):
+    return [(e["type"], e["id"]) for e in result[1]]
+
+
+def test_prefix_hits_across_types(index):
+    assert _ids(index.search("b")) == [("enemies", "Bandit_Leader"), ("animations", "Blacksmith_Hammer"),
+                                       ("animations", "Bow")]
+    assert _ids(index.search("NPC_B")) == [("npcs", "NPC_Baker"), ("npcs", "NPC_Blacksmith")]
+    # 前缀只从 id / 名称 / 描述的开头匹配
+    assert _ids(index.search("blacksmith")) == [("animations", "Blacksmith_Hammer")]
+    assert index.search("smith") == (0, [])
+
+
+def test_substring_hits_via_ngrams(index):
+    assert _ids(index.search("smith", mode=SUBSTRING)) == [("npcs", "NPC_Blacksmith"),
+                                                            ("animations", "Blacksmith_Hammer")]
+    # 短查询（≤ 3 字符）直接取倒排表
+    assert _ids(index.search("ldr", mode=SUBSTRING)) == []
+    assert ("enemies", "Bandit_Leader") in _ids(index.search("lea", mode=SUBSTRING))
+    assert index.search("no_such_thing", mode=SUBSTRING) == (0, [])
+
+
+def test_cjk_names_and_descriptions(index):
+    # 物品显示名来自 NSLOCTEXT，道具按描述检索
+    assert _ids(index.search("止血")) == [("items", "Item_Herb")]
+    assert _ids(index.search("铁", mode=SUBSTRING)) == [("props", "Anvil"), ("items", "Item_Sword")]
+    assert _ids(index.search("古井", mode=SUBSTRING)) == [("props", "Well")]
+    assert _ids(index.search("铁匠铺的铁砧", mode=SUBSTRING)) == [("props", "Anvil")]
+
+
+def test_type_filter_and_pagination(index):
+    total, page = index.search("", types=["npcs"], offset=1, limit=1)
+    assert total == 3 and [e["id"] for e in page] == ["NPC_Blacksmith"]
+    assert _ids(index.search("blacksmith", types=["animations"], mode=PREFIX)) == [("animations", "Blacksmith_Hammer")]
+    assert index.search("b", types=["props", "items"])[0] == 0
+
+
+def test_rebuilt_after_reload(datatable, index):
+    assert index.search("iron")[0] == 0
+    (datatable / "DT_Items.csv").write_text(CSVS["DT_Items.csv"] + "Item_Iron,Iron Ore,Material,Common\n", encoding="utf-8")
+    # 未重载前仍返回同一索引
+    assert resource_search.get_search_index() is index
+    datatable_loader.reload_resource_index()
+    rebuilt = resource_search.get_search_index()
+    assert rebuilt is not index and rebuilt.index is datatable_loader.get_resource_index()
+    assert _ids(rebuilt.search("iron")) == [("items", "Item_Iron")]
+    assert _ids(rebuilt.search("ore", mode=SUBSTRING)) == [("items", "Item_Iron")]
@@ -0,0 +1,29 @@
+"""/api/send-to-unreal：按内容哈希去重，不把代码正文留在内存中。"""
+import main
+import stage_hashes
+import tcp_server
+
+
+def test_dedup_by_hash_without_storing_body(monkeypatch):
+    sent = []
+    monkeypatch.setattr(tcp_server, "send_to_unreal_clients", lambda obj: sent.append(obj) or 0)
+    monkeypatch.setattr(main, "_send_dedup", {})
+    code = "-- send_to_unreal dedup test\nprint(1)"
+    req = main.SendToUnrealRequest(type="InitEvent", code=code)
+
+    assert "deduped" not in main.send_to_unreal(req)
+    assert main.send_to_unreal(req)["deduped"] is True
+    assert sent == [{"Type": "InitEvent", "Code": code}]
+    assert stage_hashes.get_stage_body(stage_hashes.stage_hash(code)) is None
+    assert list(main._send_dedup) == [("InitEvent", stage_hashes.stage_hash(code))]
+
+
+def test_dedup_window_expires(monkeypatch):
+    sent = []
+    monkeypatch.setattr(tcp_server, "send_to_unreal_clients", lambda obj: sent.append(obj) or 0)
+    monkeypatch.setattr(main, "_send_dedup", {})
+    monkeypatch.setattr(main, "_SEND_DEDUP_WINDOW", 0.0)
+    req = main.SendToUnrealRequest(type="InitEvent", code="x = 1")
+    main.send_to_unreal(req)
+    main.send_to_unreal(req)
+    assert len(sent) == 2
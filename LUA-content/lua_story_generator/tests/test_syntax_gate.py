@@ -0,0 +1,97 @@
+"""本地语法检查：parse_checked / check_syntax，以及 orchestrator._check_step 的提前返回与 AST 复用、耗时预算。"""
+import os
+import time
+from pathlib import Path
+
+import orchestrator
+import validate_lua
+from validate_lua import check_syntax, parse_checked
+
+
+def test_parse_checked_ok(encounter):
+    chunk, errors = parse_checked(encounter)
+    assert errors == []
+    assert chunk.kind == "Chunk"
+
+
+def test_parse_checked_outer_error():
+    chunk, errors = parse_checked("local x = 1\nif x then\n")
+    assert chunk is None
+    # 代码先 strip，结尾位置在最后一个字符之后
+    assert errors == ["Lua 语法错误: line 2:10: 'end' expected near <eof>"]
+
+
+def test_parse_checked_embedded_error(encounter):
+    # SpawnEncounter 的 code 字符串也要检查，位置为外层文件中的行列
+    code = encounter.replace("_G.enc01_done = true", "_G.enc01_done = = true")
+    chunk, errors = parse_checked(code)
+    assert chunk is None
+    assert len(errors) == 1 and errors[0].startswith("Lua 语法错误: line 4:17: ")
+
+
+def test_parse_checked_embedded_via_quoted_local():
+    code = 'local code = "if x then"\nWorld.SpawnEncounter(loc, 300, {}, "Trigger", code)'
+    chunk, errors = parse_checked(code)
+    assert chunk is None
+    assert errors[0].startswith("Lua 语法错误: line 1:")
+
+
+def test_check_syntax_matches_parse_checked():
+    assert check_syntax("x = 1") == []
+    assert check_syntax("x = ") == parse_checked("x = ")[1] != []
+
+
+def test_check_step_returns_syntax_errors_without_validating(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("validators must not run after a syntax error")
+
+    monkeypatch.setattr(orchestrator, "validate_encounter", fail)
+    monkeypatch.setattr(orchestrator, "lint_api_calls", fail)
+    before = orchestrator._validation_stats["syntax_failures"]
+    for is_encounter in (True, False):
+        errors, warnings = orchestrator._check_step("if x then", {}, is_encounter)
+        assert len(errors) == 1 and errors[0].startswith("Lua 语法错误: ")
+        assert warnings == []
+    assert orchestrator._validation_stats["syntax_failures"] == before + 2
+
+
+def test_check_step_passes_parsed_chunk(monkeypatch, encounter, assets):
+    seen = []
+    monkeypatch.setattr(orchestrator, "validate_encounter", lambda code, a, chunk: seen.append(chunk) or [])
+    monkeypatch.setattr(orchestrator, "lint_api_calls", lambda code, chunk: seen.append(chunk) or ["lint"])
+    assert orchestrator._check_step(encounter, assets, True) == ([], ["lint"])
+    assert orchestrator._check_step("UI.Toast('hi')", assets, False) == ([], ["lint"])
+    assert [c.kind for c in seen] == ["Chunk", "Chunk", "Chunk"]
+
+
+def test_check_step_api_findings_are_warnings(encounter, assets):
+    # 签名表确认完整前，API 调用问题不进入 CODING_FIX
+    errors, warnings = orchestrator._check_step('UI.Toast("a", "b", "c")', {}, False)
+    assert errors == []
+    assert len(warnings) == 1 and "UI.Toast 实参个数 3 与文档签名不符" in warnings[0]
+    errors, warnings = orchestrator._check_step(encounter.replace('UI.Toast("获得草药")', "UI.Tost()"), assets, True)
+    assert errors == [] and "UI.Tost 不在 API 文档" in warnings[0]
+
+
+def test_check_step_api_findings_strict(monkeypatch, encounter, assets):
+    monkeypatch.setattr(orchestrator.config, "API_LINT_STRICT", True)
+    errors, warnings = orchestrator._check_step('UI.Toast("a", "b", "c")', {}, False)
+    assert warnings == [] and "UI.Toast 实参个数 3 与文档签名不符" in errors[0]
+    errors, warnings = orchestrator._check_step(encounter.replace('UI.Toast("获得草药")', "UI.Tost()"), assets, True)
+    assert warnings == [] and any("UI.Tost 不在 API 文档" in e for e in errors)
+
+
+def test_syntax_gate_timing_budget():
+    # 最大的阶段代码（step2_map_generate.lua，约 19 KB / 6000 tokens）冷解析取 7 次最好成绩。
+    # 实测（单 vCPU Intel Xeon，Python 3.11.7）最好 6.5~11 ms、中位数 9~10 ms，共享 CPU 抖动大；
+    # 默认预算 25 ms 只拦截数量级的退化，可用 SYNTAX_GATE_BUDGET_MS 收紧
+    budget = float(os.environ.get("SYNTAX_GATE_BUDGET_MS", "25"))
+    source = (Path(__file__).resolve().parent.parent / "step2_map_generate.lua").read_text(encoding="utf-8")
+    best = float("inf")
+    for _ in range(7):
+        validate_lua._ast_cache.clear()
+        t0 = time.perf_counter()
+        chunk, errors = parse_checked(source)
+        best = min(best, (time.perf_counter() - t0) * 1000)
+        assert chunk is not None and errors == []
+    assert best < budget, f"syntax gate took {best:.1f} ms (budget {budget} ms)"
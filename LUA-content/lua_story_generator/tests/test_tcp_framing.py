@@ -0,0 +1,138 @@
+"""tcp_framing：Framer 的 line / length 切帧、分段到达、pipelining、超长帧跳过；Codec 的标志位、msgpack / json、zlib。"""
+import json
+import zlib
+
+import pytest
+
+import tcp_framing
+from tcp_framing import JSON, LENGTH, LINE, MSGPACK, ZLIB, Codec, CodecError, Framer, FrameTooLarge
+
+MESSAGE = {"cmd": "run_lua", "req_id": 7, "code": "UI.Toast('阿福')\n" * 50, "ok": True, "n": 1.5}
+
+
+def _frames(framer):
+    out = []
+    while (frame := framer.next_frame()) is not None:
+        out.append(frame)
+    return out
+
+
+@pytest.mark.parametrize("mode", [LINE, LENGTH])
+def test_round_trip_and_pipelining(mode):
+    framer = Framer(1024, mode)
+    payloads = [b'{"cmd": "a"}', b"", b'{"cmd": "b"}']
+    framer.feed(b"".join(framer.encode(p) for p in payloads))
+    assert _frames(framer) == payloads
+    assert framer.buffered() == 0
+
+
+@pytest.mark.parametrize("mode", [LINE, LENGTH])
+def test_split_reads(mode):
+    framer = Framer(1024, mode)
+    wire = framer.encode(b'{"script": "' + b"x" * 100 + b'"}') + framer.encode(b"{}")
+    out = []
+    for i in range(len(wire)):  # 逐字节到达
+        framer.feed(wire[i:i + 1])
+        out += _frames(framer)
+    assert out == [b'{"script": "' + b"x" * 100 + b'"}', b"{}"]
+
+
+def test_partial_frame_stays_buffered():
+    framer = Framer(1024, LINE)
+    framer.feed(b'{"a": 1}\n{"b"')
+    assert framer.next_frame() == b'{"a": 1}'
+    assert framer.next_frame() is None and framer.buffered() == 4
+    framer.feed(b": 2}\n")
+    assert framer.next_frame() == b'{"b": 2}'
+
+
+def test_line_oversize_frame_is_skipped():
+    framer = Framer(8, LINE)
+    framer.feed(b"0123456789")
+    with pytest.raises(FrameTooLarge):
+        framer.next_frame()
+    # 超长行的剩余部分被丢弃，不占缓冲
+    framer.feed(b"abcdef")
+    assert framer.next_frame() is None and framer.buffered() == 0
+    framer.feed(b"tail\nok\n")
+    assert _frames(framer) == [b"ok"]
+
+
+def test_line_oversize_complete_frame():
+    framer = Framer(8, LINE)
+    framer.feed(b"0123456789\nok\n")
+    with pytest.raises(FrameTooLarge):
+        framer.next_frame()
+    assert framer.next_frame() == b"ok"
+
+
+def test_length_oversize_frame_is_skipped():
+    framer = Framer(8, LENGTH)
+    big = (20).to_bytes(4, "big") + b"x" * 20
+    framer.feed(big[:10])
+    with pytest.raises(FrameTooLarge):
+        framer.next_frame()
+    framer.feed(big[10:] + framer.encode(b"ok"))
+    assert _frames(framer) == [b"ok"]
+
+
+def test_switch_mode_mid_stream():
+    # hello 握手后切换到 length 模式，已缓冲的字节按新模式解析
+    framer = Framer(1024, LINE)
+    framer.feed(b'{"cmd": "hello"}\n' + (2).to_bytes(4, "big") + b"{}")
+    assert framer.next_frame() == b'{"cmd": "hello"}'
+    framer.mode = LENGTH
+    assert framer.next_frame() == b"{}"
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        Framer(1024, "chunked")
+
+
+@pytest.mark.parametrize("name", tcp_framing.available_codecs())
+def test_codec_round_trip(name):
+    codec = Codec(name)
+    payload = codec.dumps(MESSAGE)
+    assert payload[:1] == b"\x00"  # 未压缩
+    assert codec.loads(payload) == MESSAGE
+
+
+def test_codec_flag_byte_and_formats():
+    assert Codec(JSON).dumps({"a": 1}) == b'\x00{"a": 1}'
+    if tcp_framing.msgpack is not None:
+        assert Codec(MSGPACK).dumps({"a": 1}) == b"\x00" + tcp_framing.msgpack.packb({"a": 1})
+    with pytest.raises(CodecError, match="Unknown payload flag"):
+        Codec(JSON).loads(b'\x07{"a": 1}')
+
+
+@pytest.mark.parametrize("name", tcp_framing.available_codecs())
+def test_codec_zlib_round_trip(name):
+    codec = Codec(name, compression=ZLIB, threshold=64, max_size=1 << 20)
+    small, big = codec.dumps({"a": 1}), codec.dumps(MESSAGE)
+    assert small[:1] == b"\x00"  # 小于阈值不压缩
+    assert big[:1] == b"\x01" and len(big) < len(Codec(name).dumps(MESSAGE))
+    assert codec.loads(small) == {"a": 1}
+    assert codec.loads(big) == MESSAGE
+
+
+def test_codec_zlib_bomb_exceeds_max_size():
+    bomb = b"\x01" + zlib.compress(b'["' + b"a" * (10 << 20) + b'"]', 9)
+    assert len(bomb) < 20_000
+    with pytest.raises(CodecError, match="exceeds 65536 bytes"):
+        Codec(JSON, compression=ZLIB, max_size=65536).loads(bomb)
+
+
+def test_codec_bad_payloads():
+    codec = Codec(JSON, compression=ZLIB)
+    with pytest.raises(CodecError, match="Invalid zlib payload"):
+        codec.loads(b"\x01not zlib")
+    with pytest.raises(CodecError, match="Invalid json payload"):
+        codec.loads(b"\x00{oops")
+    with pytest.raises(ValueError):
+        Codec("protobuf")
+
+
+def test_json_codec_keeps_utf8():
+    payload = Codec(JSON).dumps({"name": "阿福"})
+    assert "阿福".encode("utf-8") in payload and json.loads(payload[1:]) == {"name": "阿福"}
@@ -0,0 +1,96 @@
+"""tcp_server._Client 发送队列：drop_oldest 只淘汰推送，请求响应与控制帧总会发出。"""
+import asyncio
+import json
+
+import pytest
+
+import config
+import tcp_server
+
+
+class _Transport:
+    def __init__(self):
+        self.aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+
+class _Writer:
+    """记录写出的帧；drain 前等待 gate，模拟对端暂不读取。"""
+
+    def __init__(self):
+        self.frames: list[bytes] = []
+        self.transport = _Transport()
+        self.gate = asyncio.Event()
+
+    def get_extra_info(self, name):
+        return ("127.0.0.1", 50000)
+
+    def write(self, data):
+        self.frames.append(bytes(data))
+
+    async def drain(self):
+        await self.gate.wait()
+
+
+def _messages(writer):
+    return [json.loads(f) for f in writer.frames]
+
+
+@pytest.fixture
+def small_queue(monkeypatch):
+    monkeypatch.setattr(config, "TCP_SEND_QUEUE", 2)
+    monkeypatch.setattr(config, "TCP_SEND_POLICY", "drop_oldest")
+
+
+def test_broadcast_never_drops_queued_response(small_queue):
+    async def scenario():
+        writer = _Writer()
+        client = tcp_server._Client(asyncio.StreamReader(), writer)
+        await client.put({"ok": True, "full_script": "-- result", "req_id": 1})
+        for i in range(5):
+            client.send({"cmd": "push", "n": i}, {})
+        assert len(client.queue) == 2
+        client.start()
+        writer.gate.set()
+        await client.flush(1.0)
+        client.stop()
+        return client, writer
+
+    client, writer = asyncio.run(scenario())
+    messages = _messages(writer)
+    assert messages[0] == {"ok": True, "full_script": "-- result", "req_id": 1}
+    assert messages[1:] == [{"cmd": "push", "n": 4}]
+    assert client.dropped == 4
+
+
+def test_queue_full_of_responses_drops_the_push(small_queue):
+    async def scenario():
+        writer = _Writer()
+        client = tcp_server._Client(asyncio.StreamReader(), writer)
+        await client.put({"req_id": 1})
+        await client.put({"ok": True, "framing": "line"}, control=True)
+        client.send({"cmd": "push"}, {})
+        assert [type(d) for d in client.queue] == [tcp_server._Response, tcp_server._Control]
+        client.start()
+        writer.gate.set()
+        await client.flush(1.0)
+        client.stop()
+        return writer
+
+    assert _messages(asyncio.run(scenario())) == [{"req_id": 1}, {"ok": True, "framing": "line"}]
+
+
+def test_disconnect_policy_aborts_slow_client(small_queue, monkeypatch):
+    monkeypatch.setattr(config, "TCP_SEND_POLICY", "disconnect")
+
+    async def scenario():
+        writer = _Writer()
+        client = tcp_server._Client(asyncio.StreamReader(), writer)
+        for i in range(3):
+            client.send({"n": i}, {})
+        return client, writer
+
+    client, writer = asyncio.run(scenario())
+    assert client.closing and writer.transport.aborted
@@ -0,0 +1,114 @@
+"""validate_lua：每条规则一个通过、一个违规的例子；validate_encounter 的整体结果与语法错误回退。"""
+import pytest
+
+import validate_lua as v
+from lua_parser import parse
+
+# (规则, 通过的代码, 违规的代码, 错误信息片段)
+RULE_CASES = {
+    "done_guard": (
+        v.DoneGuardRule,
+        'if _G["enc01_done"] then return end\n_G.enc01_done = true',
+        "if _G.enc01_done then return end",
+        v.MSG_DONE_GUARD,
+    ),
+    "validity": (
+        v.ValidityRule,
+        'local npc = World.GetByID("NPC_A")\nif not npc or not npc:IsValid() then return end',
+        'local npc = World.GetByID("NPC_A")\nlocal p = World.GetByID("Player")\nif not p:IsValid() then return end',
+        f"{v.MSG_GETBYID_UNCHECKED}（npc）",
+    ),
+    "reward": (
+        v.RewardRule,
+        'npc:GiveItem("Item_Herb", 1)\nUI.Toast("获得草药")',
+        'UI.Toast("获得草药")',
+        v.MSG_TOAST_REWARD,
+    ),
+    "ask_compare": (
+        v.AskCompareRule,
+        'local r = UI.Ask("q", "答应", "拒绝")\nif r == "答应" then end',
+        'local r = UI.AskMany("q", {"答应", "拒绝"})\nif r == "A" then end',
+        v.MSG_ASK_COMPARE,
+    ),
+    "encounter_loc": (
+        v.EncounterLocRule,
+        "function ResolveEncounterLoc() return {X = 11600, Y = 12000, Z = 90} end",
+        "function ResolveEncounterLoc() return {X = 0, Y = 0.0, Z = 0x0} end",
+        v.MSG_ZERO_LOC,
+    ),
+    "npc_data": (
+        v.NpcDataRule,
+        'local npcData = {"NPC_Merchant"}',
+        'local npcData = {"NPC_Merchant", "Enemy_Wolf"}',
+        v.MSG_ENEMY_NPCDATA,
+    ),
+    "asset_item": (
+        lambda: v.AssetWhitelistRule({"items": ["Item_Herb"]}),
+        'npc:GiveItem("Item_Herb", 1)',
+        'npc:GiveItem("Item_Gold", 1)',
+        'npc:GiveItem("Item_Gold") 的道具不在素材库 items 中',
+    ),
+    "asset_minigame": (
+        lambda: v.AssetWhitelistRule({"minigames": ["Fishing"]}),
+        'UI.PlayMiniGame("Fishing", 1)',
+        'UI.PlayMiniGame("Chess", 1)',
+        'UI.PlayMiniGame 的 gameType "Chess" 不在素材库 minigames 中',
+    ),
+    "api_call": (
+        v.ApiCallRule,
+        'UI.Toast("hi")',
+        'UI.Toastt("hi")',
+        "UI.Toastt 不在 API 文档",
+    ),
+    "spawn_function": (
+        v.SpawnFunctionRule,
+        'function SpawnEncounter_01() World.SpawnEncounter(loc, 300, {}, "Trigger", "") end',
+        'function Setup() World.SpawnEncounter(loc, 300, {}, "Trigger", "") end',
+        v.MSG_SPAWN_FUNC,
+    ),
+}
+
+
+def _run(rule_factory, code):
+    return v.run_rules(parse(code), [rule_factory()])
+
+
+@pytest.mark.parametrize("name", RULE_CASES)
+def test_rule_passes(name):
+    rule, good, _, _ = RULE_CASES[name]
+    assert _run(rule, good) == []
+
+
+@pytest.mark.parametrize("name", RULE_CASES)
+def test_rule_reports_with_position(name):
+    rule, _, bad, fragment = RULE_CASES[name]
+    errors = _run(rule, bad)
+    assert len(errors) == 1
+    assert fragment in errors[0]
+    assert errors[0].startswith("line ")
+
+
+def test_validate_encounter_clean(encounter, assets):
+    assert v.validate_encounter(encounter, assets) == []
+
+
+def test_validate_encounter_reports_embedded_position(encounter, assets):
+    # 嵌入代码中的错误按外层文件的行号报告（code 字符串从第 3 行开始）
+    code = encounter.replace('if r == "答应" then', 'if r == true then')
+    errors = v.validate_encounter(code, assets)
+    assert errors == [f"line 10:4: {v.MSG_ASK_COMPARE}"]
+
+
+def test_validate_encounter_syntax_error_falls_back_to_text_checks(encounter, assets):
+    code = encounter.replace('if r == "答应" then', 'if r == "A" then then')
+    errors = v.validate_encounter(code, assets)
+    assert errors[0].startswith("Lua 语法错误: line 10:")
+    assert v.MSG_ASK_COMPARE in errors[1:]
+
+
+def test_api_findings_only_in_strict_mode(encounter, assets, monkeypatch):
+    code = encounter.replace('UI.Toast("获得草药")', 'UI.Toast("获得草药", 1)')
+    assert v.validate_encounter(code, assets) == []
+    monkeypatch.setattr(v.config, "API_LINT_STRICT", True)
+    errors = v.validate_encounter(code, assets)
+    assert len(errors) == 1 and "UI.Toast 实参个数 2" in errors[0]
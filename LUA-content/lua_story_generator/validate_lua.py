@@ -1,47 +1,565 @@
-"""Validate generated LUA Encounter code against rule.md hard rules."""
+"""Validate generated LUA Encounter code against rule.md hard rules.
+
+代码只解析一次（lua_parser），World.SpawnEncounter 的 code 字符串作为嵌入代码继续解析；
+各规则是 AST 访问器，在同一次遍历中收集信息，错误信息带 "line N:M" 位置。
+无法解析（含嵌入代码）时返回语法错误，并退回到基于文本的检查。
+"""
+import difflib
 import re
+import threading
+from collections import OrderedDict
 from typing import List, Tuple
 
+import api_catalog
+import config
+from lua_parser import LuaSyntaxError, Node, dotted, parse, walk
+
+REWARD_KEYWORDS = ["获得", "奖励", "给", "得到", "拿到"]
+GIVE_METHODS = ("GiveItem", "GiveWeapon", "GiveEquip")
+ASK_FUNCS = ("UI.Ask", "UI.AskMany")
+LETTER_OPTIONS = frozenset(("A", "B", "C", "D"))
+
+_DONE_KEY = re.compile(r"enc\w*_done")
+_ENEMY_ID = re.compile(r"Enemy[_A-Za-z0-9]+")
+_SPAWN_FUNC = re.compile(r"SpawnEncounter_\w+")
+
+MSG_DONE_GUARD = "缺少 _G.encXX_done 防重复逻辑（if _G.encXX_done then return end / _G.encXX_done = true）"
+MSG_NO_ISVALID = "缺少对象 IsValid() 检查，必须对 player 和所有 NPC 做 if not obj or not obj:IsValid() then return end"
+MSG_GETBYID_UNCHECKED = "使用了 World.GetByID 但未对返回对象做 IsValid 检查"
+MSG_TOAST_REWARD = "奖励必须调用 npc:GiveItem/GiveWeapon/GiveEquip，Toast 仅用于提示，不能代替发奖"
+MSG_ASK_COMPARE = "UI.Ask/AskMany 返回值必须用选项的实际文案比较（如 if r == \"答应\"），禁止用 == \"A\" 或 == true"
+MSG_ZERO_LOC = "ResolveEncounterLoc() 禁止返回 {X=0,Y=0,Z=0}，应返回靠近玩家落地位置(约11536,11963,90)的坐标，Z 须为地面高度 90"
+MSG_ENEMY_NPCDATA = "敌人不得放入 npcData，必须用 World.SpawnEnemy(id, loc, count) 或 World.SpawnEnemyAtPlayer(id, count) 生成"
+MSG_SPAWN_FUNC = "应有 function SpawnEncounter_XXX() 并调用 World.SpawnEncounter"
+
+# 可展开为多个值的末位实参（f(g()) / f(...)）：实参个数只能确定下限
+_MULTI_VALUE = frozenset(("Call", "MethodCall", "Vararg"))
+# 字面量实参与签名参数类型明显不符的组合（数字可自动转为字符串，不算不符）
+_LITERAL_KINDS = {"String": "string", "Number": "number", "True": "bool", "False": "bool", "Table": "table", "FunctionExpr": "function"}
+_KIND_MISMATCH = {
+    "string": ("bool", "table", "function"),
+    "number": ("bool", "table", "function"),
+    "bool": ("string", "number", "table", "function"),
+    "table": ("string", "number", "bool", "function"),
+    "function": ("string", "number", "bool", "table"),
+}
+
+
+# 最近解析结果（AST 或语法错误 (msg, line, col)）：语法检查与规则校验共用同一次解析
+_AST_CACHE_MAX = 32
+_ast_cache: "OrderedDict[tuple, Node | tuple]" = OrderedDict()
+_ast_lock = threading.Lock()
+
+
+def _parse_cached(code: str, line: int = 1, col: int = 1) -> Node:
+    key = (code, line, col)
+    with _ast_lock:
+        hit = _ast_cache.get(key)
+        if hit is not None:
+            _ast_cache.move_to_end(key)
+    if hit is None:
+        try:
+            hit = parse(code, line, col)
+        except LuaSyntaxError as e:
+            hit = (e.msg, e.line, e.col)
+        with _ast_lock:
+            _ast_cache[key] = hit
+            while len(_ast_cache) > _AST_CACHE_MAX:
+                _ast_cache.popitem(last=False)
+    if isinstance(hit, tuple):
+        raise LuaSyntaxError(*hit)
+    return hit
+
+
+def _at(node, msg: str) -> str:
+    return f"line {node.line}:{node.col}: {msg}"
+
+
+def _assigned_pairs(node: Node):
+    """Local / Assign 中 (变量名, 值表达式) 对（仅简单变量名）。"""
+    if node.kind == "Local":
+        return zip(node.names, node.exprs)
+    return ((t.name, e) for t, e in zip(node.targets, node.exprs) if t.kind == "Name")
+
+
+def _done_key(expr: Node) -> str | None:
+    """_G.encXX_done / _G["encXX_done"] 返回键名。"""
+    if expr.kind == "Index" and expr.obj.kind == "Name" and expr.obj.name == "_G" \
+            and expr.key.kind == "String" and _DONE_KEY.fullmatch(expr.key.value):
+        return expr.key.value
+    return None
+
+
+def _is_zero(expr: Node) -> bool:
+    if expr.kind != "Number":
+        return False
+    try:
+        return float.fromhex(expr.value) == 0 if expr.value[:2].lower() == "0x" else float(expr.value) == 0
+    except ValueError:
+        return False
+
+
+class Rule:
+    """规则访问器：实现 visit_<Kind>(node, ctx) 收集信息，finish(ctx) 产出错误。"""
+
+    def __init__(self):
+        self.errors: List[str] = []
+
+    def finish(self, ctx: "_Context") -> None:
+        pass
+
+
+class DoneGuardRule(Rule):
+    """Rule 1：if _G.encXX_done then return end + _G.encXX_done = true。"""
+
+    def __init__(self):
+        super().__init__()
+        self.key: str | None = None
+        self.guard: Node | None = None  # if _G.encXX_done then return end
+        self.mark: Node | None = None   # _G.encXX_done = true
+
+    def visit_If(self, node, ctx):
+        for test, block in zip(node.tests, node.blocks):
+            cond = test.operand if test.kind == "UnOp" and test.op == "not" else test
+            if cond.kind == "BinOp" and cond.op == "==" and cond.right.kind == "True":
+                cond = cond.left
+            key = _done_key(cond)
+            if key and any(s.kind == "Return" for s in block) and self.guard is None:
+                self.guard = node
+                self.key = self.key or key
+
+    def visit_Assign(self, node, ctx):
+        for target, value in zip(node.targets, node.exprs):
+            key = _done_key(target)
+            if key and value.kind == "True" and self.mark is None:
+                self.mark = node
+                self.key = self.key or key
+
+    def finish(self, ctx):
+        if self.guard is None or self.mark is None:
+            self.errors.append(_at(ctx.anchor, MSG_DONE_GUARD))
+
+
+class ValidityRule(Rule):
+    """Rule 2：World.GetByID 取得的每个对象都要 obj:IsValid() 检查。"""
+
+    def __init__(self):
+        super().__init__()
+        self.fetched: dict[str, Node] = {}
+        self.stmts: dict[str, Node] = {}  # 变量名 -> 取得对象的 Local / Assign 语句
+        self.checked: set[str] = set()
+
+    def _record(self, node, ctx):
+        for name, value in _assigned_pairs(node):
+            if value.kind == "Call" and dotted(value.func) == "World.GetByID" and name not in self.fetched:
+                self.fetched[name] = value
+                self.stmts[name] = node
+
+    visit_Local = _record
+    visit_Assign = _record
+
+    def visit_MethodCall(self, node, ctx):
+        if node.method == "IsValid" and node.obj.kind == "Name":
+            self.checked.add(node.obj.name)
+
+    def finish(self, ctx):
+        if not self.checked:
+            self.errors.append(_at(ctx.anchor, MSG_NO_ISVALID))
+        for name, call in self.fetched.items():
+            if name not in self.checked:
+                self.errors.append(_at(call, f"{MSG_GETBYID_UNCHECKED}（{name}），应写 if not {name} or not {name}:IsValid() then return end"))
+
+
+class RewardRule(Rule):
+    """Rule 5：Toast 提示获得奖励时必须有 Give* 调用。"""
+
+    def __init__(self):
+        super().__init__()
+        self.has_give = False
+        self.reward_toast = None
+
+    def visit_MethodCall(self, node, ctx):
+        if node.method in GIVE_METHODS:
+            self.has_give = True
+
+    def visit_Call(self, node, ctx):
+        name = dotted(node.func) or ""
+        if name.rsplit(".", 1)[-1] in GIVE_METHODS:
+            self.has_give = True
+        elif name.endswith("Toast") and node.args and node.args[0].kind == "String" and self.reward_toast is None:
+            if any(kw in node.args[0].value for kw in REWARD_KEYWORDS):
+                self.reward_toast = node
+
+    def finish(self, ctx):
+        if self.reward_toast is not None and not self.has_give:
+            self.errors.append(_at(self.reward_toast, MSG_TOAST_REWARD))
+
+
+class AskCompareRule(Rule):
+    """Rule 4：UI.Ask/AskMany 的返回值只能与选项文案比较。"""
+
+    def __init__(self):
+        super().__init__()
+        self.ask_vars: dict[str, list[str]] = {}  # 变量名 -> 选项文案
+        self.compares: list[tuple[Node, list[str]]] = []  # (违规的 "A" / true 节点, 选项文案)
+
+    @staticmethod
+    def options(call: Node) -> list[str]:
+        """UI.Ask(q, a, b) / UI.AskMany(q, {a, b, c}) 的选项文案（非字符串常量时为空）。"""
+        args = call.args[1:]
+        if dotted(call.func) == "UI.AskMany":
+            if not args or args[0].kind != "Table":
+                return []
+            args = [f.value for f in args[0].fields if f.key is None]
+        if not all(a.kind == "String" for a in args):
+            return []
+        return [a.value for a in args]
+
+    def _record(self, node, ctx):
+        for name, value in _assigned_pairs(node):
+            if value.kind == "Call" and dotted(value.func) in ASK_FUNCS:
+                self.ask_vars[name] = self.options(value)
+
+    visit_Local = _record
+    visit_Assign = _record
+
+    def _ask_options(self, expr) -> list[str] | None:
+        if expr.kind == "Name":
+            return self.ask_vars.get(expr.name)
+        if expr.kind == "Call" and dotted(expr.func) in ASK_FUNCS:
+            return self.options(expr)
+        return None
+
+    @staticmethod
+    def _is_letter(expr):
+        return expr.kind in ("True", "False") or (expr.kind == "String" and expr.value in LETTER_OPTIONS)
+
+    def visit_BinOp(self, node, ctx):
+        if node.op not in ("==", "~="):
+            return
+        for ask, other in ((node.left, node.right), (node.right, node.left)):
+            options = self._ask_options(ask)
+            if options is not None and self._is_letter(other):
+                self.errors.append(_at(node, MSG_ASK_COMPARE))
+                self.compares.append((other, options))
+                return
+
+
+class EncounterLocRule(Rule):
+    """Rule 6：禁止 return {X=0,Y=0,Z=0}。"""
+
+    def visit_Return(self, node, ctx):
+        if len(node.exprs) != 1 or node.exprs[0].kind != "Table":
+            return
+        keyed = {f.key.value: f.value for f in node.exprs[0].fields if f.key is not None and f.key.kind == "String"}
+        if all(axis in keyed and _is_zero(keyed[axis]) for axis in ("X", "Y", "Z")):
+            self.errors.append(_at(node, MSG_ZERO_LOC))
+
+
+class NpcDataRule(Rule):
+    """Rule 7：npcData 中不得出现 Enemy ID。"""
+
+    def _check(self, node, ctx):
+        for name, value in _assigned_pairs(node):
+            if name != "npcData" or value.kind != "Table":
+                continue
+            for f in value.fields:
+                ids = [x.value for x in (f.key, f.value) if x is not None and x.kind == "String"]
+                if any(_ENEMY_ID.fullmatch(i) for i in ids):
+                    self.errors.append(_at(f, MSG_ENEMY_NPCDATA))
+                    return
 
-def validate_encounter(code: str, assets: dict | None = None) -> List[str]:
+    visit_Local = _check
+    visit_Assign = _check
+
+
+class AssetWhitelistRule(Rule):
+    """Rule 8 / 9：PlayMiniGame 的 gameType 与 Give* 的道具 ID 必须来自素材库。"""
+
+    def __init__(self, assets: dict | None):
+        super().__init__()
+        assets = assets or {}
+        self.minigames = set(assets.get("minigames", []) or [])
+        self.items = set(assets.get("items", []) or [])
+        self.unknown: list[tuple[Node, set[str]]] = []  # (不在素材库中的 ID 字符串节点, 可用 ID)
+        self._items_hint = None
+
+    def items_hint(self) -> str:
+        if self._items_hint is None:
+            self._items_hint = ", ".join(sorted(self.items)[:20]) + ("..." if len(self.items) > 20 else "")
+        return self._items_hint
+
+    def _check_give(self, node, method):
+        if self.items and node.args and node.args[0].kind == "String" and node.args[0].value not in self.items:
+            used = node.args[0].value
+            self.unknown.append((node.args[0], self.items))
+            self.errors.append(_at(node, f"npc:{method}(\"{used}\") 的道具不在素材库 items 中，仅可用: {self.items_hint()}"))
+
+    def visit_MethodCall(self, node, ctx):
+        if node.method in GIVE_METHODS:
+            self._check_give(node, node.method)
+
+    def visit_Call(self, node, ctx):
+        name = (dotted(node.func) or "").rsplit(".", 1)[-1]
+        if name in GIVE_METHODS:
+            self._check_give(node, name)
+        elif name == "PlayMiniGame" and self.minigames and node.args and node.args[0].kind == "String":
+            used = node.args[0].value
+            if used not in self.minigames:
+                self.unknown.append((node.args[0], self.minigames))
+                self.errors.append(_at(node, f"UI.PlayMiniGame 的 gameType \"{used}\" 不在素材库 minigames 中，仅可用: {', '.join(sorted(self.minigames))}"))
+
+
+class ApiCallRule(Rule):
+    """
+    API 调用：World / UI / Time / Env / Math / System / Event 中文档没有的函数、实参个数与签名不符、
+    字面量实参类型不符；Entity / Performer 方法按方法名检查（未知方法只对 World.GetByID / Spawn* 取得的变量报错）。
+    签名来自 api_catalog（lua_atomic_modules_call_guide.md）。
+    """
+
+    def __init__(self, catalog: dict | None = None):
+        super().__init__()
+        catalog = catalog or api_catalog.get_catalog()
+        self.modules = catalog["modules"]
+        self.methods = catalog["methods"]
+        self.actors: set[str] = set()  # 取自返回 Actor 的 API 的变量名
+
+    def _check_args(self, node, sig, label):
+        params = sig["params"]
+        args = node.args
+        fixed = len(args) - (1 if args and args[-1].kind in _MULTI_VALUE else 0)
+        if fixed > len(params) or (fixed == len(args) and fixed < sig["min_args"]):
+            self.errors.append(_at(node, f"{label} 实参个数 {len(args)} 与文档签名不符，应为 {label}({', '.join(params)})"))
+            return
+        for i, (arg, param, kind) in enumerate(zip(args, params, sig["kinds"]), 1):
+            if _LITERAL_KINDS.get(arg.kind) in _KIND_MISMATCH.get(kind, ()):
+                self.errors.append(_at(arg, f"{label} 第 {i} 个参数 {param} 应为 {kind}"))
+
+    def visit_Call(self, node, ctx):
+        name = dotted(node.func)
+        if not name or name.count(".") != 1:
+            return
+        module, fn = name.split(".")
+        functions = self.modules.get(module)
+        if functions is None:
+            return
+        sig = functions.get(fn)
+        if sig is None:
+            close = difflib.get_close_matches(fn, functions, n=1)
+            hint = f"，是否为 {module}.{close[0]}？" if close else ""
+            self.errors.append(_at(node, f"{name} 不在 API 文档（lua_atomic_modules_call_guide.md）中{hint}"))
+        else:
+            self._check_args(node, sig, name)
+
+    def visit_MethodCall(self, node, ctx):
+        sig = self.methods.get(node.method)
+        obj = node.obj.name if node.obj.kind == "Name" else "obj"
+        if sig is not None:
+            self._check_args(node, sig, f"{obj}:{node.method}")
+        elif obj in self.actors:
+            close = difflib.get_close_matches(node.method, self.methods, n=1)
+            hint = f"，是否为 {obj}:{close[0]}？" if close else ""
+            self.errors.append(_at(node, f"{obj}:{node.method} 不是 Entity / Performer 接口中的方法{hint}"))
+
+    def _record(self, node, ctx):
+        for name, value in _assigned_pairs(node):
+            func = dotted(value.func) if value.kind == "Call" else None
+            module, _, fn = (func or "").partition(".")
+            sig = self.modules.get(module, {}).get(fn)
+            if sig is not None and sig["returns"].split("|")[0] == "Actor":
+                self.actors.add(name)
+            else:
+                self.actors.discard(name)
+
+    visit_Local = _record
+    visit_Assign = _record
+
+
+class SpawnFunctionRule(Rule):
+    """基本结构：World.SpawnEncounter 应封装在 function SpawnEncounter_XXX() 中。"""
+
+    def __init__(self):
+        super().__init__()
+        self.has_spawn_func = False
+        self.has_function = False
+        self.spawn_call = None
+
+    def visit_Function(self, node, ctx):
+        self.has_function = True
+        if _SPAWN_FUNC.fullmatch(node.name):
+            self.has_spawn_func = True
+
+    visit_LocalFunction = visit_Function
+
+    def visit_Call(self, node, ctx):
+        if self.spawn_call is None and dotted(node.func) == "World.SpawnEncounter":
+            self.spawn_call = node
+
+    def finish(self, ctx):
+        if self.has_spawn_func:
+            return
+        if self.spawn_call is not None:
+            self.errors.append(_at(self.spawn_call, MSG_SPAWN_FUNC))
+        elif self.has_function and ctx.embedded:
+            self.errors.append(_at(ctx.anchor, MSG_SPAWN_FUNC))
+
+
+class _Context:
+    """遍历期间的共享信息：嵌入代码的起点（缺失类错误的定位）、局部字符串常量。"""
+
+    def __init__(self):
+        self.anchor: Node | None = None
+        self.embedded: list[Node] = []
+        self.strings: dict[str, Node] = {}
+
+
+def default_rules(assets: dict | None = None, api_calls: bool | None = None) -> list[Rule]:
+    """Encounter 规则；api_calls（默认 config.API_LINT_STRICT）为 False 时不含 ApiCallRule（其结果由 lint_api_calls 作为警告给出）。"""
+    rules = [
+        DoneGuardRule(),
+        ValidityRule(),
+        RewardRule(),
+        AskCompareRule(),
+        EncounterLocRule(),
+        NpcDataRule(),
+        AssetWhitelistRule(assets),
+        SpawnFunctionRule(),
+    ]
+    if config.API_LINT_STRICT if api_calls is None else api_calls:
+        rules.insert(-1, ApiCallRule())
+    return rules
+
+
+def run_rules(chunk: Node, rules: list[Rule], ctx: _Context | None = None) -> List[str]:
+    """
+    单次遍历：每个节点分发给实现了 visit_<Kind> 的规则；遇到 World.SpawnEncounter 的 code 字符串时解析并继续遍历。
+    传入 ctx 时遍历后可取得嵌入代码（ctx.embedded）。
+    """
+    handlers: dict[str, list] = {}
+    for rule in rules:
+        for attr in dir(rule):
+            if attr.startswith("visit_"):
+                handlers.setdefault(attr[6:], []).append(getattr(rule, attr))
+    ctx = ctx or _Context()
+    ctx.anchor = chunk
+    stack = [chunk]
+    while stack:
+        node = stack.pop()
+        kind = node.kind
+        for h in handlers.get(kind, ()):
+            h(node, ctx)
+        if kind == "Local":
+            for name, value in zip(node.names, node.exprs):
+                if value.kind == "String":
+                    ctx.strings[name] = value
+        elif kind == "Call":
+            nested = _embedded_code(node, ctx)
+            if nested is not None:
+                stack.append(nested)
+        stack.extend(reversed(list(node.children())))
+    errors = []
+    for rule in rules:
+        rule.finish(ctx)
+        errors.extend(rule.errors)
+    return errors
+
+
+def _embedded_code(call: Node, ctx: _Context) -> Node | None:
+    """World.SpawnEncounter(loc, range, npcData, luaType, code) 的 code 字符串解析为 Chunk（语法错误向上抛出）。"""
+    if dotted(call.func) != "World.SpawnEncounter" or len(call.args) < 5:
+        return None
+    code = call.args[4]
+    if code.kind == "Name":
+        code = ctx.strings.get(code.name)
+    if code is None or code.kind != "String":
+        return None
+    chunk = _parse_cached(code.value, code.body_line, code.body_col)
+    if not ctx.embedded:
+        ctx.anchor = chunk
+    ctx.embedded.append(chunk)
+    return chunk
+
+
+def parse_checked(code: str) -> Tuple[Node | None, List[str]]:
+    """
+    只检查 Lua 语法（含 World.SpawnEncounter 的 code 字符串），不需要外部 Lua。
+    返回 (chunk, errors)：通过时 errors 为 []，chunk 可直接传给 validate_encounter / lint_api_calls；
+    否则 chunk 为 None，errors 为 ["Lua 语法错误: line N:M: ..."]。
+    """
+    code_clean = code.strip()
+    try:
+        chunk = _parse_cached(code_clean)
+        if "SpawnEncounter" in code_clean:
+            ctx = _Context()
+            for node in walk(chunk):
+                if node.kind == "Local":
+                    ctx.strings.update((n, v) for n, v in zip(node.names, node.exprs) if v.kind == "String")
+                elif node.kind == "Call":
+                    _embedded_code(node, ctx)
+    except LuaSyntaxError as e:
+        return None, [f"Lua 语法错误: {e}"]
+    return chunk, []
+
+
+def check_syntax(code: str) -> List[str]:
+    """只检查 Lua 语法，通过返回 []，否则返回 ["Lua 语法错误: line N:M: ..."]。"""
+    return parse_checked(code)[1]
+
+
+def lint_api_calls(code: str, chunk: Node | None = None) -> List[str]:
+    """
+    单次遍历检查 API 调用（未知函数 / 实参个数 / 字面量类型，含 SpawnEncounter 的 code 字符串），用于非 Encounter 步骤。
+    chunk 为 parse_checked 已解析的结果（省略时解析 code）。语法错误时返回 []（由 check_syntax 报告）。
+    """
+    try:
+        return run_rules(chunk or _parse_cached(code.strip()), [ApiCallRule()])
+    except LuaSyntaxError:
+        return []
+
+
+def validate_encounter(code: str, assets: dict | None = None, chunk: Node | None = None) -> List[str]:
     """
     Check Encounter code for rule.md compliance.
     Returns list of error messages; empty list = passes.
+    chunk 为 parse_checked 已解析的结果（省略时解析 code）。API 调用检查仅在 API_LINT_STRICT=1 时计入，否则见 lint_api_calls。
     """
-    errors: List[str] = []
     code_clean = code.strip()
+    try:
+        return run_rules(chunk or _parse_cached(code_clean), default_rules(assets))
+    except LuaSyntaxError as e:
+        return [f"Lua 语法错误: {e}"] + _validate_text(code_clean, assets)
+
+
+def _validate_text(code_clean: str, assets: dict | None = None) -> List[str]:
+    """无法解析时的文本检查（不含位置信息）。"""
+    errors: List[str] = []
 
     # Rule 1: 防重复触发
     if "_G.enc" not in code_clean or "_done" not in code_clean:
-        errors.append("缺少 _G.encXX_done 防重复逻辑（if _G.encXX_done then return end / _G.encXX_done = true）")
+        errors.append(MSG_DONE_GUARD)
 
     # Rule 2: 对象合法性检查
-    if "IsValid()" not in code_clean and "IsValid" not in code_clean:
-        errors.append("缺少对象 IsValid() 检查，必须对 player 和所有 NPC 做 if not obj or not obj:IsValid() then return end")
-
-    if "World.GetByID" in code_clean and "IsValid" not in code_clean:
-        errors.append("使用了 World.GetByID 但未对返回对象做 IsValid 检查")
+    if "IsValid" not in code_clean:
+        errors.append(MSG_NO_ISVALID)
 
     # Rule 5: 奖励必须用 GiveItem/GiveWeapon/GiveEquip
-    reward_keywords = ["获得", "奖励", "给", "得到", "拿到"]
-    has_reward_hint = any(kw in code_clean for kw in reward_keywords)
-    has_give_call = "GiveItem" in code_clean or "GiveWeapon" in code_clean or "GiveEquip" in code_clean
+    has_reward_hint = any(kw in code_clean for kw in REWARD_KEYWORDS)
+    has_give_call = any(m in code_clean for m in GIVE_METHODS)
     if has_reward_hint and "Toast" in code_clean and not has_give_call:
-        # Toast 提及获得但无 Give* 调用
         if re.search(r'Toast\s*\(\s*["\'].*[获给得].*["\']', code_clean):
-            errors.append("奖励必须调用 npc:GiveItem/GiveWeapon/GiveEquip，Toast 仅用于提示，不能代替发奖")
+            errors.append(MSG_TOAST_REWARD)
 
     # Rule 4: UI.Ask/AskMany 必须用选项文案比较，禁止 "A"、"B"、true
     if re.search(r'==\s*["\']A["\']', code_clean) or re.search(r'==\s*true\b', code_clean):
-        errors.append("UI.Ask/AskMany 返回值必须用选项的实际文案比较（如 if r == \"答应\"），禁止用 == \"A\" 或 == true")
+        errors.append(MSG_ASK_COMPARE)
 
     # Rule 6: 奇遇位置不要离玩家出生点太远
     if re.search(r'return\s*\{\s*X\s*=\s*0\s*,?\s*Y\s*=\s*0\s*,?\s*Z\s*=\s*0\s*\}', code_clean):
-        errors.append("ResolveEncounterLoc() 禁止返回 {X=0,Y=0,Z=0}，应返回靠近玩家落地位置(约11536,11963,90)的坐标，Z 须为地面高度 90")
+        errors.append(MSG_ZERO_LOC)
 
     # Rule 7: 敌人必须用 World.SpawnEnemy，禁止放 npcData
     if re.search(r'npcData\s*=\s*\{[^}]*["\']Enemy[_A-Za-z0-9]+["\']', code_clean):
-        errors.append("敌人不得放入 npcData，必须用 World.SpawnEnemy(id, loc, count) 或 World.SpawnEnemyAtPlayer(id, count) 生成")
+        errors.append(MSG_ENEMY_NPCDATA)
 
     # Rule 8: PlayMiniGame gameType 必须来自素材库 minigames
     if "PlayMiniGame" in code_clean and assets:
@@ -54,18 +572,16 @@ def validate_encounter(code: str, assets: dict | None = None) -> List[str]:
 
     # Rule 9: GiveItem/GiveWeapon/GiveEquip 的道具 ID 必须来自素材库 items
     if assets and (allowed_items := set(assets.get("items", []) or [])):
-        for method in ["GiveItem", "GiveWeapon", "GiveEquip"]:
+        for method in GIVE_METHODS:
             for m in re.finditer(rf'{method}\s*\(\s*["\']([^"\']+)["\']', code_clean):
                 used = m.group(1)
                 if used not in allowed_items:
                     errors.append(f"npc:{method}(\"{used}\") 的道具不在素材库 items 中，仅可用: {', '.join(sorted(allowed_items)[:20])}{'...' if len(allowed_items) > 20 else ''}")
 
     # 基本结构
-    if "World.SpawnEncounter" not in code_clean and "encounter" in code_clean.lower():
-        pass  # 可能是片段
     if "SpawnEncounter_" not in code_clean and "function " in code_clean:
         if "encXX" in code_clean or "enc_" in code_clean:
-            errors.append("应有 function SpawnEncounter_XXX() 并调用 World.SpawnEncounter")
+            errors.append(MSG_SPAWN_FUNC)
 
     return errors
 